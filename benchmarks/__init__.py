@@ -0,0 +1,3 @@
+"""
+Benchmarks run against local stand-ins for the Encounter admin UI
+"""
@@ -0,0 +1,168 @@
+"""
+Throughput of `Level.store_answers` on levels with many sectors and codes.
+
+    python -m benchmarks.bench_answers [--sectors 200] [--codes 25] [--flat-codes 2000] [--existing 5]
+                                       [--chrome-driver-path PATH --latency 0.02 --jquery PATH]
+
+Uploads one level of `--sectors` named sectors with `--codes` codes each into an empty level and into one
+that already has `--existing` sectors, and one level without sectors holding `--flat-codes` codes. Checks that
+the targets end up with exactly the old and the new answers and prints codes per minute. Runs on the fake driver with simulated latency, or in Chrome against the
+local admin server with `--chrome-driver-path`.
+"""
+
+import argparse
+from dataclasses import dataclass, replace
+import sys
+import time
+import typing
+
+from copy_encounter_game.game import Level, Answer, AnswerOption
+from copy_encounter_game.game.game_custom_info import GameCustomInfo
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.tracing import tracer
+
+from benchmarks.fake_driver import FakeDriver, COMMAND_LATENCY, PAGE_LOAD_LATENCY
+from benchmarks.fixtures import DOMAIN, GAME_ID, CREDS
+from benchmarks.server import AdminServer, empty_game
+from benchmarks.site import EditableSite
+
+__all__ = [
+    "AnswersResult",
+    "make_answers",
+    "run_answers",
+]
+
+
+def make_answers(n_sectors: int, n_codes: int, prefix: str) -> typing.List[Answer]:
+    """`n_sectors` named sectors of `n_codes` codes, or one unnamed answer of `n_codes` codes for 0 sectors"""
+    if not n_sectors:
+        return [Answer([AnswerOption(f"{prefix}a{a}") for a in range(n_codes)], None, 0)]
+    return [
+        Answer([AnswerOption(f"{prefix}s{s}a{a}") for a in range(n_codes)], f"{prefix} sector {s + 1}", s)
+        for s in range(n_sectors)
+    ]
+
+
+def _same_answers(expected: typing.List[Answer], actual: typing.Optional[typing.List[Answer]]) -> bool:
+    def key(answers):
+        return [(answer.name, [(o.text, o.dedicated_to_who) for o in answer.options]) for answer in answers or []]
+    return key(expected) == key(actual)
+
+
+@dataclass
+class AnswersResult:
+    name: str
+    n_sectors: int
+    n_codes: int
+    seconds: float
+    commands: typing.Optional[int] = None
+    page_loads: typing.Optional[int] = None
+    ok: bool = False
+    error: typing.Optional[Exception] = None
+
+    @property
+    def codes_per_minute(self) -> float:
+        return 60. * self.n_codes / self.seconds if self.seconds and self.ok else 0.
+
+    def report(self) -> None:
+        commands = "-" if self.commands is None else self.commands
+        loads = "-" if self.page_loads is None else self.page_loads
+        print(
+            f"{self.name:<12}{self.n_sectors:>8}{self.n_codes:>8}{commands:>10}{loads:>8}"
+            f"{self.seconds:>10.1f}{self.codes_per_minute:>11.0f}{'yes' if self.ok else 'NO':>5}"
+        )
+        if self.error is not None:
+            print(f"    failed: {self.error!r}")
+        return None
+
+
+def run_answers(
+        name: str,
+        gci: GameCustomInfo,
+        site: EditableSite,
+        level_id: int,
+        answers: typing.List[Answer],
+        existing: typing.List[Answer] = (),
+        driver: FakeDriver = None,
+) -> AnswersResult:
+    """
+    Stores `answers` into the level `level_id` of `site` that holds just `existing` before;
+    simulated time with the fake `driver`
+    """
+    site.game.levels[level_id - 1].answers = [replace(answer, options=list(answer.options)) for answer in existing]
+    level = Level(gci.domain, gci.game_id, level_id, answers=answers)
+    n_sectors = len(answers) if level.has_sectors else 0
+    result = AnswersResult(name, n_sectors, sum(len(answer.options) for answer in answers), 0.)
+    gci.navigate_to_level(level_id)
+    n_commands, clock = (len(driver.commands), driver.clock) if driver is not None else (0, 0.)
+    start = time.perf_counter()
+    # noinspection PyBroadException
+    try:
+        level.store_answers(gci)
+    except Exception as e:
+        result.error = e
+    result.seconds = time.perf_counter() - start
+    if driver is not None:
+        records = driver.commands[n_commands:]
+        result.seconds = driver.clock - clock
+        result.commands = len(records)
+        result.page_loads = sum(record.page_loads for record in records)
+    result.ok = result.error is None and _same_answers(
+        list(existing) + answers, site.game.levels[level_id - 1].answers,
+    )
+    return result
+
+
+def main(argv: typing.List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sectors", type=int, default=200)
+    parser.add_argument("--codes", type=int, default=25, help="codes per sector")
+    parser.add_argument("--flat-codes", type=int, default=2000, help="codes of the level without sectors")
+    parser.add_argument("--existing", type=int, default=5, help="sectors the second target level already has")
+    parser.add_argument("--command-latency", type=float, default=COMMAND_LATENCY)
+    parser.add_argument("--page-load-latency", type=float, default=PAGE_LOAD_LATENCY)
+    parser.add_argument("--chrome-driver-path", default=None)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the local server adds to a response")
+    parser.add_argument("--jquery", default=None, help="local jQuery for Chrome, downloaded from a CDN otherwise")
+    args = parser.parse_args(argv)
+
+    sectors = make_answers(args.sectors, args.codes, "new")
+    cases = [
+        ("sectors", 1, sectors, []),
+        ("existing", 2, sectors, make_answers(args.existing, 3, "old")),
+        ("no sectors", 3, make_answers(0, args.flat_codes, "flat"), []),
+    ]
+    site = EditableSite(empty_game(GAME_ID, len(cases), DOMAIN))
+    server = driver = None
+    if args.chrome_driver_path is None:
+        driver = FakeDriver(site, command_latency=args.command_latency, page_load_latency=args.page_load_latency)
+        gci = GameCustomInfo(DOMAIN, GAME_ID, CREDS, None, driver=driver, session_store=None)
+    else:
+        server = AdminServer({GAME_ID: site}, latency=args.latency, jquery_path=args.jquery).start()
+        site.game.domain = server.domain
+        gci = GameCustomInfo(server.domain, GAME_ID, CREDS, args.chrome_driver_path, session_store=None)
+    pacer = Pacer.for_domain(gci.domain)
+    pacer.rate = pacer.burst = pacer.tokens = 1e9
+
+    tracer.enable()
+    try:
+        results = [
+            run_answers(name, gci, site, level_id, answers, existing, driver)
+            for name, level_id, answers, existing in cases
+        ]
+    finally:
+        tracer.disable()
+        gci.close()
+        if server is not None:
+            server.stop()
+
+    clock = "simulated" if driver is not None else f"wall clock, {args.latency * 1000:.0f} ms server latency"
+    print(f"\nStoring answers ({clock})")
+    print(f"{'level':<12}{'sectors':>8}{'codes':>8}{'commands':>10}{'loads':>8}{'seconds':>10}{'codes/min':>11}{'ok':>5}")
+    for result in results:
+        result.report()
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Per-level cost of the Chrome profiles of `GameCustomInfo`: scrape time, time in page loads and browser memory.
+
+    python -m benchmarks.bench_chrome --chrome-driver-path PATH [--profiles lean full] [--levels 5]
+                                      [--domain D --game-id N --user U --password P] [--jquery PATH]
+
+Runs against the local admin server unless a real `--domain` is given. The local pages have no images or fonts,
+so the savings from blocking them only show against a real game. Memory is the resident size of chromedriver and
+all browser processes, read from /proc; it is not reported where there is no /proc.
+"""
+
+import argparse
+from dataclasses import dataclass, field
+import os
+import statistics
+import sys
+import time
+import typing
+
+from selenium.webdriver.remote.command import Command
+
+from copy_encounter_game.constants import CHROME_PROFILE_LEAN, CHROME_PROFILE_FULL
+from copy_encounter_game.game import Level
+from copy_encounter_game.game.game_custom_info import GameCustomInfo
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.tracing import tracer
+
+from benchmarks.fixtures import CREDS, GAME_ID, make_game
+from benchmarks.server import AdminServer
+from benchmarks.site import EditableSite
+
+__all__ = [
+    "ProfileResult",
+    "process_tree_rss",
+    "run_profile",
+]
+
+
+def process_tree_rss(pid: int) -> typing.Optional[int]:
+    """Resident memory in bytes of `pid` and all of its descendants"""
+    if not os.path.isdir("/proc"):
+        return None
+    children: typing.Dict[int, typing.List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The process name may contain spaces and brackets, the fields after it do not
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [pid]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/statm", "r") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+        stack.extend(children.get(current, []))
+    return total
+
+
+@dataclass
+class ProfileResult:
+    profile: str
+    level_seconds: typing.List[float] = field(default_factory=list)
+    page_loads: typing.List[int] = field(default_factory=list)
+    load_seconds: typing.List[float] = field(default_factory=list)
+    rss: typing.List[int] = field(default_factory=list)
+
+    def report(self) -> None:
+        n = len(self.level_seconds)
+        rss = f"{statistics.mean(self.rss) / 2 ** 20:>10.0f}{max(self.rss) / 2 ** 20:>10.0f}" if self.rss else \
+            f"{'n/a':>10}{'n/a':>10}"
+        print(
+            f"{self.profile:<8}{n:>7}{statistics.mean(self.level_seconds):>10.2f}"
+            f"{sum(self.page_loads) / n:>8.1f}{statistics.mean(self.load_seconds):>10.2f}{rss}"
+        )
+        return None
+
+
+def run_profile(
+        profile: str,
+        domain: str,
+        game_id: int,
+        creds: typing.Dict[str, str],
+        chrome_driver_path: str,
+        level_ids: typing.List[int],
+) -> ProfileResult:
+    result = ProfileResult(profile)
+    # Every profile pays for its own login
+    gci = GameCustomInfo(domain, game_id, creds, chrome_driver_path, chrome_profile=profile, session_store=None)
+    pid = gci.driver.service.process.pid
+    tracer.reset()
+    tracer.enable()
+    try:
+        for level_id in level_ids:
+            n_spans = len(tracer.spans)
+            start = time.perf_counter()
+            Level.from_html(gci.driver, domain, game_id, level_id)
+            result.level_seconds.append(time.perf_counter() - start)
+            loads = [span for span in tracer.spans[n_spans:] if span.name == Command.GET]
+            result.page_loads.append(len(loads))
+            result.load_seconds.append(sum(span.duration for span in loads))
+            rss = process_tree_rss(pid)
+            if rss is not None:
+                result.rss.append(rss)
+    finally:
+        tracer.disable()
+        gci.close()
+    return result
+
+
+def main(argv: typing.List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chrome-driver-path", required=True)
+    parser.add_argument("--profiles", nargs="+", default=[CHROME_PROFILE_LEAN, CHROME_PROFILE_FULL])
+    parser.add_argument("--levels", type=int, default=5)
+    parser.add_argument("--domain", default=None, help="a real Encounter domain instead of the local server")
+    parser.add_argument("--game-id", type=int, default=GAME_ID)
+    parser.add_argument("--user", default=CREDS["user"])
+    parser.add_argument("--password", default=CREDS["password"])
+    parser.add_argument("--jquery", default=None, help="local jQuery for the local server")
+    args = parser.parse_args(argv)
+
+    server = None
+    domain, creds = args.domain, {"user": args.user, "password": args.password}
+    if domain is None:
+        server = AdminServer({args.game_id: EditableSite(make_game(args.levels, "", args.game_id))},
+                             jquery_path=args.jquery).start()
+        domain = server.domain
+        pacer = Pacer.for_domain(domain)
+        pacer.rate = pacer.burst = pacer.tokens = 1e9
+
+    try:
+        results = [
+            run_profile(profile, domain, args.game_id, creds, args.chrome_driver_path,
+                        list(range(1, args.levels + 1)))
+            for profile in args.profiles
+        ]
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(f"\n{args.levels} levels of game {args.game_id} at {domain}")
+    print(f"{'profile':<8}{'levels':>7}{'s/level':>10}{'loads':>8}{'load s':>10}{'mean MB':>10}{'peak MB':>10}")
+    for result in results:
+        result.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
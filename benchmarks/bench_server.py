@@ -0,0 +1,192 @@
+"""
+End-to-end throughput of `save_game`/`load_game` against the local admin server.
+
+    python -m benchmarks.bench_server [--levels 20] [--workers 1 4] [--latency 0.05] [--error-rate 0.01]
+                                      [--backend http|selenium|browser-fetch] [--chrome-driver-path PATH]
+                                      [--chrome-profile lean] [--jquery PATH] [--pace]
+
+`save_game` scrapes the fixture game over the HTTP backend, or through Chrome with `--backend selenium`
+or `--backend browser-fetch`.
+`load_game` writes it into a game with empty levels; it needs Chrome and only runs with `--chrome-driver-path`.
+Prints levels per minute for every run and checks that what was saved or loaded matches the fixture.
+"""
+
+import argparse
+from dataclasses import dataclass, field
+import os
+import sys
+import tempfile
+import time
+import typing
+
+from copy_encounter_game.api import save_game, load_game
+from copy_encounter_game.constants import (
+    BACKEND_HTTP, BACKEND_SELENIUM, BACKEND_BROWSER_FETCH,
+    CHROME_PROFILE_LEAN, CHROME_PROFILE_FULL, DEFAULT_CHROME_PROFILE,
+)
+from copy_encounter_game.game import Game, Level
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.session_store import SessionStore
+
+from benchmarks.fixtures import CREDS, make_game
+from benchmarks.server import AdminServer, empty_game
+from benchmarks.site import EditableSite
+
+__all__ = [
+    "RunResult",
+    "run_save",
+    "run_load",
+]
+
+SOURCE_GAME_ID = 4242
+TARGET_GAME_ID = 4343
+
+
+@dataclass
+class RunResult:
+    direction: str
+    workers: int
+    n_levels: int
+    seconds: float
+    n_requests: int
+    n_errors: int
+    mismatches: typing.List[int] = field(default_factory=list)
+    failed: typing.List[int] = field(default_factory=list)
+    error: typing.Optional[Exception] = None
+
+    @property
+    def levels_per_minute(self) -> float:
+        done = self.n_levels - len(self.failed) if self.error is None else 0
+        return 60. * done / self.seconds if self.seconds else 0.
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.mismatches and not self.failed
+
+    def report(self) -> None:
+        print(
+            f"{self.direction:<6}{self.workers:>8}{self.n_levels:>8}{self.seconds:>10.1f}"
+            f"{self.levels_per_minute:>12.1f}{self.n_requests:>10}{self.n_errors:>8}"
+        )
+        if self.error is not None:
+            print(f"    failed: {self.error!r}")
+        if self.failed:
+            print(f"    levels that failed: {self.failed}")
+        if self.mismatches:
+            print(f"    levels that do not match the fixture: {self.mismatches}")
+        return None
+
+
+def _mismatches(expected: typing.List[Level], actual: typing.List[Level]) -> typing.List[int]:
+    by_id = {level.level_id: level for level in actual}
+    return [level.level_id for level in expected if by_id.get(level.level_id) != level]
+
+
+def _timed(server: AdminServer, direction: str, workers: int, n_levels: int, run: typing.Callable[[], None]) -> RunResult:
+    n_requests, n_errors = server.n_requests, server.n_errors
+    start = time.perf_counter()
+    error = None
+    # noinspection PyBroadException
+    try:
+        run()
+    except Exception as e:
+        error = e
+    result = RunResult(
+        direction, workers, n_levels, time.perf_counter() - start,
+        server.n_requests - n_requests, server.n_errors - n_errors, error=error,
+    )
+    return result
+
+
+def run_save(
+        server: AdminServer,
+        path: str,
+        workers: int = 1,
+        backend: str = BACKEND_HTTP,
+        chrome_driver_path: str = None,
+        chrome_profile: str = DEFAULT_CHROME_PROFILE,
+) -> RunResult:
+    expected = server.sites[SOURCE_GAME_ID].game
+    result = _timed(server, "save", workers, expected.n_levels, lambda: save_game(
+        SOURCE_GAME_ID, server.domain, CREDS, path, chrome_driver_path,
+        keep_existing=False, backend=backend, workers=workers, chrome_profile=chrome_profile,
+    ))
+    if result.error is None:
+        result.mismatches = _mismatches(expected.levels, Game.from_file(path).levels)
+    return result
+
+
+def run_load(
+        server: AdminServer,
+        path: str,
+        chrome_driver_path: str,
+        workers: int = 1,
+        chrome_profile: str = DEFAULT_CHROME_PROFILE,
+) -> RunResult:
+    expected = server.sites[SOURCE_GAME_ID].game
+    target = EditableSite(empty_game(TARGET_GAME_ID, expected.n_levels, server.domain))
+    with server.lock:
+        server.sites[TARGET_GAME_ID] = target
+    reports = []
+    result = _timed(server, "load", workers, expected.n_levels, lambda: reports.append(load_game(
+        TARGET_GAME_ID, server.domain, CREDS, path, chrome_driver_path,
+        resume=False, workers=workers, chrome_profile=chrome_profile,
+    )))
+    if reports:
+        result.failed = sorted(reports[0].failed)
+        # What the target now holds, with the source's game id to compare against the fixture
+        loaded = target.game.copy()
+        loaded.game_id = SOURCE_GAME_ID
+        result.mismatches = _mismatches(expected.levels, loaded.levels)
+    return result
+
+
+def main(argv: typing.List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the server adds to every response")
+    parser.add_argument("--error-rate", type=float, default=0., help="share of requests answered with 503")
+    parser.add_argument("--backend", choices=[BACKEND_HTTP, BACKEND_SELENIUM, BACKEND_BROWSER_FETCH],
+                        default=BACKEND_HTTP)
+    parser.add_argument("--chrome-driver-path", default=None)
+    parser.add_argument("--chrome-profile", choices=[CHROME_PROFILE_LEAN, CHROME_PROFILE_FULL],
+                        default=DEFAULT_CHROME_PROFILE)
+    parser.add_argument("--jquery", default=None, help="local jQuery for Chrome, downloaded from a CDN otherwise")
+    parser.add_argument("--pace", action="store_true", help="keep the default request pacing for the server")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.backend != BACKEND_HTTP and args.chrome_driver_path is None:
+        parser.error(f"--backend {args.backend} needs --chrome-driver-path")
+
+    sites = {SOURCE_GAME_ID: EditableSite(make_game(args.levels, "", SOURCE_GAME_ID))}
+    results = []
+    with AdminServer(sites, latency=args.latency, error_rate=args.error_rate,
+                     jquery_path=args.jquery, seed=args.seed) as server:
+        sites[SOURCE_GAME_ID].game.domain = server.domain
+        if not args.pace:
+            pacer = Pacer.for_domain(server.domain)
+            pacer.rate = pacer.burst = pacer.tokens = 1e9
+        with tempfile.TemporaryDirectory() as tmp:
+            # Logins of this server's short-lived sessions are of no use to later runs
+            SessionStore.set_default(SessionStore(os.path.join(tmp, "sessions")))
+            for workers in args.workers:
+                path = os.path.join(tmp, f"game_{workers}.cega")
+                results.append(run_save(
+                    server, path, workers, args.backend, args.chrome_driver_path, args.chrome_profile,
+                ))
+                if args.chrome_driver_path is not None and results[-1].error is None:
+                    results.append(run_load(server, path, args.chrome_driver_path, workers, args.chrome_profile))
+
+    print(f"\n{args.levels} levels, {args.latency * 1000:.0f} ms latency, {args.error_rate:.1%} errors")
+    print(f"{'run':<6}{'workers':>8}{'levels':>8}{'seconds':>10}{'levels/min':>12}{'requests':>10}{'errors':>8}")
+    for result in results:
+        result.report()
+    if args.chrome_driver_path is None:
+        print("load_game was not run, it needs --chrome-driver-path")
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
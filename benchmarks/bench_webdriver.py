@@ -0,0 +1,184 @@
+"""
+WebDriver round trips of `Level.from_html`/`Level.to_html` against the fake driver,
+scraping hints and bonuses in popups and with `fetch_hints`.
+
+    python -m benchmarks.bench_webdriver [--levels 5] [--command-latency 0.01] [--update-budgets]
+
+Counts commands and simulated time per entity type and per level, checks that scraping
+reproduces the fixture, and exits with 1 when a count is above `budgets.json`.
+"""
+
+import argparse
+from collections import defaultdict
+from dataclasses import dataclass, field
+import json
+import os
+import sys
+import typing
+
+from copy_encounter_game.game import Game, Level
+from copy_encounter_game.game.game_custom_info import GameCustomInfo
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.tracing import tracer
+
+from benchmarks.fake_driver import FakeDriver, CommandRecord, SCOPE_CATEGORIES, COMMAND_LATENCY, PAGE_LOAD_LATENCY
+from benchmarks.fixtures import DOMAIN, GAME_ID, CREDS, make_game
+from benchmarks.site import FakeSite
+
+__all__ = [
+    "BenchResult",
+    "run_scrape",
+    "run_upload",
+    "check_budgets",
+]
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+DEFAULT_LEVELS = 5
+
+
+@dataclass
+class BenchResult:
+    direction: str
+    commands: typing.List[CommandRecord] = field(default_factory=list)
+    calls: typing.Dict[str, int] = field(default_factory=dict)
+    per_level: typing.Dict[int, typing.Tuple[int, float]] = field(default_factory=dict)
+    mismatches: typing.List[int] = field(default_factory=list)
+    unhandled_scripts: typing.List[str] = field(default_factory=list)
+
+    def by_scope(self) -> typing.Dict[str, typing.Tuple[int, int, float]]:
+        """scope -> (commands, page loads, simulated seconds)"""
+        res = defaultdict(lambda: [0, 0, 0.])
+        for record in self.commands:
+            res[record.scope][0] += 1
+            res[record.scope][1] += record.page_loads
+            res[record.scope][2] += record.latency
+        return {scope: tuple(values) for scope, values in res.items()}
+
+    def counts(self) -> typing.Dict[str, int]:
+        counts = {scope: values[0] for scope, values in self.by_scope().items()}
+        counts["total"] = len(self.commands)
+        return counts
+
+    def report(self) -> None:
+        print(f"\n== {self.direction}: {len(self.commands)} WebDriver commands, "
+              f"{sum(r.latency for r in self.commands):.1f} s simulated ==")
+        print(f"{'scope':<32}{'calls':>7}{'commands':>10}{'per call':>10}{'loads':>7}{'sim s':>9}")
+        for scope, (n, loads, seconds) in sorted(self.by_scope().items(), key=lambda kv: -kv[1][0]):
+            calls = self.calls.get(scope, 0)
+            per_call = f"{n / calls:.1f}" if calls else "-"
+            print(f"{scope:<32}{calls:>7}{n:>10}{per_call:>10}{loads:>7}{seconds:>9.2f}")
+        print(f"{'level':<32}{'':>7}{'commands':>10}{'':>10}{'':>7}{'sim s':>9}")
+        for level_id, (n, seconds) in self.per_level.items():
+            print(f"{level_id:<32}{'':>7}{n:>10}{'':>10}{'':>7}{seconds:>9.2f}")
+        if self.mismatches:
+            print(f"Levels that did not round-trip: {self.mismatches}")
+        for script in self.unhandled_scripts:
+            print(f"Script the fake driver does not emulate: {script.strip()[:80]!r}")
+        return None
+
+
+def _calls() -> typing.Dict[str, int]:
+    return {
+        stat.name: stat.count
+        for stat in tracer.summary()
+        if stat.category in SCOPE_CATEGORIES
+    }
+
+
+def _run(
+        direction: str,
+        game: Game,
+        driver: FakeDriver,
+        step: typing.Callable[[Level], typing.Optional[Level]],
+) -> BenchResult:
+    pacer = Pacer.for_domain(game.domain)
+    pacer.rate = pacer.burst = pacer.tokens = 1e9
+    result = BenchResult(direction)
+    tracer.reset()
+    tracer.enable()
+    try:
+        for level in game.levels:
+            start = len(driver.commands)
+            scraped = step(level)
+            records = driver.commands[start:]
+            result.per_level[level.level_id] = (len(records), sum(record.latency for record in records))
+            if scraped is not None and scraped != level:
+                result.mismatches.append(level.level_id)
+    finally:
+        tracer.disable()
+    result.commands = list(driver.commands)
+    result.calls = _calls()
+    result.unhandled_scripts = list(dict.fromkeys(driver.unhandled_scripts))
+    return result
+
+
+def run_scrape(game: Game, fetch_hints: bool = False, **driver_kwargs) -> BenchResult:
+    driver = FakeDriver(FakeSite(game), **driver_kwargs)
+    return _run(
+        "scrape-fetch" if fetch_hints else "scrape", game, driver,
+        lambda level: Level.from_html(driver, game.domain, game.game_id, level.level_id, fetch_hints=fetch_hints),
+    )
+
+
+def run_upload(game: Game, **driver_kwargs) -> BenchResult:
+    driver = FakeDriver(FakeSite(game), **driver_kwargs)
+    gci = GameCustomInfo(game.domain, game.game_id, CREDS, None, driver=driver, session_store=None)
+    # The login is not part of any level
+    driver.commands.clear()
+    return _run("upload", game, driver, lambda level: level.to_html(gci))
+
+
+def check_budgets(results: typing.List[BenchResult], budgets: typing.Dict[str, typing.Dict[str, int]]) -> bool:
+    ok = True
+    for result in results:
+        budget = budgets.get(result.direction, {})
+        for scope, n in sorted(result.counts().items()):
+            if n > budget.get(scope, 0):
+                print(f"Over budget: {result.direction} {scope} issues {n} commands, budget is {budget.get(scope, 0)}")
+                ok = False
+    return ok
+
+
+def main(argv: typing.List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS)
+    parser.add_argument("--command-latency", type=float, default=COMMAND_LATENCY)
+    parser.add_argument("--page-load-latency", type=float, default=PAGE_LOAD_LATENCY)
+    parser.add_argument("--real-time", action="store_true", help="sleep for the simulated latency")
+    parser.add_argument("--update-budgets", action="store_true", help=f"write the current counts to {BUDGETS_PATH}")
+    args = parser.parse_args(argv)
+
+    driver_kwargs = dict(
+        command_latency=args.command_latency,
+        page_load_latency=args.page_load_latency,
+        real_time=args.real_time,
+    )
+    game = make_game(args.levels, DOMAIN, GAME_ID)
+    results = [
+        run_scrape(game, **driver_kwargs),
+        run_scrape(game, fetch_hints=True, **driver_kwargs),
+        run_upload(game, **driver_kwargs),
+    ]
+    for result in results:
+        result.report()
+
+    ok = not any(result.mismatches for result in results)
+    if args.update_budgets:
+        budgets = {"levels": args.levels}
+        budgets.update({result.direction: result.counts() for result in results})
+        with open(BUDGETS_PATH, "w", encoding="utf-8") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBudgets written to {BUDGETS_PATH}")
+    elif os.path.exists(BUDGETS_PATH):
+        with open(BUDGETS_PATH, "r", encoding="utf-8") as f:
+            budgets = json.load(f)
+        if budgets.get("levels") != args.levels:
+            print(f"\nBudgets are for {budgets.get('levels')} levels, not checked")
+        else:
+            ok = check_budgets(results, budgets) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
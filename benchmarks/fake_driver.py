@@ -0,0 +1,529 @@
+"""
+Recording stand-in for `webdriver.Chrome` that answers WebDriver commands from a `FakeSite`
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import itertools
+import math
+import re
+import time
+import typing
+from urllib.parse import urljoin
+
+from selenium.common.exceptions import (
+    NoSuchElementException, NoSuchWindowException, NoAlertPresentException,
+    StaleElementReferenceException, JavascriptException,
+)
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.switch_to import SwitchTo
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from copy_encounter_game.fields import (
+    FieldMap, READ_FIELDS_SCRIPT, WRITE_FIELDS_SCRIPT, FETCH_FIELDS_SCRIPT, read_page_fields,
+)
+from copy_encounter_game.game.answer import ANSWER_LINKS_SCRIPT
+from copy_encounter_game.game.level import Level
+from copy_encounter_game.helpers import READY_SCRIPT
+from copy_encounter_game.html_page import HtmlElement, HtmlPage, compile_selector, script_url, postback_args
+from copy_encounter_game.tracing import tracer
+
+from benchmarks.site import FakeSite
+
+__all__ = [
+    "CommandRecord",
+    "FakeDriver",
+    "select",
+]
+
+# Seconds of simulated time per WebDriver round trip, and extra for every page a command loads
+COMMAND_LATENCY = 0.01
+PAGE_LOAD_LATENCY = 0.3
+# Span categories a command is attributed to, innermost first wins
+SCOPE_CATEGORIES = ("entity", "level", "session")
+
+SELECTOR_SPLIT_RE = re.compile(r"""(?:\[[^\]]*\]|"[^"]*"|'[^']*'|[^\s\[])+""")
+XPATH_STEP_RE = re.compile(r"^(?P<tag>[\w*]+)(?:\[(?P<idx>\d+)\])?$")
+JQUERY_CLICK_RE = re.compile(r"""^\s*\$\((["'])(?P<sel>.+?)\1\)(?:\[(?P<idx>\d+)\])?\.click\(\)\s*;?\s*$""")
+HINT_TABLE_RE = re.compile(r"""\$\('table\.bg_dark'\)\[(\d+)\]""")
+HREFS_RE = re.compile(r"""var \w+ = \$\("(.+?)"\);.*getAttribute\("href"\)""", re.S)
+VAL_RE = re.compile(r"""\$\('(#[-\w]+)'\)\.val\(\)""")
+LENGTH_RE = re.compile(r"""\$\('(.+?)'\)\.length""")
+SET_WHO_RE = re.compile(r"""opt\[i\]\.value == (\S+?)\)""")
+
+
+def select(root: HtmlElement, selector: str) -> typing.List[HtmlElement]:
+    """CSS selector with descendant combinators on top of `compile_selector`"""
+    parts = SELECTOR_SPLIT_RE.findall(selector)
+    matches = root.find_all(predicate=compile_selector(parts[0]))
+    for part in parts[1:]:
+        predicate = compile_selector(part)
+        found = {}
+        for match in matches:
+            for elem in match.iter(predicate=predicate):
+                found[id(elem)] = elem
+        matches = [elem for elem in root.iter() if id(elem) in found]
+    return matches
+
+
+def xpath(root: HtmlElement, path: str) -> typing.List[HtmlElement]:
+    """Absolute paths of tag[index] steps only, as in `/html/body/div[1]/form`"""
+    nodes = [root]
+    for step in path.strip("/").split("/"):
+        match = XPATH_STEP_RE.match(step)
+        if match is None:
+            raise NotImplementedError(f"Unsupported xpath step {step!r}")
+        tag, idx = match.group("tag"), match.group("idx")
+        found = []
+        for node in nodes:
+            children = [
+                child for child in node.children
+                if not child.tag.startswith("#") and (tag == "*" or child.tag == tag)
+            ]
+            found += children[int(idx) - 1:int(idx)] if idx else children
+        nodes = found
+    return nodes
+
+
+@dataclass
+class CommandRecord:
+    command: str
+    scope: str
+    latency: float
+    page_loads: int = 0
+
+
+@dataclass
+class FakeWindow:
+    handle: str
+    page: HtmlPage
+    generation: int = 0
+
+
+class FakeDriver(RemoteWebDriver):
+    """
+    Implements the part of `webdriver.Chrome` the package uses by answering the raw commands
+    in `execute`, so `find_element_by_*`, `WebElement`, `switch_to` and `execute_script` behave
+    as they do against chromedriver. The known scripts of the package are emulated on the
+    parsed page; every command is recorded with the entity span it was issued from and a
+    simulated latency, added to `clock` (and actually slept with `real_time`).
+    """
+
+    def __init__(
+            self,
+            site: FakeSite,
+            command_latency: float = COMMAND_LATENCY,
+            page_load_latency: float = PAGE_LOAD_LATENCY,
+            latency: typing.Dict[str, float] = None,
+            real_time: bool = False,
+    ):
+        # No browser session behind it: `execute` below answers everything
+        self.site = site
+        self.command_latency = command_latency
+        self.page_load_latency = page_load_latency
+        self.latency = latency or {}
+        self.real_time = real_time
+        self.w3c = False
+        self._is_remote = False
+        self.session_id = "fake"
+        self.capabilities = {"browserName": "chrome"}
+        self.command_executor = None
+        self.error_handler = None
+        self._mobile = None
+        self._switch_to = SwitchTo(self)
+
+        self.windows: typing.Dict[str, FakeWindow] = {}
+        self.current: typing.Optional[str] = None
+        self.elements: typing.Dict[str, typing.Tuple[FakeWindow, int, HtmlElement]] = {}
+        self.alert: typing.Optional[typing.Tuple[str, typing.Callable[[], None]]] = None
+        self.commands: typing.List[CommandRecord] = []
+        self.unhandled_scripts: typing.List[str] = []
+        self.clock = 0.
+        self._page_loads = 0
+        self._ids = itertools.count(1)
+        self.open_window("about:blank")
+
+    # Bookkeeping
+
+    @staticmethod
+    def scope() -> str:
+        for category, name in reversed(tracer.open_spans()):
+            if category in SCOPE_CATEGORIES:
+                return name
+        return "other"
+
+    def execute(self, driver_command: str, params: typing.Dict[str, typing.Any] = None):
+        self._page_loads = 0
+        try:
+            value = self.dispatch(driver_command, params or {})
+        finally:
+            latency = self.latency.get(driver_command, self.command_latency)
+            latency += self._page_loads * self.page_load_latency
+            self.commands.append(CommandRecord(driver_command, self.scope(), latency, self._page_loads))
+            self.clock += latency
+            if self.real_time:
+                time.sleep(latency)
+        return {"status": 0, "value": value}
+
+    @property
+    def window(self) -> FakeWindow:
+        if self.current not in self.windows:
+            raise NoSuchWindowException("The current window was closed")
+        return self.windows[self.current]
+
+    @property
+    def page(self) -> HtmlPage:
+        return self.window.page
+
+    def open_window(self, url: str) -> FakeWindow:
+        handle = f"CDwindow-{next(self._ids)}"
+        window = FakeWindow(handle, HtmlPage.parse(url, "<html><body></body></html>"))
+        self.windows[handle] = window
+        if self.current is None:
+            self.current = handle
+        if url != "about:blank":
+            self.load(window, "GET", url)
+        return window
+
+    def load(self, window: FakeWindow, method: str, url: str, fields: typing.Dict[str, str] = None) -> None:
+        final_url, html = self.site.handle(method, url, fields)
+        window.page = HtmlPage.parse(final_url, html)
+        window.generation += 1
+        self._page_loads += 1
+        return None
+
+    def element(self, element_id: str) -> HtmlElement:
+        window, generation, elem = self.elements[element_id]
+        if window.handle not in self.windows or window.generation != generation:
+            raise StaleElementReferenceException("Element is not attached to the page document")
+        return elem
+
+    def web_element(self, elem: HtmlElement) -> WebElement:
+        element_id = f"el-{next(self._ids)}"
+        self.elements[element_id] = (self.window, self.window.generation, elem)
+        return self.create_web_element(element_id)
+
+    # Commands
+
+    def dispatch(self, command: str, params: typing.Dict[str, typing.Any]) -> typing.Any:
+        if command == Command.GET:
+            self.load(self.window, "GET", params["url"])
+            return None
+        if command == Command.GET_CURRENT_URL:
+            return self.page.url
+        if command == Command.GET_TITLE:
+            title = self.page.find(tag="title")
+            return "" if title is None else title.text
+        if command == Command.GET_WINDOW_HANDLES:
+            return list(self.windows)
+        if command == Command.GET_CURRENT_WINDOW_HANDLE:
+            return self.window.handle
+        if command == Command.SWITCH_TO_WINDOW:
+            if params["name"] not in self.windows:
+                raise NoSuchWindowException(f"No window {params['name']!r}")
+            self.current = params["name"]
+            return None
+        if command == Command.CLOSE:
+            del self.windows[self.window.handle]
+            return None
+        if command == Command.QUIT:
+            self.windows.clear()
+            return None
+        if command in (Command.FIND_ELEMENT, Command.FIND_ELEMENTS):
+            return self.find(self.page.root, params, command == Command.FIND_ELEMENTS)
+        if command in (Command.FIND_CHILD_ELEMENT, Command.FIND_CHILD_ELEMENTS):
+            return self.find(self.element(params["id"]), params, command == Command.FIND_CHILD_ELEMENTS)
+        if command == Command.CLICK_ELEMENT:
+            self.click(self.element(params["id"]))
+            return None
+        if command == Command.GET_ELEMENT_TEXT:
+            return " ".join(self.element(params["id"]).text.split())
+        if command == Command.GET_ELEMENT_ATTRIBUTE:
+            return self.attribute(self.element(params["id"]), params["name"])
+        if command == Command.SEND_KEYS_TO_ELEMENT:
+            elem = self.element(params["id"])
+            elem.attrs["value"] = elem.attrs.get("value", "") + "".join(params["value"])
+            return None
+        if command == Command.SUBMIT_ELEMENT:
+            self.submit(self.element(params["id"]))
+            return None
+        if command in (Command.IS_ELEMENT_ENABLED, Command.IS_ELEMENT_DISPLAYED):
+            self.element(params["id"])
+            return True
+        if command in (Command.EXECUTE_SCRIPT, Command.EXECUTE_ASYNC_SCRIPT):
+            return self.run_script(params["script"], params.get("args", []))
+        if command == Command.GET_ALERT_TEXT:
+            if self.alert is None:
+                raise NoAlertPresentException("No alert is open")
+            return self.alert[0]
+        if command in (Command.ACCEPT_ALERT, Command.DISMISS_ALERT):
+            if self.alert is None:
+                raise NoAlertPresentException("No alert is open")
+            _, action = self.alert
+            self.alert = None
+            if command == Command.ACCEPT_ALERT:
+                action()
+            return None
+        if command == Command.GET_ALL_COOKIES:
+            return []
+        return None
+
+    def find(self, root: HtmlElement, params: typing.Dict[str, str], many: bool) -> typing.Any:
+        using, value = params["using"], params["value"]
+        if using == "id":
+            matches = root.find_all(id_=value)
+        elif using == "name":
+            matches = root.find_all(name=value)
+        elif using == "css selector":
+            matches = select(root, value)
+        elif using == "xpath":
+            matches = xpath(root, value)
+        elif using == "tag name":
+            matches = root.find_all(tag=value)
+        else:
+            raise NotImplementedError(f"Locating elements by {using} is not part of the fake")
+        if many:
+            return [self.web_element(elem) for elem in matches]
+        if not matches:
+            raise NoSuchElementException(f"Unable to locate element: {using}={value!r}")
+        return self.web_element(matches[0])
+
+    def attribute(self, elem: HtmlElement, name: str) -> typing.Optional[str]:
+        if name == "value":
+            return elem.value
+        if name in ("checked", "selected"):
+            return "true" if name in elem.attrs else None
+        value = elem.attrs.get(name)
+        if name == "href" and value is not None and not value.lower().startswith("javascript:"):
+            return urljoin(self.page.url, value)
+        return value
+
+    # Browser behaviour
+
+    def click(self, elem: HtmlElement) -> None:
+        type_ = elem.attrs.get("type", "").lower()
+        if elem.tag == "input" and type_ == "radio":
+            for other in self.page.find_all(tag="input", name=elem.name):
+                other.attrs.pop("checked", None)
+            elem.attrs["checked"] = "checked"
+        elif elem.tag == "input" and type_ == "checkbox":
+            if elem.checked:
+                elem.attrs.pop("checked")
+            else:
+                elem.attrs["checked"] = "checked"
+        elif (elem.tag == "input" and type_ in ("submit", "image")) or elem.tag == "button":
+            self.submit(elem, elem)
+        elif elem.tag == "a":
+            href = elem.attrs.get("href", "")
+            if "confirm(" in elem.attrs.get("onclick", ""):
+                self.alert = ("Delete?", lambda: self.follow(href))
+            else:
+                self.follow(href)
+        return None
+
+    def follow(self, href: str) -> None:
+        pb = postback_args(href)
+        if pb is not None:
+            self.submit(None, fields={"__EVENTTARGET": pb[0], "__EVENTARGUMENT": pb[1]})
+            return None
+        url = script_url(href)
+        if url is None:
+            return None
+        if href.lower().startswith("javascript:"):
+            self.open_window(urljoin(self.page.url, url))
+        else:
+            self.load(self.window, "GET", urljoin(self.page.url, url))
+        return None
+
+    def submit(
+            self,
+            elem: typing.Optional[HtmlElement],
+            button: HtmlElement = None,
+            fields: typing.Dict[str, str] = None,
+    ) -> None:
+        page = self.page
+        data = page.form_fields()
+        if button is not None and button.name:
+            data[button.name] = button.attrs.get("value", "")
+        data.update(fields or {})
+        self.load(self.window, "POST", urljoin(page.url, page.form_action()), data)
+        return None
+
+    # Scripts
+
+    def by_key(self, key: str) -> typing.Optional[HtmlElement]:
+        return self.page.by_id(key) or self.page.by_name(key)
+
+    def run_script(self, script: str, args: typing.List[typing.Any]) -> typing.Any:
+        page = self.page
+        if script == READY_SCRIPT:
+            return True
+        if script == READ_FIELDS_SCRIPT:
+            spec = FieldMap(**{key: tuple(value) for key, value in args[0].items()})
+            return read_page_fields(page, spec)
+        if script == WRITE_FIELDS_SCRIPT:
+            return self.write_fields(args[0])
+        if script == ANSWER_LINKS_SCRIPT:
+            return self.answer_links()
+        if script == FETCH_FIELDS_SCRIPT:
+            return self.fetch_fields(*args)
+        if "document.querySelector(arguments[0])" in script:
+            matches = select(page.root, args[0])
+            if matches:
+                self.click(matches[0])
+            return bool(matches)
+        match = JQUERY_CLICK_RE.match(script)
+        if match:
+            matches = select(page.root, match.group("sel"))
+            if match.group("idx") is not None:
+                idx = int(match.group("idx"))
+                if idx >= len(matches):
+                    raise JavascriptException("javascript error: Cannot read property 'click' of undefined")
+                matches = [matches[idx]]
+            for elem in matches:
+                self.click(elem)
+            return None
+        match = HINT_TABLE_RE.search(script)
+        if match:
+            return Level.hint_urls_from_page(page, int(match.group(1)) - 2)
+        match = HREFS_RE.search(script)
+        if match:
+            return [elem.attrs.get("href") for elem in select(page.root, match.group(1))]
+        match = VAL_RE.search(script)
+        if match:
+            matches = select(page.root, match.group(1))
+            return matches[0].value if matches else None
+        match = LENGTH_RE.search(script)
+        if match:
+            return len(select(page.root, match.group(1)))
+        if "$('select.input')[0].options" in script:
+            return self.who_script(script)
+        if ".each(" in script and "enCheckBox" in script:
+            return [
+                [i + 1, elem.name, "checked" if elem.checked else None]
+                for i, elem in enumerate(select(page.root, '.enCheckBox[name^="level"]'))
+            ]
+        if "GameEditor(" in script or "window.open(" in script:
+            self.open_window(urljoin(page.url, script_url(script)))
+            return None
+        self.unhandled_scripts.append(script)
+        return None
+
+    def answer_links(self) -> typing.Dict[str, typing.Any]:
+        """What `ANSWER_LINKS_SCRIPT` returns"""
+        page = self.page
+
+        def hrefs(title: str) -> typing.List[str]:
+            return [urljoin(page.url, elem.attrs.get("href")) for elem in select(page.root, f"a[title='{title}']")]
+        names = page.by_id("hdnSectorNames_0")
+        return {
+            "url": page.url,
+            "answers": hrefs("Add answers"),
+            "sector": hrefs("Add sector"),
+            "names": names and names.value,
+        }
+
+    def fetch_fields(self, jobs: typing.List[typing.Dict[str, typing.Any]], concurrency: int) -> typing.List[dict]:
+        """
+        What `FETCH_FIELDS_SCRIPT` does: the requests go to the site without touching any window.
+        They are in flight `concurrency` at a time, so they cost as many rounds of page loads.
+        """
+        base = self.page.url
+        results, n_requests = [], 0
+        for job in jobs:
+            # noinspection PyBroadException
+            try:
+                page = HtmlPage.parse(*self.site.handle("GET", urljoin(base, job["url"])))
+                n_requests += 1
+                edits = select(page.root, job["edit"]) if job["edit"] else []
+                if edits:
+                    href = edits[0].attrs.get("href")
+                    pb = postback_args(href)
+                    if pb is None:
+                        page = HtmlPage.parse(*self.site.handle("GET", urljoin(page.url, href)))
+                    else:
+                        data = page.form_fields()
+                        data.update({"__EVENTTARGET": pb[0], "__EVENTARGUMENT": pb[1]})
+                        page = HtmlPage.parse(*self.site.handle("POST", urljoin(page.url, page.form_action()), data))
+                    n_requests += 1
+                spec = FieldMap(**{key: tuple(value) for key, value in job["spec"].items()})
+                results.append({"fields": read_page_fields(page, spec)})
+            except Exception as e:
+                results.append({"error": repr(e)})
+        self._page_loads += math.ceil(n_requests / max(1, concurrency))
+        return results
+
+    def who_script(self, script: str) -> typing.Optional[int]:
+        selects = select(self.page.root, "select.input")
+        if not selects:
+            raise JavascriptException("javascript error: Cannot read property 'options' of undefined")
+        match = SET_WHO_RE.search(script)
+        if match:
+            self.choose(selects[0], match.group(1))
+            return None
+        value = selects[0].value
+        return None if value is None else int(value)
+
+    @staticmethod
+    def choose(elem: HtmlElement, value: str) -> None:
+        options = list(elem.iter(tag="option"))
+        if not any(opt.attrs.get("value") == value for opt in options):
+            return None
+        for opt in options:
+            if opt.attrs.get("value") == value:
+                opt.attrs["selected"] = "selected"
+            else:
+                opt.attrs.pop("selected", None)
+        return None
+
+    @staticmethod
+    def set_text(elem: HtmlElement, text: str) -> None:
+        elem.children = []
+        elem.texts = [text]
+        elem.attrs["value"] = text
+        return None
+
+    def write_fields(self, state: typing.Dict[str, typing.Any]) -> typing.Optional[str]:
+        """What `WRITE_FIELDS_SCRIPT` does, on the parsed page"""
+        root = self.page.root
+        for key in state["clicks"]:
+            elem = self.by_key(key)
+            if elem is not None:
+                self.click(elem)
+        for key, wanted in state["checks"].items():
+            elem = self.by_key(key)
+            if elem is not None and elem.checked != wanted:
+                self.click(elem)
+        for selector, wanted in state["check_indices"].items():
+            for i, elem in enumerate(select(root, selector)):
+                if elem.checked != (i + 1 in wanted):
+                    self.click(elem)
+        for selector, idx, times in state["repeat_clicks"]:
+            for _ in range(times):
+                matches = select(root, selector)
+                if idx >= len(matches):
+                    raise JavascriptException("javascript error: Cannot read property 'click' of undefined")
+                self.click(matches[idx])
+        for key, value in state["values"].items():
+            elem = self.by_key(key)
+            if elem is not None:
+                elem.attrs["value"] = value
+        for key, text in state["texts"].items():
+            elem = self.by_key(key)
+            if elem is not None:
+                self.set_text(elem, text)
+        for selector, value in state["selects"].items():
+            matches = select(root, selector)
+            if matches:
+                self.choose(matches[0], value)
+        for selector, values in state["list_values"].items():
+            for elem, value in zip(select(root, selector), values):
+                elem.attrs["value"] = value
+        for selector in state["submit"]:
+            matches = select(root, selector)
+            if matches:
+                self.click(matches[0])
+                return selector
+        return None
@@ -0,0 +1,66 @@
+"""
+Deterministic games to benchmark against
+"""
+
+import typing
+
+from copy_encounter_game.game import (
+    Game, Level, LevelName, Autopass, AnswerBlock, SectorsToCover, Task, Hint, PenalizedHint, Bonus,
+    Answer, AnswerOption,
+)
+
+__all__ = [
+    "DOMAIN",
+    "GAME_ID",
+    "CREDS",
+    "make_level",
+    "make_game",
+]
+
+DOMAIN = "bench.en.cx"
+GAME_ID = 4242
+CREDS = {"user": "bench", "password": "bench"}
+
+
+def make_level(level_id: int, n_levels: int, domain: str = DOMAIN, game_id: int = GAME_ID) -> Level:
+    """Odd levels have three named sectors, one of them longer than a single answer form; even ones have none"""
+    with_sectors = level_id % 2 == 1
+    if with_sectors:
+        answers = [
+            Answer([AnswerOption(f"l{level_id}s{s}a{a}") for a in range(12 if s == 0 else 3)], f"Sector {s + 1}", s)
+            for s in range(3)
+        ]
+    else:
+        answers = [Answer([AnswerOption(f"l{level_id}a{a}") for a in range(5)], None, 0)]
+
+    level = Level(
+        domain, game_id, level_id,
+        LevelName(f"Level {level_id}"),
+        Autopass(True, (0, 30, 0), (0, 10, 0)) if with_sectors else Autopass(),
+        AnswerBlock(True, level_id % 3 == 0, 3, (0, 1, 0)) if with_sectors else AnswerBlock(),
+        SectorsToCover(2) if with_sectors else SectorsToCover(),
+        [Task(False, f"Task of level {level_id}")],
+        [Hint((0, 0, 15 * (k + 1), 0), f"Hint {k + 1} of level {level_id}", 0) for k in range(3)],
+        [
+            PenalizedHint((0, 0, 0, 0), f"Penalized hint {k + 1}", 0, f"Costs {k + 1} minutes", True, (0, k + 1, 0))
+            for k in range(2)
+        ],
+        [
+            Bonus(
+                f"Bonus {k + 1}", f"Bonus task {k + 1}", [f"b{level_id}{k}{a}" for a in range(3)],
+                levels_available=[1, n_levels] if k == 1 and n_levels > 1 else None,
+                appearence_delay=(0, 5, 0) if k == 0 else None,
+                bonus_time=(0, 2 * (k + 1), 0),
+                hint_text=f"Bonus hint {k + 1}",
+                dedicated_to_who=0,
+            )
+            for k in range(2)
+        ],
+        answers,
+    )
+    return level
+
+
+def make_game(n_levels: int = 5, domain: str = DOMAIN, game_id: int = GAME_ID) -> Game:
+    levels: typing.List[Level] = [make_level(i + 1, n_levels, domain, game_id) for i in range(n_levels)]
+    return Game(domain, game_id, levels)
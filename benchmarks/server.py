@@ -0,0 +1,284 @@
+"""
+Local HTTP stand-in for the Encounter admin, serving `EditableSite` games with injected latency and errors
+
+    python -m benchmarks.server [--port 8080] [--levels 5] [--latency 0.05] [--error-rate 0.01]
+"""
+
+from __future__ import annotations
+
+import argparse
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import logging
+import random
+import secrets
+import sys
+import threading
+import time
+import typing
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from copy_encounter_game.game import Game, Level
+
+from benchmarks.fixtures import CREDS, make_game
+from benchmarks.site import EditableSite, FakeSite, FILES_PATH, JQUERY_PATH
+
+__all__ = [
+    "AdminServer",
+    "empty_game",
+]
+
+logger = logging.getLogger(__name__)
+
+# Where a browser gets jQuery from when no local copy is given to the server
+JQUERY_URL = "https://code.jquery.com/jquery-1.12.4.min.js"
+SESSION_COOKIE = "atoken"
+# Pages answered even when errors are injected, so that a run does not die before it starts
+NEVER_FAIL = ("Login.aspx",)
+
+
+def empty_game(game_id: int, n_levels: int, domain: str = "") -> Game:
+    """A target for uploads: the levels exist, as `Game.to_html` expects, but have nothing in them"""
+    return Game(domain, game_id, [Level(domain, game_id, i + 1) for i in range(n_levels)])
+
+
+def parse_multipart(
+        content_type: str,
+        body: bytes,
+) -> typing.Tuple[typing.Dict[str, str], typing.Dict[str, typing.Tuple[str, bytes]]]:
+    """(fields, input name -> (file name, content)) of a multipart/form-data body"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        content = part.get_payload(decode=True) or b""
+        fname = part.get_filename()
+        if fname is not None:
+            files[name] = (fname, content)
+        else:
+            fields[name] = content.decode(part.get_content_charset() or "utf-8")
+    return fields, files
+
+
+class AdminServer(ThreadingHTTPServer):
+    """
+    Serves one `EditableSite` per game id on 127.0.0.1. Admin pages need the cookie set by the login page.
+    Every request waits `latency` seconds (±50 % jitter); with probability `error_rate` it then fails with 503.
+    Site state is changed under one lock, the waiting happens outside of it.
+    """
+    daemon_threads = True
+
+    def __init__(
+            self,
+            sites: typing.Dict[int, EditableSite],
+            port: int = 0,
+            latency: float = 0.,
+            error_rate: float = 0.,
+            jquery_path: str = None,
+            seed: int = None,
+    ):
+        super().__init__(("127.0.0.1", port), AdminHandler)
+        self.sites = sites
+        self.latency = latency
+        self.error_rate = error_rate
+        self.jquery_path = jquery_path
+        self.random = random.Random(seed)
+        self.tokens: typing.Set[str] = set()
+        self.lock = threading.Lock()
+        self.n_requests = 0
+        self.n_errors = 0
+        self.thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def domain(self) -> str:
+        """What to pass as the domain to `save_game`/`load_game`"""
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def site(self, query: typing.Dict[str, str]) -> EditableSite:
+        gid = query.get("gid")
+        if gid is not None and int(gid) in self.sites:
+            return self.sites[int(gid)]
+        return next(iter(self.sites.values()))
+
+    def delay(self, may_fail: bool = True) -> bool:
+        """Sleeps for the injected latency; True if this request has to fail"""
+        with self.lock:
+            jitter = self.random.uniform(0.5, 1.5)
+            failed = may_fail and self.random.random() < self.error_rate
+            self.n_requests += 1
+            self.n_errors += failed
+        if self.latency:
+            time.sleep(self.latency * jitter)
+        return failed
+
+    def start(self) -> AdminServer:
+        self.thread = threading.Thread(target=self.serve_forever, name="admin-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        return None
+
+    def __enter__(self) -> AdminServer:
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+        return None
+
+
+class AdminHandler(BaseHTTPRequestHandler):
+    server: AdminServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format_: str, *args) -> None:
+        logger.debug("%s %s", self.address_string(), format_ % args)
+        return None
+
+    def do_GET(self) -> None:
+        self.dispatch("GET")
+        return None
+
+    def do_HEAD(self) -> None:
+        self.dispatch("HEAD")
+        return None
+
+    def do_POST(self) -> None:
+        self.dispatch("POST")
+        return None
+
+    def dispatch(self, method: str) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        parts = urlsplit(self.path)
+        page = parts.path.rsplit("/", 1)[-1]
+        if self.server.delay(page not in NEVER_FAIL):
+            self.respond(503, b"Service Unavailable", "text/plain")
+            return None
+
+        if parts.path == JQUERY_PATH:
+            self.send_jquery()
+        elif parts.path.startswith(FILES_PATH):
+            self.send_file(parts.path[len(FILES_PATH):], method)
+        elif page != "Login.aspx" and not self.logged_in():
+            self.redirect(f"/Login.aspx?return={parts.path}")
+        else:
+            self.send_page(method, body)
+        return None
+
+    def logged_in(self) -> bool:
+        cookies = dict(
+            pair.strip().split("=", 1)
+            for pair in (self.headers.get("Cookie") or "").split(";")
+            if "=" in pair
+        )
+        return cookies.get(SESSION_COOKIE) in self.server.tokens
+
+    def send_page(self, method: str, body: bytes) -> None:
+        url = f"http://{self.headers.get('Host') or self.server.domain}{self.path}"
+        page, query = FakeSite.parse(url)
+        fields, files = {}, {}
+        if method == "POST":
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("multipart/form-data"):
+                fields, files = parse_multipart(content_type, body)
+            else:
+                fields = {
+                    key: values[0]
+                    for key, values in parse_qs(body.decode("utf-8"), keep_blank_values=True).items()
+                }
+
+        with self.server.lock:
+            final_url, html = self.server.site(query).handle(method, url, fields, files)
+
+        headers = {}
+        if page == "Login.aspx" and method == "POST":
+            token = secrets.token_hex(16)
+            self.server.tokens.add(token)
+            headers["Set-Cookie"] = f"{SESSION_COOKIE}={token}; Path=/"
+        if final_url != url:
+            # Post/redirect/get, as the admin does after a save
+            self.redirect(final_url, headers)
+        else:
+            self.respond(200, html.encode("utf-8"), "text/html; charset=utf-8", headers)
+        return None
+
+    def send_file(self, path: str, method: str) -> None:
+        gid, _, name = path.partition("/")
+        site = self.server.sites.get(int(gid)) if gid.isdigit() else None
+        content = None if site is None else site.files.get(unquote(name))
+        if content is None:
+            self.respond(404, b"Not Found", "text/plain")
+        else:
+            self.respond(200, content, "application/octet-stream", head=method == "HEAD")
+        return None
+
+    def send_jquery(self) -> None:
+        if self.server.jquery_path is None:
+            self.redirect(JQUERY_URL)
+            return None
+        with open(self.server.jquery_path, "rb") as f:
+            self.respond(200, f.read(), "application/javascript")
+        return None
+
+    def redirect(self, location: str, headers: typing.Dict[str, str] = None) -> None:
+        self.respond(303, b"", "text/plain", {"Location": location, **(headers or {})})
+        return None
+
+    def respond(
+            self,
+            status: int,
+            content: bytes,
+            content_type: str,
+            headers: typing.Dict[str, str] = None,
+            head: bool = False,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(content)
+        return None
+
+
+def main(argv: typing.List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--levels", type=int, default=5)
+    parser.add_argument("--source-game-id", type=int, default=4242, help="game filled with the fixture levels")
+    parser.add_argument("--target-game-id", type=int, default=4343, help="game with empty levels to upload into")
+    parser.add_argument("--latency", type=float, default=0., help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0., help="share of requests answered with 503")
+    parser.add_argument("--jquery", default=None, help=f"local jQuery to serve instead of {JQUERY_URL}")
+    args = parser.parse_args(argv)
+
+    sites = {
+        args.source_game_id: EditableSite(make_game(args.levels, game_id=args.source_game_id)),
+        args.target_game_id: EditableSite(empty_game(args.target_game_id, args.levels)),
+    }
+    server = AdminServer(sites, args.port, args.latency, args.error_rate, args.jquery)
+    print(
+        f"Serving games {args.source_game_id} (fixture) and {args.target_game_id} (empty) at {server.domain}, "
+        f"log in as {CREDS['user']!r}/{CREDS['password']!r}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
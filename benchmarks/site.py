@@ -0,0 +1,580 @@
+"""
+In-memory stand-in for the Encounter admin pages, rendered from a `Game`
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from html import escape
+import os
+import typing
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+from copy_encounter_game.fields import read_page_fields
+from copy_encounter_game.game import (
+    Game, Level, LevelName, Autopass, AnswerBlock, SectorsToCover, Hint, PenalizedHint, Bonus, Task,
+    Answer, AnswerOption,
+)
+from copy_encounter_game.html_page import HtmlElement, HtmlPage
+from copy_encounter_game.constants import CHUNK_SIZE_FILES
+from copy_encounter_game.game.answer import MAX_ANSWERS_PER_SECTOR
+
+__all__ = [
+    "FakeSite",
+    "EditableSite",
+    "FILES_PATH",
+]
+
+ADMIN_PATH = "/Administration/Games/"
+# Uploaded game files are listed as FILES_PATH/<game id>/<file name>
+FILES_PATH = "/files/"
+ANSWER_BUTTONS = ("btnSaveSector", "AnswersTable_ctl00_NewAnswerEditor_ctl00_btnSave", "btnSaveAnswers")
+CONFIRM_DELETE = "return confirm('Delete?');"
+# Served by `benchmarks.server`, so that a real browser gets the jQuery the package's scripts rely on
+JQUERY_PATH = "/scripts/jquery.js"
+# The admin's own helpers that links and popups call
+PAGE_SCRIPT = """
+function GameEditor(url, name) { window.open(url, name || 'GameEditor'); }
+function Editor(url, name) { window.open(url, name || 'Editor'); }
+function __doPostBack(target, argument) {
+    var form = document.forms[0];
+    form.__EVENTTARGET.value = target;
+    form.__EVENTARGUMENT.value = argument;
+    form.submit();
+}
+"""
+
+
+def _attrs(**attrs) -> str:
+    parts = []
+    for key, value in attrs.items():
+        key = key.rstrip("_")
+        if value is None or value is False:
+            continue
+        if value is True:
+            parts.append(key)
+        else:
+            parts.append(f'{key}="{escape(str(value))}"')
+    return " ".join(parts)
+
+
+def _input(name: str, value: typing.Any = "", type_: str = "text", **attrs) -> str:
+    return f"<input {_attrs(type=type_, name=name, value=value, **attrs)}>"
+
+
+def _checkbox(id_: str, checked: bool, type_: str = "checkbox", name: str = None, **attrs) -> str:
+    # A radio button posts its own id, so the server can tell which one of the group is checked
+    value = id_ if type_ == "radio" else None
+    return f"<input {_attrs(type=type_, id=id_, name=name or id_, value=value, checked=bool(checked), **attrs)}>"
+
+
+def _textarea(name: str, text: str, **attrs) -> str:
+    return f"<textarea {_attrs(name=name, id=name, **attrs)}>{escape(text or '')}</textarea>"
+
+
+def _who_select(name: str, who: typing.Optional[int], class_: str = "input") -> str:
+    who = who or 0
+    options = [0] if who == 0 else [0, who]
+    opts = "".join(
+        f"<option {_attrs(value=value, selected=value == who)}>{'All' if value == 0 else value}</option>"
+        for value in options
+    )
+    return f'<select {_attrs(name=name, class_=class_)}>{opts}</select>'
+
+
+def _postback(target: str) -> str:
+    return f"javascript:__doPostBack('{target}','')"
+
+
+def _editor(path: str) -> str:
+    return f"javascript:GameEditor('./{path}')"
+
+
+def _page(action: str, body: str, enctype: str = None) -> str:
+    return (
+        f'<html><head><title>Encounter</title>'
+        f'<script src="{JQUERY_PATH}"></script><script>{PAGE_SCRIPT}</script></head><body><div>'
+        f'<form {_attrs(method="post", action=action, enctype=enctype)}>'
+        f'{_input("__VIEWSTATE", "fake", "hidden")}'
+        f'{_input("__EVENTTARGET", "", "hidden", id="__EVENTTARGET")}'
+        f'{_input("__EVENTARGUMENT", "", "hidden", id="__EVENTARGUMENT")}'
+        f'{body}</form></div></body></html>'
+    )
+
+
+def _hms(values: typing.Optional[typing.Sequence[int]], names: typing.Sequence[str]) -> str:
+    values = values or [0] * len(names)
+    return "".join(_input(name, value) for name, value in zip(names, values))
+
+
+def _fill_form(page: HtmlPage, fields: typing.Dict[str, str]) -> HtmlPage:
+    """Puts posted `fields` into the form of a freshly rendered `page`, as the browser had it before the post"""
+    for elem in page.find_all(predicate=lambda e: e.tag in ("input", "textarea", "select") and bool(e.name)):
+        type_ = elem.attrs.get("type", "text").lower()
+        value = fields.get(elem.name)
+        if type_ in ("submit", "button", "image", "file", "hidden"):
+            continue
+        if type_ in ("checkbox", "radio"):
+            elem.attrs.pop("checked", None)
+            if value is not None and value == elem.attrs.get("value", "on"):
+                elem.attrs["checked"] = ""
+        elif elem.tag == "textarea":
+            elem.children, elem.texts = [], [value or ""]
+        elif elem.tag == "select":
+            elem.children = [HtmlElement("option", {"value": value or "0", "selected": ""}, parent=elem)]
+        else:
+            elem.attrs["value"] = value or ""
+    return page
+
+
+@dataclass
+class FakeSite:
+    """
+    Serves the pages of one game the way the admin UI lays them out, as far as the package's
+    selectors and scripts look at them. `handle` is what a browser or an HTTP client would
+    get back for a request; form posts are recorded in `posts` and otherwise change nothing.
+    """
+    game: Game
+    posts: typing.List[typing.Tuple[str, typing.Dict[str, str]]] = field(default_factory=list)
+
+    @staticmethod
+    def parse(url: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+        parts = urlsplit(url)
+        page = parts.path.rsplit("/", 1)[-1]
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        return page, query
+
+    def level(self, query: typing.Dict[str, str]) -> Level:
+        return self.game.levels[int(query["level"]) - 1]
+
+    @staticmethod
+    def level_path(level: Level, **extra) -> str:
+        query = urlencode({"gid": level.game_id, "level": level.level_id, **extra})
+        return f"LevelEditor.aspx?{query}"
+
+    def handle(
+            self,
+            method: str,
+            url: str,
+            fields: typing.Dict[str, str] = None,
+    ) -> typing.Tuple[str, str]:
+        """(final url, html) of a GET or a form POST"""
+        page, query = self.parse(url)
+        if method == "POST":
+            self.posts.append((url, dict(fields or {})))
+            url = self.after_post(url, page, query, fields or {})
+            page, query = self.parse(url)
+        return url, self.render(page, query)
+
+    def after_post(self, url: str, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str]) -> str:
+        """Where the browser ends up after a form post"""
+        if page == "Login.aspx":
+            return f"http://{urlsplit(url).netloc}{ADMIN_PATH}LevelManager.aspx?gid={self.game.game_id}"
+        if page == "LevelEditor.aspx" and "addanswers" in query:
+            return f"http://{urlsplit(url).netloc}{ADMIN_PATH}{self.level_path(self.level(query))}"
+        return url
+
+    def render(self, page: str, query: typing.Dict[str, str]) -> str:
+        renderers = {
+            "Login.aspx": self.login_page,
+            "LevelManager.aspx": self.manager_page,
+            "LevelEditor.aspx": self.level_page,
+            "NameCommentEdit.aspx": self.name_page,
+            "PromptEdit.aspx": self.hint_page,
+            "BonusEdit.aspx": self.bonus_page,
+            "TaskEdit.aspx": self.task_page,
+            "FileUploader.aspx": self.uploader_page,
+        }
+        renderer = renderers.get(page)
+        if renderer is None:
+            return _page(page, f"<p>Page {escape(page)} is not part of the fake</p>")
+        return renderer(query)
+
+    def login_page(self, query: typing.Dict[str, str]) -> str:
+        # GameCustomInfo.login clicks /html/body/div[1]/form/div/div[1]/input[3]
+        return (
+            '<html><body><div><form method="post" action="/Login.aspx?return=%2f"><div><div>'
+            f'{_input("Login", "", id="txtLogin")}'
+            f'{_input("Password", "", "password", id="txtPassword")}'
+            f'{_input("EnButton1", "Sign in", "submit")}'
+            '</div></div></form></div></body></html>'
+        )
+
+    def manager_page(self, query: typing.Dict[str, str]) -> str:
+        rows = "".join(
+            f"<tr><td>{_input(f'txtLevelName_{level.level_id}', level.name.name if level.name else '')}</td></tr>"
+            for level in self.game.levels
+        )
+        files = "".join(
+            f'<a {_attrs(id=f"lnkViewFile_{i}", href=url)}>{escape(url.split("/")[-1])}</a>'
+            for i, url in enumerate(self.game.files.file_urls)
+        )
+        return _page("LevelManager.aspx", f'<table>{rows}</table><div class="border_rad2">{files}</div>')
+
+    def uploader_page(self, query: typing.Dict[str, str]) -> str:
+        body = "".join(_input(f"inputFile{i + 1}", None, "file") for i in range(CHUNK_SIZE_FILES)) + \
+            _input("btnUpload", "Upload", "submit", title="Upload")
+        return _page(f"FileUploader.aspx?{urlencode(query)}", body, "multipart/form-data")
+
+    def level_page(self, query: typing.Dict[str, str]) -> str:
+        level = self.level(query)
+        if "addanswers" in query:
+            return self.add_answers_page(level, query)
+        if "editanswers" in query:
+            return self.answer_page(level, int(query["sector"]))
+        return _page(self.level_path(level), "".join([
+            self.settings_table(level),
+            self.task_table(level),
+            self.hints_table(level, level.hints, 0),
+            self.hints_table(level, level.penalized_hints, 1),
+            self.hints_table(level, level.bonuses, 2),
+            self.answers_block(level),
+        ]))
+
+    def settings_table(self, level: Level) -> str:
+        ap, block, sectors = level.autopass, level.answer_block, level.sectors_to_cover
+        ap_enabled = ap is not None and ap.enabled
+        block_enabled = block is not None and block.enabled
+        parts = [
+            f'<a {_attrs(id="lnkAdjustAutopass", href=_postback("lnkAdjustAutopass"))}>'
+            f'{"yes" if ap_enabled else "no"}</a>',
+            '<div id="AutoPassSettingsHolder">',
+            _hms(ap.autopass_time if ap_enabled else None, ("txtApHours", "txtApMinutes", "txtApSeconds")),
+            _hms(
+                ap.penalty_time if ap_enabled else None,
+                ("txtApPenaltyHours", "txtApPenaltyMinutes", "txtApPenaltySeconds"),
+            ),
+            _checkbox("chkTimeoutPenalty", ap_enabled and ap.penalty),
+            _input("btnSaveAutopass", "Save", "submit", title="Save"),
+            "</div>",
+            f'<a {_attrs(id="lnkAnswerBlockingStatus", href=_postback("lnkAnswerBlockingStatus"))}>'
+            f'{"enabled" if block_enabled else "disabled"}</a>',
+            '<div id="divAnswerBlockingSettings">',
+            _input("txtAttemptsNumber", block.n_tries if block_enabled else 0),
+            _hms(
+                block.block_time if block_enabled else None,
+                ("txtAttemptsPeriodHours", "txtAttemptsPeriodMinutes", "txtAttemptsPeriodSeconds"),
+            ),
+            _checkbox("rbApplyForUser", block_enabled and block.individual, "radio", "rbApplyFor"),
+            _checkbox("rbApplyForTeam", not (block_enabled and block.individual), "radio", "rbApplyFor"),
+            _input("btnSaveBlocking", "Save", "submit", title="Save"),
+            "</div>",
+        ]
+        if level.has_sectors:
+            n_sectors = sectors.n_sectors if sectors is not None else None
+            parts += [
+                f'<a {_attrs(id="lnkSectorsSettings", href=_postback("lnkSectorsSettings"))}>sectors</a>',
+                '<div id="divSectorsSettins">',
+                _checkbox("rbCompleteAll", n_sectors is None, "radio", "rbComplete"),
+                _checkbox("rbCompleteCustom", n_sectors is not None, "radio", "rbComplete"),
+                _input("txtRequiredSectorsCount", n_sectors or "", id="txtRequiredSectorsCount"),
+                _input("btnSaveSectors", "Save", "submit", title="Save"),
+                "</div>",
+            ]
+        return f'<table class="bg_dark"><tr><td>{"".join(parts)}</td></tr></table>'
+
+    def task_table(self, level: Level) -> str:
+        gid, lid = level.game_id, level.level_id
+        if level.tasks:
+            link = (
+                f'<a {_attrs(id=Task.TASK_ID_ELEMENT, href=_editor(f"TaskEdit.aspx?gid={gid}&level={lid}&tid=1"))}>'
+                f'{escape(level.tasks[0].body)}</a>'
+            )
+        else:
+            link = (
+                f'<a {_attrs(id=Task.TASK_ID_ADD, href=_editor(f"TaskEdit.aspx?gid={gid}&level={lid}&action=add"))}>'
+                'Add task</a>'
+            )
+        return f'<table class="bg_dark"><tr><td>{link}</td></tr></table>'
+
+    def hints_table(self, level: Level, hints: typing.Optional[typing.List[Hint]], type_: int) -> str:
+        gid, lid = level.game_id, level.level_id
+        rows = []
+        for i, hint in enumerate(hints or []):
+            if type_ == 2:
+                href = _editor(f"BonusEdit.aspx?gid={gid}&level={lid}&bonus={i + 1}")
+                title = hint.name
+            else:
+                penalty = "&penalty=1" if type_ == 1 else ""
+                href = f"javascript:GameEditor('./PromptEdit.aspx?gid={gid}&level={lid}{penalty}&prid={i + 1}'," \
+                       f"'Prompt_{gid}_{lid}')"
+                title = hint.hint_text
+            rows.append(f'<tr><td><a {_attrs(href=href)}>{escape(title[:40])}</a></td></tr>')
+        return f'<table class="bg_dark"><tr><td><table>{"".join(rows)}</table></td></tr></table>'
+
+    def answers_block(self, level: Level) -> str:
+        answers = level.answers or []
+        sector_names = ",".join(
+            f"{i + 1}:{answer.name!r}"
+            for i, answer in enumerate(answers)
+            if answer.name is not None
+        )
+        parts = [
+            f'<a {_attrs(id=Answer.SHOW_ANSWERS_ID, href=_postback("AnswersTable$ctl00$lnkShowAnswers"))}>'
+            'Show answers</a>',
+            _input("hdnSectorNames_0", sector_names, "hidden", id="hdnSectorNames_0"),
+            f'<a {_attrs(title="Add answers", href=self.level_path(level, addanswers=1))}>+</a>',
+            f'<a {_attrs(title="Add sector", href=self.level_path(level, addanswers=1, sector="new"))}>+</a>',
+        ]
+        for i, answer in enumerate(answers):
+            edit = f"{ADMIN_PATH}{self.level_path(level, editanswers=1, sector=i + 1)}"
+            add = ""
+            if level.has_sectors:
+                add = f'<a {_attrs(title="Add answers", href=self.level_path(level, addanswers=1, sector=i + 1))}>+</a>'
+            parts.append(f'<div>{escape(answer.name or "")}<a {_attrs(title="Edit", href=edit)}>edit</a>{add}</div>')
+        return f'<div id="AnswersTable">{"".join(parts)}</div>'
+
+    def answer_page(self, level: Level, sector: int) -> str:
+        answer = level.answers[sector - 1]
+        rows = "".join(
+            f"<tr><td>{_input(f'txtAnswer_{10000 + sector * 100 + i}', option.text)}</td>"
+            f"<td>{_who_select(f'ddlAnswerFor_{10000 + sector * 100 + i}', option.dedicated_to_who, 'answer')}</td></tr>"
+            for i, option in enumerate(answer.options)
+        )
+        return _page(self.level_path(level, editanswers=1, sector=sector), f"<table>{rows}</table>")
+
+    def add_answers_page(self, level: Level, query: typing.Dict[str, str]) -> str:
+        rows = "".join(
+            f"<tr><td>{_input(f'txtAnswer_{i}')}</td><td>{_who_select(f'ddlAnswerFor_{i}', 0, 'answer')}</td></tr>"
+            for i in range(MAX_ANSWERS_PER_SECTOR)
+        )
+        body = "".join([
+            _input("txtSectorName", "") if query.get("sector") == "new" else "",
+            f"<table>{rows}</table>",
+            _input("btnSaveSector", "Save sector", "submit"),
+            _input("AnswersTable_ctl00_NewAnswerEditor_ctl00_btnSave", "Save", "submit"),
+            _input("btnSaveAnswers", "Save", "submit", title="Save"),
+        ])
+        extra = {key: value for key, value in query.items() if key not in ("gid", "level")}
+        return _page(self.level_path(level, **extra), body)
+
+    def name_page(self, query: typing.Dict[str, str]) -> str:
+        level = self.level(query)
+        body = _input("txtLevelName", level.name.name if level.name else "") + \
+            _input("btnUpdate", "Update", "submit", title="Update")
+        return _page(f"NameCommentEdit.aspx?{urlencode(query)}", body)
+
+    @staticmethod
+    def edit_links(existing: bool, edit_attrs: typing.Dict[str, str]) -> str:
+        if not existing:
+            return ""
+        return (
+            f'<a {_attrs(href=_postback("lnkEdit"), **edit_attrs)}>Edit</a>'
+            f'<a {_attrs(title="Delete", href=_postback("lnkDelete"), onclick=CONFIRM_DELETE)}>'
+            'Delete</a>'
+        )
+
+    def hint_page(self, query: typing.Dict[str, str]) -> str:
+        level = self.level(query)
+        penalized = "penalty" in query
+        hints = level.penalized_hints if penalized else level.hints
+        hint = hints[int(query["prid"]) - 1] if "prid" in query else (PenalizedHint() if penalized else Hint())
+        parts = [
+            self.edit_links("prid" in query, {"id": "lnkEdit"}),
+            _who_select("ddlPromptFor", hint.dedicated_to_who),
+            _hms(hint.hint_time, PenalizedHint.FIELDS.inputs[:4]),
+            _textarea("NewPrompt", hint.hint_text, class_="textarea_blank"),
+        ]
+        if penalized:
+            parts += [
+                _hms(hint.penalty_time, PenalizedHint.FIELDS.inputs[4:]),
+                _checkbox("chkRequestPenaltyConfirm", hint.additional_confirmation_on),
+                _textarea("txtPenaltyComment", hint.hint_description, class_="textarea_blank"),
+            ]
+        button = "btnUpdate" if "prid" in query else "btnAdd"
+        parts.append(_input(button, button[3:], "submit", id=button))
+        return _page(f"PromptEdit.aspx?{urlencode(query)}", "".join(parts))
+
+    def task_page(self, query: typing.Dict[str, str]) -> str:
+        level = self.level(query)
+        existing = "tid" in query
+        task = level.tasks[0] if existing else Task()
+        button = "btnUpdate" if existing else "btnAdd"
+        parts = [
+            self.edit_links(existing, {"id": "lnkEdit"}),
+            _who_select("ddlTaskFor", task.dedicated_to_who),
+            _textarea("inputTask", task.body),
+            _checkbox("chkReplaceNlToBr", not task.html_raw),
+            _input(button, button[3:], "submit", id=button),
+        ]
+        return _page(f"TaskEdit.aspx?{urlencode(query)}", "".join(parts))
+
+    def bonus_page(self, query: typing.Dict[str, str]) -> str:
+        level = self.level(query)
+        existing = "bonus" in query
+        bonus = level.bonuses[int(query["bonus"]) - 1] if existing else Bonus("")
+        levels_available = bonus.levels_available or []
+        n_answer_fields = max(10, len(bonus.answers))
+        answers = list(bonus.answers) + [""] * (n_answer_fields - len(bonus.answers))
+        button = "btnUpdate" if existing else "btnAdd"
+        parts = [
+            self.edit_links(existing, {"title": "Edit"}),
+            _input("txtBonusName", bonus.name),
+            _textarea("txtTask", bonus.bonus_task),
+            _checkbox("rbAllLevels", bonus.levels_available is None, "radio", "rbLevels"),
+            _checkbox("rbCustomLevels", bonus.levels_available is not None, "radio", "rbLevels"),
+            "".join(
+                _checkbox(f"level_{other.level_id}", other.level_id in levels_available, class_="enCheckBox")
+                for other in self.game.levels
+            ),
+            _checkbox("chkAbsoluteLimit", bonus.available_time is not None),
+            _hms(bonus.available_time or ("", ""), ("txtValidFrom", "txtValidTo")),
+            _checkbox("chkDelay", bonus.appearence_delay is not None),
+            _hms(bonus.appearence_delay, Bonus.INT_PARAMS[:3]),
+            _checkbox("chkRelativeLimit", bonus.availability_window is not None),
+            _hms(bonus.availability_window, Bonus.INT_PARAMS[3:6]),
+            _hms(bonus.bonus_time, Bonus.INT_PARAMS[6:]),
+            _textarea("txtHelp", bonus.hint_text),
+            _who_select("ddlBonusFor", bonus.dedicated_to_who),
+            "".join(_input(f"answer_{i}", answer) for i, answer in enumerate(answers)),
+            '<a class="Text4" href="javascript:void(0)">-</a>' * 3,
+            _input(button, button[3:], "submit"),
+        ]
+        return _page(f"BonusEdit.aspx?{urlencode(query)}", "".join(parts))
+
+
+@dataclass
+class EditableSite(FakeSite):
+    """
+    A `FakeSite` whose form posts change `game` the way the admin saves them, so that an upload
+    can be scraped back. Entities are parsed from the posted form with their own `from_page`.
+    Uploaded files are kept in `files` and listed on the level manager page.
+    """
+    files: typing.Dict[str, bytes] = field(default_factory=dict)
+
+    def handle(
+            self,
+            method: str,
+            url: str,
+            fields: typing.Dict[str, str] = None,
+            files: typing.Dict[str, typing.Tuple[str, bytes]] = None,
+    ) -> typing.Tuple[str, str]:
+        """Like `FakeSite.handle`, `files` are input name -> (file name, content) of a multipart post"""
+        page, _ = self.parse(url)
+        if method == "POST" and page == "FileUploader.aspx":
+            for fname, content in (files or {}).values():
+                if fname:
+                    self.store_file(os.path.basename(fname.replace("\\", "/")), content)
+        return super().handle(method, url, fields)
+
+    def store_file(self, name: str, content: bytes) -> None:
+        self.files[name] = content
+        url = f"{FILES_PATH}{self.game.game_id}/{name}"
+        if url not in self.game.files.file_urls:
+            self.game.files.file_urls.append(url)
+        return None
+
+    def after_post(self, url: str, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str]) -> str:
+        editors = {
+            "NameCommentEdit.aspx": self.save_name,
+            "LevelEditor.aspx": self.save_level,
+            "TaskEdit.aspx": self.save_task,
+            "PromptEdit.aspx": self.save_hint,
+            "BonusEdit.aspx": self.save_bonus,
+        }
+        editor = editors.get(page)
+        if editor is not None and "level" in query:
+            query = editor(self.level(query), page, query, fields)
+            url = f"{url.split('?')[0]}?{urlencode(query)}"
+        return super().after_post(url, page, query, fields)
+
+    def posted_form(self, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str]) -> HtmlPage:
+        return _fill_form(HtmlPage.parse(page, self.render(page, query)), fields)
+
+    def save_name(
+            self, level: Level, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str],
+    ) -> typing.Dict[str, str]:
+        if "btnUpdate" in fields:
+            level.name = LevelName(fields.get("txtLevelName", ""))
+        return query
+
+    def save_level(
+            self, level: Level, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str],
+    ) -> typing.Dict[str, str]:
+        if "addanswers" in query:
+            if any(button in fields for button in ANSWER_BUTTONS):
+                self.add_answers(level, query.get("sector"), fields)
+            return query
+
+        form = self.posted_form(page, query, fields)
+        if "btnSaveAutopass" in fields:
+            autopass = Autopass.from_fields(True, read_page_fields(form, Autopass.FIELDS))
+            if not form.is_checked("chkTimeoutPenalty"):
+                autopass.penalty_time = (0, 0, 0)
+            level.autopass = autopass if any(autopass.autopass_time) else Autopass()
+        elif "btnSaveBlocking" in fields:
+            block = AnswerBlock.from_fields(True, read_page_fields(form, AnswerBlock.FIELDS))
+            level.answer_block = block if block.n_tries else AnswerBlock()
+        elif "btnSaveSectors" in fields:
+            n_sectors = None
+            if form.is_checked(SectorsToCover.COMPLETE_CUSTOM_ID):
+                n_sectors = int(form.value(SectorsToCover.N_COMPLETE_ID))
+            level.sectors_to_cover = SectorsToCover(n_sectors)
+        return query
+
+    @staticmethod
+    def add_answers(level: Level, sector: typing.Optional[str], fields: typing.Dict[str, str]) -> None:
+        options = [
+            AnswerOption(fields[f"txtAnswer_{i}"], int(fields.get(f"ddlAnswerFor_{i}") or 0))
+            for i in range(MAX_ANSWERS_PER_SECTOR)
+            if fields.get(f"txtAnswer_{i}")
+        ]
+        answers = level.answers = level.answers or []
+        if sector == "new":
+            answers.append(Answer(options, fields.get("txtSectorName") or f"Sector {len(answers) + 1}", len(answers)))
+        elif sector is not None:
+            answers[int(sector) - 1].options.extend(options)
+        elif answers:
+            answers[0].options.extend(options)
+        else:
+            answers.append(Answer(options, None, 0))
+        return None
+
+    def save_task(
+            self, level: Level, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str],
+    ) -> typing.Dict[str, str]:
+        base = {"gid": query["gid"], "level": query["level"]}
+        if fields.get("__EVENTTARGET") == "lnkDelete":
+            level.tasks = []
+            return {**base, "action": "add"}
+        if "btnUpdate" in fields or "btnAdd" in fields:
+            level.tasks = [Task.from_page(self.posted_form(page, query, fields))]
+            return {**base, "tid": "1"}
+        return query
+
+    def save_hint(
+            self, level: Level, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str],
+    ) -> typing.Dict[str, str]:
+        if "penalty" in query:
+            return self.save_listed(level, "penalized_hints", PenalizedHint, "prid", page, query, fields)
+        return self.save_listed(level, "hints", Hint, "prid", page, query, fields)
+
+    def save_bonus(
+            self, level: Level, page: str, query: typing.Dict[str, str], fields: typing.Dict[str, str],
+    ) -> typing.Dict[str, str]:
+        return self.save_listed(level, "bonuses", Bonus, "bonus", page, query, fields)
+
+    def save_listed(
+            self,
+            level: Level,
+            attr: str,
+            cls: typing.Type[Hint],
+            key: str,
+            page: str,
+            query: typing.Dict[str, str],
+            fields: typing.Dict[str, str],
+    ) -> typing.Dict[str, str]:
+        """Hints and bonuses are addressed by their 1-based position in the level, `key` in the query"""
+        items = getattr(level, attr) or []
+        setattr(level, attr, items)
+        query = {name: value for name, value in query.items() if name != "action"}
+        if fields.get("__EVENTTARGET") == "lnkDelete" and key in query:
+            del items[int(query.pop(key)) - 1]
+        elif "btnUpdate" in fields or "btnAdd" in fields:
+            item = cls.from_page(self.posted_form(page, query, fields))
+            if key in query:
+                items[int(query[key]) - 1] = item
+            else:
+                items.append(item)
+                query[key] = str(len(items))
+        return query
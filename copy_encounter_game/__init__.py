@@ -1,10 +1,14 @@
-from copy_encounter_game.api import save_game, load_game
+from copy_encounter_game.api import save_game, load_game, load_game_to_targets
 from copy_encounter_game.game import Game
-from copy_encounter_game.penalty_bonuses import penalty_bonuses
+from copy_encounter_game.penalty_bonuses import penalty_bonuses, iter_penalty_bonuses
+from copy_encounter_game.tracing import tracing
 
 __all__ = [
     "save_game",
     "load_game",
+    "load_game_to_targets",
     "Game",
     "penalty_bonuses",
+    "iter_penalty_bonuses",
+    "tracing",
 ]
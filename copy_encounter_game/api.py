@@ -2,11 +2,16 @@
 import typing
 import os
 
-from copy_encounter_game.game import Game, Answer, Autopass, AnswerBlock, Task, Bonus, Hint, LevelName, SectorsToCover
+from copy_encounter_game.game import Game, UploadReport, FanOutReport, Answer, Autopass, AnswerBlock, Task, Bonus, Hint, LevelName, SectorsToCover
+from copy_encounter_game.constants import BACKEND_SELENIUM, DEFAULT_MAX_PARALLEL_TARGETS, DEFAULT_CHROME_PROFILE
+from copy_encounter_game.journal import UploadJournal
+from copy_encounter_game.game.scrape_cache import ScrapeCache
+from copy_encounter_game.workers import run_session_pool
 
 __all__ = [
     "save_game",
     "load_game",
+    "load_game_to_targets",
 ]
 
 
@@ -25,14 +30,13 @@ def save_game(
             type(Answer), type(Autopass), type(AnswerBlock), type(Task),
             type(Bonus), type(Hint), type(LevelName), type(SectorsToCover),
         ]] = None,
+        backend: str = BACKEND_SELENIUM,
+        workers: int = 1,
+        chrome_profile: str = DEFAULT_CHROME_PROFILE,
 ) -> None:
     skip_entities = skip_entities or set()
-    dir_ = os.path.dirname(path_to_store_game)
-    fname, ext = os.path.splitext(path_to_store_game)
-    temp_fp = os.path.join(
-        dir_,
-        f"{fname}_temp_lvl{{lvl_id}}.{ext}"
-    )
+    fname, _ = os.path.splitext(path_to_store_game)
+    scrape_cache = ScrapeCache(f"{fname}_scrape_cache", source_domain, source_game_id)
 
     existing_game = None
     if keep_existing:
@@ -49,10 +53,12 @@ def save_game(
         levels_subset=levels_subset,
         download_files=download_files,
         files_location=files_location,
-        path_template=temp_fp,
-        read_cache=not keep_existing or not existing_game,
+        scrape_cache=scrape_cache,
         past_game=past_game,
         skip_entities=skip_entities,
+        backend=backend,
+        workers=workers,
+        chrome_profile=chrome_profile,
     )
 
     if existing_game:
@@ -74,19 +80,110 @@ def load_game(
         keep_existing_penalized_hints: bool = False,
         keep_existing_bonuses: bool = False,
         keep_existing_answers: bool = False,
-) -> None:
+        incremental: bool = False,
+        resume: bool = True,
+        journal_path: typing.Optional[str] = None,
+        workers: int = 1,
+        chrome_profile: str = DEFAULT_CHROME_PROFILE,
+) -> UploadReport:
     orig_game = Game.from_file(game_file_path)
-
-    orig_game.domain = target_domain
-    orig_game.game_id = target_game_id
-    if game_manipulation is not None:
-        orig_game = game_manipulation(orig_game)
-    orig_game.to_html(
-        creds, chrome_driver_path,
+    report = _upload_to_target(
+        orig_game, target_domain, target_game_id, creds, game_file_path, chrome_driver_path,
+        game_manipulation=game_manipulation,
+        resume=resume,
+        journal_path=journal_path,
         upload_files=upload_files,
         keep_existing_hints=keep_existing_hints,
         keep_existing_penalized_hints=keep_existing_penalized_hints,
         keep_existing_bonuses=keep_existing_bonuses,
         keep_existing_answers=keep_existing_answers,
+        incremental=incremental,
+        workers=workers,
+        chrome_profile=chrome_profile,
     )
-    return None
+    return report
+
+
+def load_game_to_targets(
+        targets: typing.List[typing.Tuple[str, int]],
+        creds: typing.Dict[str, str],
+        game_file_path: str,
+        chrome_driver_path: str,
+        game_manipulation: typing.Callable[[Game], Game] = None,
+        upload_files: bool = False,
+        keep_existing_hints: bool = False,
+        keep_existing_penalized_hints: bool = False,
+        keep_existing_bonuses: bool = False,
+        keep_existing_answers: bool = False,
+        incremental: bool = False,
+        resume: bool = True,
+        workers: int = 1,
+        max_parallel_targets: int = DEFAULT_MAX_PARALLEL_TARGETS,
+        chrome_profile: str = DEFAULT_CHROME_PROFILE,
+) -> FanOutReport:
+    """
+    Uploads one stored game to several (domain, game_id) targets at once.
+    The game file is read once; every target gets its own copy for `game_manipulation`.
+    Targets on one domain share the domain's session cap (see `MAX_WORKERS_PER_DOMAIN`): every target holds
+    one of its sessions and its extra workers only get the ones the other targets leave free.
+    """
+    orig_game = Game.from_file(game_file_path)
+
+    def upload(_: int, target: typing.Tuple[str, int]) -> UploadReport:
+        domain, game_id = target
+        report_ = _upload_to_target(
+            orig_game, domain, game_id, creds, game_file_path, chrome_driver_path,
+            game_manipulation=game_manipulation,
+            resume=resume,
+            upload_files=upload_files,
+            keep_existing_hints=keep_existing_hints,
+            keep_existing_penalized_hints=keep_existing_penalized_hints,
+            keep_existing_bonuses=keep_existing_bonuses,
+            keep_existing_answers=keep_existing_answers,
+            incremental=incremental,
+            workers=workers,
+            chrome_profile=chrome_profile,
+        )
+        return report_
+
+    reports, errors = run_session_pool(
+        targets,
+        max_parallel_targets,
+        lambda idx: idx,
+        upload,
+    )
+    report = FanOutReport(reports, errors)
+    report.log()
+    return report
+
+
+def _upload_to_target(
+        orig_game: Game,
+        target_domain: str,
+        target_game_id: int,
+        creds: typing.Dict[str, str],
+        game_file_path: str,
+        chrome_driver_path: str,
+        game_manipulation: typing.Callable[[Game], Game] = None,
+        resume: bool = True,
+        journal_path: typing.Optional[str] = None,
+        **upload_kwargs,
+) -> UploadReport:
+    if journal_path is None:
+        fname, _ = os.path.splitext(game_file_path)
+        journal_path = f"{fname}_upload_{target_domain}_{target_game_id}.journal"
+    journal = UploadJournal(journal_path, target_domain, target_game_id)
+    if not resume:
+        journal.clear()
+
+    game = orig_game.copy()
+    game.domain = target_domain
+    game.game_id = target_game_id
+    if game_manipulation is not None:
+        game = game_manipulation(game)
+    report = game.to_html(
+        creds, chrome_driver_path,
+        journal=journal,
+        **upload_kwargs,
+    )
+    return report
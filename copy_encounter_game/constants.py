@@ -1,10 +1,105 @@
 
+import os
+
 __all__ = [
     "ADMIN_URL",
     "MANAGER_URL",
     "CHUNK_SIZE_FILES",
+    "BACKEND_SELENIUM",
+    "BACKEND_HTTP",
+    "BACKEND_BROWSER_FETCH",
+    "BROWSER_FETCH_CONCURRENCY",
+    "BROWSER_FETCH_TIMEOUT",
+    "HTTP_POOL_SIZE",
+    "HTTP_TIMEOUT",
+    "CHROME_PROFILE_LEAN",
+    "CHROME_PROFILE_FULL",
+    "DEFAULT_CHROME_PROFILE",
+    "CHROME_WINDOW_SIZE",
+    "CHROME_BLOCKED_URLS",
+    "MAX_WORKERS_PER_DOMAIN",
+    "DEFAULT_MAX_WORKERS_PER_DOMAIN",
+    "DEFAULT_MAX_PARALLEL_TARGETS",
+    "SESSION_SLOT_POLL",
+    "PACING_RATE",
+    "PACING_BURST",
+    "PACING_SLOW_RESPONSE",
+    "PACING_MIN_BACKOFF",
+    "PACING_MAX_BACKOFF",
+    "READY_TIMEOUT",
+    "FILE_CACHE_DIR",
+    "DOWNLOAD_CHUNK_SIZE",
+    "TRANSFER_WORKERS",
+    "TRANSFER_CONNECTIONS_PER_HOST",
+    "TRANSFER_RETRIES",
+    "TRANSFER_BACKOFF",
+    "SCRAPE_CACHE_MAX_AGE",
+    "SESSION_STORE_DIR",
+    "SESSION_MAX_AGE",
+    "SESSION_KDF_ITERATIONS",
 ]
 
 ADMIN_URL = "http://{domain}/Login.aspx?return=%2f"
 MANAGER_URL = "http://{domain}/Administration/Games/LevelManager.aspx?gid={gid}"
 CHUNK_SIZE_FILES = 12
+
+BACKEND_SELENIUM = "selenium"
+BACKEND_HTTP = "http"
+# Chrome, with the hint and bonus edit pages of a level fetched by the page itself in one script
+BACKEND_BROWSER_FETCH = "browser-fetch"
+# Requests such a script keeps in flight, as many as Chrome opens connections to one host
+BROWSER_FETCH_CONCURRENCY = 6
+BROWSER_FETCH_TIMEOUT = 60
+HTTP_POOL_SIZE = 10
+HTTP_TIMEOUT = 30
+
+# "lean" is a headless Chrome that skips images, media and fonts; "full" is the visible default browser, for debugging
+CHROME_PROFILE_LEAN = "lean"
+CHROME_PROFILE_FULL = "full"
+DEFAULT_CHROME_PROFILE = CHROME_PROFILE_LEAN
+CHROME_WINDOW_SIZE = (1280, 900)
+# Resources a lean browser does not request
+CHROME_BLOCKED_URLS = (
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp3", "*.mp4", "*.webm", "*.ogg", "*.wav",
+)
+
+# Upper bound of concurrently logged-in sessions against one Encounter domain
+DEFAULT_MAX_WORKERS_PER_DOMAIN = 4
+# Per-domain overrides, e.g. {"demo.en.cx": 2}
+MAX_WORKERS_PER_DOMAIN = {}
+# Targets uploaded at the same time by `load_game_to_targets`
+DEFAULT_MAX_PARALLEL_TARGETS = 4
+# Seconds between checks of an extra worker waiting for a free session slot of its domain
+SESSION_SLOT_POLL = 0.2
+
+# Requests per second per domain while the server is healthy
+PACING_RATE = 5.
+PACING_BURST = 10.
+# Seconds after which a response is considered a sign of strain
+PACING_SLOW_RESPONSE = 5.
+PACING_MIN_BACKOFF = 0.5
+PACING_MAX_BACKOFF = 30.
+
+# Seconds to wait for a page, popup or form field before giving up
+READY_TIMEOUT = 20
+
+# Download cache of game files, relative to the files location
+FILE_CACHE_DIR = ".file_cache"
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# Concurrent file downloads/uploads, connections per host, and retries with exponential backoff (seconds)
+TRANSFER_WORKERS = 8
+TRANSFER_CONNECTIONS_PER_HOST = 4
+TRANSFER_RETRIES = 3
+TRANSFER_BACKOFF = 1.
+
+# Cached scraped levels older than this many seconds are dropped even if their fingerprint matches
+SCRAPE_CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Login cookies reused between runs and workers, see `SessionStore`
+SESSION_STORE_DIR = os.path.join(os.path.expanduser("~"), ".copy_encounter_game", "sessions")
+# Stored sessions older than this many seconds are not even probed
+SESSION_MAX_AGE = 7 * 24 * 3600
+# PBKDF2 rounds for the key that encrypts stored cookies with the user's password
+SESSION_KDF_ITERATIONS = 200000
@@ -0,0 +1,335 @@
+"""
+Declarative description of entity forms, read in a single round trip
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, asdict
+import logging
+import typing
+
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException
+
+from copy_encounter_game.constants import BROWSER_FETCH_CONCURRENCY, BROWSER_FETCH_TIMEOUT
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
+
+__all__ = [
+    "FieldMap",
+    "FieldFetch",
+    "read_fields",
+    "fetch_fields",
+    "read_page_fields",
+    "FormState",
+    "write_fields",
+]
+
+logger = logging.getLogger(__name__)
+
+# `readFields(doc, spec)`: the values a `FieldMap` asks for, from the page or from a fetched document
+READ_FIELDS_FUNCTION = """
+    function readFields(doc, spec) {
+        var res = {};
+        function byName(n) {
+            return doc.getElementsByName(n)[0];
+        }
+        spec.inputs.forEach(function (n) {
+            var e = byName(n);
+            res[n] = e ? e.value : null;
+        });
+        spec.checkboxes.forEach(function (n) {
+            var e = doc.getElementById(n) || byName(n);
+            res[n] = e ? !!e.checked : false;
+        });
+        spec.texts.forEach(function (s) {
+            var t = "";
+            doc.querySelectorAll(s).forEach(function (e) {t += e.textContent;});
+            res[s] = t;
+        });
+        spec.selects.forEach(function (s) {
+            var e = doc.querySelector(s);
+            res[s] = e ? e.value : null;
+        });
+        spec.lists.forEach(function (s) {
+            var l = [];
+            doc.querySelectorAll(s).forEach(function (e) {l.push([e.name, e.value, !!e.checked]);});
+            res[s] = l;
+        });
+        return res;
+    }
+"""
+
+READ_FIELDS_SCRIPT = READ_FIELDS_FUNCTION + """
+    return readFields(document, arguments[0]);
+"""
+
+# Async: fetches every job's page with the browser's cookies, `concurrency` at a time, follows its edit link
+# (a plain link or an ASP.NET postback of the fetched form) and reads the fields from the parsed document
+FETCH_FIELDS_SCRIPT = READ_FIELDS_FUNCTION + r"""
+    var jobs = arguments[0], concurrency = arguments[1], done = arguments[arguments.length - 1];
+    var results = new Array(jobs.length), next = 0;
+    function load(url, init) {
+        init = init || {};
+        init.credentials = "same-origin";
+        return fetch(url, init).then(function (resp) {
+            if (!resp.ok) {
+                throw new Error("HTTP " + resp.status + " for " + url);
+            }
+            return resp.arrayBuffer().then(function (buf) {
+                var charset = /charset=([^;]+)/i.exec(resp.headers.get("Content-Type") || "");
+                var text = new TextDecoder(charset ? charset[1].trim() : "utf-8").decode(buf);
+                return {url: resp.url, doc: new DOMParser().parseFromString(text, "text/html")};
+            });
+        });
+    }
+    function follow(page, href) {
+        var pb = /__doPostBack\(\s*['"]([^'"]*)['"]\s*,\s*['"]([^'"]*)['"]\s*\)/.exec(href);
+        if (!pb) {
+            return load(new URL(href, page.url).href);
+        }
+        var form = page.doc.forms[0], data = new URLSearchParams();
+        Array.prototype.forEach.call(form ? form.elements : [], function (e) {
+            var type = (e.type || "").toLowerCase();
+            if (!e.name || ["submit", "button", "image", "file"].indexOf(type) !== -1) {
+                return;
+            }
+            if ((type === "checkbox" || type === "radio") && !e.checked) {
+                return;
+            }
+            data.append(e.name, e.value);
+        });
+        data.set("__EVENTTARGET", pb[1]);
+        data.set("__EVENTARGUMENT", pb[2]);
+        var action = form && form.getAttribute("action") ? form.getAttribute("action") : page.url;
+        return load(new URL(action, page.url).href, {method: "POST", body: data});
+    }
+    function worker() {
+        if (next >= jobs.length) {
+            return Promise.resolve();
+        }
+        var i = next++, job = jobs[i];
+        return load(new URL(job.url, location.href).href).then(function (page) {
+            var edit = job.edit ? page.doc.querySelector(job.edit) : null;
+            return edit ? follow(page, edit.getAttribute("href")) : page;
+        }).then(function (page) {
+            results[i] = {fields: readFields(page.doc, job.spec)};
+        }, function (e) {
+            results[i] = {error: String(e)};
+        }).then(worker);
+    }
+    var workers = [];
+    for (var w = 0; w < Math.min(concurrency, jobs.length); w++) {
+        workers.push(worker());
+    }
+    Promise.all(workers).then(function () {done(results);});
+"""
+
+WRITE_FIELDS_SCRIPT = """
+    var state = arguments[0];
+    function byKey(k) {
+        return document.getElementById(k) || document.getElementsByName(k)[0];
+    }
+    function click(e) {
+        e.click();
+        if (window.jQuery) {
+            jQuery(e).trigger('onclick');
+        }
+    }
+    function setValue(e, v) {
+        e.setAttribute('value', v);
+        e.value = v;
+    }
+    state.clicks.forEach(function (k) {
+        var e = byKey(k);
+        if (e) {
+            e.click();
+        }
+    });
+    Object.keys(state.checks).forEach(function (k) {
+        var e = byKey(k);
+        if (e && !!e.checked !== state.checks[k]) {
+            click(e);
+        }
+    });
+    Object.keys(state.check_indices).forEach(function (s) {
+        var wanted = state.check_indices[s];
+        document.querySelectorAll(s).forEach(function (e, i) {
+            if (!!e.checked !== (wanted.indexOf(i + 1) !== -1)) {
+                click(e);
+            }
+        });
+    });
+    state.repeat_clicks.forEach(function (rc) {
+        for (var i = 0; i < rc[2]; i++) {
+            document.querySelectorAll(rc[0])[rc[1]].click();
+        }
+    });
+    Object.keys(state.values).forEach(function (k) {
+        var e = byKey(k);
+        if (e) {
+            setValue(e, state.values[k]);
+        }
+    });
+    Object.keys(state.texts).forEach(function (k) {
+        var e = byKey(k);
+        if (e) {
+            e.textContent = state.texts[k];
+            e.value = state.texts[k];
+        }
+    });
+    Object.keys(state.selects).forEach(function (s) {
+        var e = document.querySelector(s);
+        if (!e) {
+            return;
+        }
+        for (var i = 0; i < e.options.length; i++) {
+            if (e.options[i].value == state.selects[s]) {
+                e.options[i].selected = true;
+            }
+        }
+    });
+    Object.keys(state.list_values).forEach(function (s) {
+        var vals = state.list_values[s];
+        document.querySelectorAll(s).forEach(function (e, i) {
+            if (i < vals.length) {
+                setValue(e, vals[i]);
+            }
+        });
+    });
+    for (var i = 0; i < state.submit.length; i++) {
+        var btn = document.querySelector(state.submit[i]);
+        if (btn) {
+            btn.click();
+            return state.submit[i];
+        }
+    }
+    return null;
+"""
+
+
+@dataclass(frozen=True)
+class FieldMap:
+    """
+    inputs: input names -> value
+    checkboxes: checkbox/radio ids (or names) -> checked
+    texts: CSS selectors -> concatenated text of all matches, as jQuery .text() does
+    selects: CSS selectors -> value of the first matching select
+    lists: CSS selectors -> [name, value, checked] of every match
+    """
+    inputs: typing.Tuple[str, ...] = ()
+    checkboxes: typing.Tuple[str, ...] = ()
+    texts: typing.Tuple[str, ...] = ()
+    selects: typing.Tuple[str, ...] = ()
+    lists: typing.Tuple[str, ...] = ()
+
+    def to_json(self) -> typing.Dict[str, typing.List[str]]:
+        res = {
+            "inputs": list(self.inputs),
+            "checkboxes": list(self.checkboxes),
+            "texts": list(self.texts),
+            "selects": list(self.selects),
+            "lists": list(self.lists),
+        }
+        return res
+
+
+def read_fields(driver: webdriver.Chrome, field_map: FieldMap) -> typing.Dict[str, typing.Any]:
+    res = driver.execute_script(READ_FIELDS_SCRIPT, field_map.to_json())
+    return res
+
+
+@dataclass(frozen=True)
+class FieldFetch:
+    """A page to read `field_map` from, after following the link at `edit_selector` if the page has one"""
+    url: str
+    field_map: FieldMap
+    edit_selector: typing.Optional[str] = None
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        return {"url": self.url, "spec": self.field_map.to_json(), "edit": self.edit_selector}
+
+
+def fetch_fields(
+        driver: webdriver.Chrome,
+        fetches: typing.List[FieldFetch],
+        concurrency: int = BROWSER_FETCH_CONCURRENCY,
+        timeout: float = BROWSER_FETCH_TIMEOUT,
+) -> typing.List[typing.Optional[typing.Dict[str, typing.Any]]]:
+    """
+    `read_fields` of many pages in one round trip, fetched concurrently by the current page;
+    relative urls are taken relative to it. None for a page that could not be fetched.
+    """
+    if not fetches:
+        return []
+    driver.set_script_timeout(timeout)
+    results = driver.execute_async_script(
+        FETCH_FIELDS_SCRIPT, [fetch.to_json() for fetch in fetches], concurrency,
+    )
+    res = []
+    for fetch, result in zip(fetches, results):
+        if result.get("error"):
+            logger.warning("Could not fetch %s in the browser: %s", fetch.url, result["error"])
+        res.append(result.get("fields"))
+    return res
+
+
+def read_page_fields(page: HtmlPage, field_map: FieldMap) -> typing.Dict[str, typing.Any]:
+    """Same as `read_fields`, but against a page fetched without a browser"""
+    res = {}
+    for name in field_map.inputs:
+        res[name] = page.value(name)
+    for name in field_map.checkboxes:
+        res[name] = page.is_checked(name)
+    for selector in field_map.texts:
+        res[selector] = "".join(el.text for el in page.select(selector))
+    for selector in field_map.selects:
+        matches = page.select(selector)
+        res[selector] = matches[0].value if matches else None
+    for selector in field_map.lists:
+        res[selector] = [
+            [el.name, el.value, el.checked]
+            for el in page.select(selector)
+        ]
+    return res
+
+
+@dataclass
+class FormState:
+    """
+    Everything a writer wants to put into a form, applied in this order:
+    clicks: ids/names clicked unconditionally (radio buttons)
+    checks: ids/names of checkboxes -> wanted state, toggled with a click when different
+    check_indices: CSS selectors -> 1-based positions of matches that must end up checked
+    repeat_clicks: [CSS selector, match index, times] for "add more fields" links
+    values: ids/names of inputs -> value
+    texts: ids/names of textareas -> text
+    selects: CSS selectors -> option value to select
+    list_values: CSS selectors -> values for matches in document order
+    submit: CSS selectors of buttons, the first existing one is clicked
+    """
+    clicks: typing.List[str] = field(default_factory=list)
+    checks: typing.Dict[str, bool] = field(default_factory=dict)
+    check_indices: typing.Dict[str, typing.List[int]] = field(default_factory=dict)
+    repeat_clicks: typing.List[typing.Tuple[str, int, int]] = field(default_factory=list)
+    values: typing.Dict[str, typing.Any] = field(default_factory=dict)
+    texts: typing.Dict[str, str] = field(default_factory=dict)
+    selects: typing.Dict[str, typing.Any] = field(default_factory=dict)
+    list_values: typing.Dict[str, typing.List[str]] = field(default_factory=dict)
+    submit: typing.List[str] = field(default_factory=list)
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        res = asdict(self)
+        res["values"] = {k: str(v) for k, v in self.values.items()}
+        res["selects"] = {k: str(v) for k, v in self.selects.items() if v is not None}
+        res["repeat_clicks"] = [list(el) for el in self.repeat_clicks]
+        return res
+
+
+def write_fields(driver: webdriver.Chrome, state: FormState) -> typing.Optional[str]:
+    """Applies the whole `state` with one script call; returns the submit selector that was clicked"""
+    clicked = driver.execute_script(WRITE_FIELDS_SCRIPT, state.to_json())
+    if state.submit and clicked is None:
+        raise NoSuchElementException(f"None of submit buttons {state.submit} found")
+    return clicked
@@ -0,0 +1,236 @@
+"""
+Content-addressed cache of downloaded game files
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, asdict
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import typing
+
+import requests
+
+from copy_encounter_game.constants import DOWNLOAD_CHUNK_SIZE, HTTP_TIMEOUT
+
+__all__ = [
+    "CacheEntry",
+    "FileCache",
+    "TransferStats",
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    digest: str
+    size: int
+    etag: typing.Optional[str] = None
+
+
+@dataclass
+class TransferStats:
+    """Progress of a batch of file transfers, safe to update from several threads"""
+    n_files: int
+    n_done: int = 0
+    n_skipped: int = 0
+    n_failed: int = 0
+    n_retries: int = 0
+    n_bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: typing.Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second"""
+        return self.n_bytes / self.elapsed if self.elapsed > 0 else 0.
+
+    def add_bytes(self, n: int) -> None:
+        with self.lock:
+            self.n_bytes += n
+        return None
+
+    def file_done(self, name: str, skipped: bool = False, failed: bool = False) -> None:
+        with self.lock:
+            self.n_done += 1
+            self.n_skipped += skipped
+            self.n_failed += failed
+            status = "failed" if failed else "unchanged" if skipped else "done"
+            logger.info("[%d/%d] %s %s", self.n_done, self.n_files, name, status)
+        return None
+
+    def finish(self, what: str = "Transferred") -> None:
+        self.finished = time.monotonic()
+        logger.info(
+            "%s %d files (%d unchanged, %d failed, %d retries): %.1f MB in %.1f s, %.2f MB/s",
+            what, self.n_done, self.n_skipped, self.n_failed, self.n_retries,
+            self.n_bytes / 1e6, self.elapsed, self.throughput / 1e6,
+        )
+        return None
+
+
+@dataclass
+class FileCache:
+    """
+    Files live under `objects/` named by their sha256, `manifest.json` maps URLs to them.
+    Unfinished downloads stay in `partial/` and are resumed with an HTTP Range request.
+    """
+    root: str
+    entries: typing.Dict[str, CacheEntry] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "partial"), exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.entries = {url: CacheEntry(**entry) for url, entry in raw.items()}
+        return None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest)
+
+    def partial_path(self, url: str) -> str:
+        return os.path.join(self.root, "partial", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def save_manifest(self) -> None:
+        with self.lock:
+            raw = {url: asdict(entry) for url, entry in self.entries.items()}
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(raw, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+        return None
+
+    def lookup(self, url: str, res: requests.Response) -> typing.Optional[str]:
+        """Path of the cached copy of `url` if the HEAD response `res` reports the same size and ETag"""
+        entry = self.entries.get(url)
+        if entry is None or not res.ok or not os.path.exists(self.blob_path(entry.digest)):
+            return None
+        size = res.headers.get("Content-Length")
+        if size is not None and int(size) != entry.size:
+            return None
+        if res.headers.get("ETag") != entry.etag:
+            return None
+        return self.blob_path(entry.digest)
+
+    def is_fresh(self, url: str, session: requests.Session) -> bool:
+        """Cached, and the server reports the same size and ETag"""
+        if url not in self.entries:
+            return False
+        res = session.head(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+        return self.lookup(url, res) is not None
+
+    def fetch(
+            self,
+            url: str,
+            session: requests.Session = None,
+            on_bytes: typing.Callable[[int], None] = None,
+    ) -> str:
+        """Path of the cached copy of `url`, downloaded only if missing or changed"""
+        session = session or requests.Session()
+        if self.is_fresh(url, session):
+            return self.blob_path(self.entries[url].digest)
+
+        part_path = self.partial_path(url)
+        meta_path = f"{part_path}.json"
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        etag = None
+        if offset and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                etag = json.load(f).get("etag")
+
+        headers = {}
+        if offset and etag:
+            # If-Range makes the server send the whole file again if it changed in between
+            headers = {"Range": f"bytes={offset}-", "If-Range": etag}
+        while True:
+            with session.get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as res:
+                if res.status_code == 416 and headers:
+                    # Nothing after `offset`: an earlier run got the whole file but did not move it into the cache
+                    if self.remote_size(url, res, session) == offset:
+                        logger.info("%s was downloaded completely before", url)
+                        break
+                    logger.info("Downloading %s again, the partial copy does not match it", url)
+                    headers = {}
+                    continue
+                res.raise_for_status()
+                resumed = res.status_code == 206
+                if resumed:
+                    logger.info("Resuming %s from byte %d", url, offset)
+                etag = res.headers.get("ETag")
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"url": url, "etag": etag}, f)
+                with open(part_path, "ab" if resumed else "wb") as f:
+                    for chunk in res.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        if on_bytes is not None:
+                            on_bytes(len(chunk))
+            break
+
+        digest = self.hash_file(part_path)
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, blob)
+        os.remove(meta_path)
+
+        with self.lock:
+            self.entries[url] = CacheEntry(url, digest, os.path.getsize(blob), etag)
+        self.save_manifest()
+        return blob
+
+    @staticmethod
+    def remote_size(url: str, res: requests.Response, session: requests.Session) -> typing.Optional[int]:
+        """Full size from the `Content-Range: bytes */<size>` of a 416 response, or from a HEAD"""
+        content_range = res.headers.get("Content-Range", "")
+        if content_range.startswith("bytes */") and content_range[len("bytes */"):].isdigit():
+            return int(content_range[len("bytes */"):])
+        head = session.head(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+        size = head.headers.get("Content-Length") if head.ok else None
+        return None if size is None else int(size)
+
+    def copy_to(
+            self,
+            url: str,
+            dest: str,
+            session: requests.Session = None,
+            on_bytes: typing.Callable[[int], None] = None,
+    ) -> str:
+        """Puts the file at `dest`, hard-linked to the cache where the file system allows it"""
+        blob = self.fetch(url, session, on_bytes)
+        if os.path.exists(dest):
+            if os.path.samefile(blob, dest):
+                return dest
+            os.remove(dest)
+        try:
+            os.link(blob, dest)
+        except OSError:
+            shutil.copyfile(blob, dest)
+        return dest
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
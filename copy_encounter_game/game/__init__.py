@@ -1,4 +1,4 @@
-from copy_encounter_game.game.game import Game
+from copy_encounter_game.game.game import Game, UploadReport, FanOutReport
 
 from copy_encounter_game.game.answer import Answer, AnswerOption
 from copy_encounter_game.game.bonus import Bonus
@@ -8,7 +8,7 @@ from copy_encounter_game.game.task import Task
 from copy_encounter_game.game.meta_info import LevelName, AnswerBlock, Autopass, SectorsToCover
 
 __all__ = [
-    "Game",
+    "Game", "UploadReport", "FanOutReport",
     "Answer", "Bonus", "Hint", "PenalizedHint", "Level", "Task",
     "LevelName", "Autopass", "AnswerBlock", "SectorsToCover",
     "AnswerOption",
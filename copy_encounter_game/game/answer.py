@@ -4,22 +4,49 @@ Level answer
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import ast
+from dataclasses import dataclass, field
 import typing
+import re
 
 from selenium import webdriver
 
 from copy_encounter_game.helpers import chunks, PrettyPrinter
+from copy_encounter_game.fields import FieldMap, FormState, read_fields, read_page_fields, write_fields
+from copy_encounter_game.tracing import traced
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
+    from copy_encounter_game.http_session import HttpSession
 
 
 __all__ = [
     "Answer",
     "MAX_ANSWERS_PER_SECTOR",
     "AnswerOption",
+    "AnswerLinks",
+    "ANSWER_LINKS_SCRIPT",
 ]
 
 MAX_ANSWERS_PER_SECTOR = 10
 
+# Where the browser is, the absolute urls of the add forms in the answers block and the sector names
+ANSWER_LINKS_SCRIPT = """
+var hrefs = function (title) {
+    return Array.prototype.map.call(
+        document.querySelectorAll("a[title='" + title + "']"),
+        function (a) { return a.href; }
+    );
+};
+var names = document.getElementById("hdnSectorNames_0");
+return {
+    url: location.href,
+    answers: hrefs("Add answers"),
+    sector: hrefs("Add sector"),
+    names: names ? names.value : null
+};
+"""
+
 
 @dataclass(repr=False)
 class AnswerOption(PrettyPrinter):
@@ -34,6 +61,9 @@ class Answer(PrettyPrinter):
     order_id: int = None
 
     SHOW_ANSWERS_ID = "AnswersTable_ctl00_lnkShowAnswers"
+    ANSWERS_SELECTOR = 'input[name^="txtAnswer_"]'
+    WHO_SELECTOR = 'select[name^="ddlAnswerFor_"]'
+    FIELDS = FieldMap(lists=(ANSWERS_SELECTOR, WHO_SELECTOR))
 
     @classmethod
     def from_options(
@@ -57,6 +87,7 @@ class Answer(PrettyPrinter):
         return inst
 
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -65,58 +96,77 @@ class Answer(PrettyPrinter):
     ) -> Answer:
         url = f"http://{domain}{url}"
         driver.get(url)
-        script = """
-            var ans = [];
-            $('input')
-              .filter(function() {
-                return this.name.match(/txtAnswer_[0-9]{2,}/);
-              }).each(function() {ans.push($(this).val())});
-            var to_who = [];
-            $('select')
-              .filter(function() {
-                return this.name.match(/ddlAnswerFor_[0-9]{2,}/);
-              }).each(function() {
-                $(this.options).each(function() {
-                    if (this.selected) {
-                        to_who.push(parseInt(this.value));
-                    }
-                })
-              });
-              return [ans, to_who]
-            """
-        res = driver.execute_script(script)
+        inst = cls.from_fields(read_fields(driver, cls.FIELDS), name, order_id)
+        return inst
+
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            url: str, name: typing.Optional[str],
+            order_id: int = None,
+    ) -> Answer:
+        page = session.get(f"http://{session.domain}{url}")
+        return cls.from_page(page, name, order_id)
+
+    @classmethod
+    def from_page(
+            cls,
+            page: HtmlPage,
+            name: typing.Optional[str],
+            order_id: int = None,
+    ) -> Answer:
+        return cls.from_fields(read_page_fields(page, cls.FIELDS), name, order_id)
+
+    @classmethod
+    def from_fields(
+            cls,
+            values: typing.Dict[str, typing.Any],
+            name: typing.Optional[str],
+            order_id: int = None,
+    ) -> Answer:
+        answer_re = re.compile(r"txtAnswer_[0-9]{2,}")
+        who_re = re.compile(r"ddlAnswerFor_[0-9]{2,}")
+        ans = [
+            value
+            for el_name, value, _ in values[cls.ANSWERS_SELECTOR]
+            if answer_re.search(el_name or "")
+        ]
+        to_who = [
+            int(value)
+            for el_name, value, _ in values[cls.WHO_SELECTOR]
+            if who_re.search(el_name or "")
+        ]
         answers_inst = [
-            AnswerOption(ans, who)
-            for ans, who in zip(*res)
+            AnswerOption(a, who)
+            for a, who in zip(ans, to_who)
         ]
-
         inst = cls(answers_inst, name, order_id)
         return inst
 
+    @traced("entity", per_owner=True)
     def to_html(
         self,
         driver: webdriver.Chrome, has_sectors: bool = False,
         is_first_time: bool = True,
+        url: str = None,
     ) -> None:
         assert len(self.options) <= MAX_ANSWERS_PER_SECTOR, "Too many answers per sector in one go"
+        if url is not None:
+            driver.get(url)
+        write_fields(driver, self.form_state(has_sectors, is_first_time))
+        return None
+
+    def form_state(self, has_sectors: bool = False, is_first_time: bool = True) -> FormState:
+        state = FormState()
         for i, option in enumerate(self.options):
-            option_txt = option.text.replace('"', '\\\"').replace("`", "\\`")
-            driver.execute_script(f"""$('input[name="txtAnswer_{i}"]').val(`{option_txt}`)""")
-            driver.execute_script(f"""
-            $('select[name="ddlAnswerFor_{i}"]').each(
-            function() {{
-                $(this.options).each(function() {{
-                    if (this.value == {option.dedicated_to_who}) {{
-                        this.selected = true;
-                    }}
-                }})
-            }}
-            )""")
+            state.values[f"txtAnswer_{i}"] = option.text
+            state.selects[f'select[name="ddlAnswerFor_{i}"]'] = option.dedicated_to_who
 
         if self.name is not None:
-            driver.execute_script(f"""$('input[name="txtSectorName"]').val("{self.name}")""")
+            state.values["txtSectorName"] = self.name
 
-        # noinspection PyBroadException
         opts = {
             (True, True): "btnSaveSector",
             (False, False): "AnswersTable_ctl00_NewAnswerEditor_ctl00_btnSave",
@@ -124,16 +174,73 @@ class Answer(PrettyPrinter):
         }
         if (has_sectors, is_first_time) in opts:
             btn_name = opts[(has_sectors, is_first_time)]
-            script = f"""$('input[name="{btn_name}"]').click()"""
+            state.submit.append(f'input[name="{btn_name}"]')
         elif (has_sectors, is_first_time) == (True, False):
-            script = f"""$('input[title="Save"]').click()"""
+            state.submit.append('input[title="Save"]')
         else:
             raise ValueError("Impossible")
-        driver.execute_script(script)
-
-        return None
+        return state
 
     def parts(self) -> typing.Generator[Answer, None, None]:
         for batch in chunks(self.options, MAX_ANSWERS_PER_SECTOR):
             inst_pt = Answer(batch, self.name)
             yield inst_pt
+
+
+@dataclass(repr=False)
+class AnswerLinks(PrettyPrinter):
+    """
+    Add forms of a level's answers block: for a level without sectors, for a new sector and one per sector.
+    The link of a sector carries its id, so a sector is followed by its url and not by its position
+    among the links, which does not survive sectors being added before it.
+    """
+    add_answers: typing.Optional[str] = None
+    add_sector: typing.Optional[str] = None
+    sectors: typing.List[str] = field(default_factory=list)
+    sector_names: typing.Dict[int, str] = field(default_factory=dict)
+    url: typing.Optional[str] = None
+
+    @classmethod
+    def from_driver(cls, driver: webdriver.Chrome) -> AnswerLinks:
+        links = driver.execute_script(ANSWER_LINKS_SCRIPT) or {}
+        answers, sector = links.get("answers") or [], links.get("sector") or []
+        inst = cls(
+            answers[0] if answers else None,
+            sector[0] if sector else None,
+            answers[1:],
+            cls.parse_sector_names(links.get("names")),
+            links.get("url"),
+        )
+        return inst
+
+    @staticmethod
+    def parse_sector_names(sector_names: typing.Optional[str]) -> typing.Dict[int, str]:
+        """`hdnSectorNames_0`, sector index -> name, read as a literal; never run as code"""
+        if not sector_names:
+            return {}
+        try:
+            names = ast.literal_eval(f"{{{sector_names}}}")
+        except SyntaxError as e:
+            raise ValueError(f"Malformed sector names {sector_names!r}") from e
+        if not isinstance(names, dict):
+            raise ValueError(f"Malformed sector names {sector_names!r}")
+        return names
+
+    @property
+    def found(self) -> bool:
+        return self.add_answers is not None or self.add_sector is not None
+
+    def new_sector(self, before: AnswerLinks) -> typing.Optional[str]:
+        """Add form of the sector that appeared since `before`"""
+        known = set(before.sectors)
+        added = [url for url in self.sectors if url not in known]
+        return added[-1] if added else None
+
+    def sector_by_name(self, name: typing.Optional[str]) -> typing.Optional[str]:
+        """Add form of the last sector called `name`"""
+        matches = [
+            self.sectors[number - 1]
+            for number, sector_name in sorted(self.sector_names.items())
+            if sector_name == name and 0 < number <= len(self.sectors)
+        ]
+        return matches[-1] if matches else None
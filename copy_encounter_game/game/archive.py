@@ -0,0 +1,655 @@
+"""
+Versioned game archive: length-prefixed, zlib-compressed JSON records, one per level,
+followed by an offset index so that single levels can be read without the rest
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping, MutableSequence, Sequence
+import copy
+import dataclasses
+import functools
+import json
+import logging
+import os
+import pickle
+import struct
+import typing
+import zlib
+
+__all__ = [
+    "ARCHIVE_VERSION",
+    "ArchiveError",
+    "to_record",
+    "from_record",
+    "RecordRef",
+    "ArchiveIndex",
+    "read_index",
+    "read_record",
+    "ArchiveWriter",
+    "LazyRecords",
+    "LazyMapping",
+    "save_archive",
+    "open_archive",
+    "is_archive",
+    "load_legacy",
+]
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CEGA"
+INDEX_MAGIC = b"CEGI"
+ARCHIVE_VERSION = 2
+HEADER = struct.Struct(">4sH")
+LENGTH = struct.Struct(">I")
+# offset of the index record, INDEX_MAGIC; ends every save of a version 2 archive. Appends start after
+# the previous trailer, so an archive cut short while appending still holds the index of the save before
+TRAILER = struct.Struct(">Q4s")
+COMPRESSION_LEVEL = 1
+TYPE_KEY = "__type__"
+
+# version -> function upgrading a record of that version to version + 1
+MIGRATIONS: typing.Dict[int, typing.Callable[[typing.Dict[str, typing.Any]], typing.Dict[str, typing.Any]]] = {
+    # 1 -> 2 only added the offset index after the records
+    1: lambda record: record,
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def _entity_types() -> typing.Dict[str, _EntityPlan]:
+    from copy_encounter_game.game.game import Game
+    from copy_encounter_game.game.level import Level
+    from copy_encounter_game.game.game_files import GameFiles
+    from copy_encounter_game.game.answer import Answer, AnswerOption
+    from copy_encounter_game.game.bonus import Bonus
+    from copy_encounter_game.game.hint import Hint, PenalizedHint
+    from copy_encounter_game.game.task import Task
+    from copy_encounter_game.game.meta_info import LevelName, Autopass, AnswerBlock, SectorsToCover
+
+    types = (
+        Game, Level, GameFiles, Answer, AnswerOption, Bonus, Hint, PenalizedHint, Task,
+        LevelName, Autopass, AnswerBlock, SectorsToCover,
+    )
+    return {cls.__name__: _EntityPlan.of(cls) for cls in types}
+
+
+@dataclasses.dataclass(frozen=True)
+class _EntityPlan:
+    """What decoding needs to know about an entity class, computed once per class"""
+    cls: type
+    n_fields: int
+    # JSON has no tuples; these fields get theirs back on load
+    tuple_fields: typing.Tuple[str, ...]
+    defaults: typing.Tuple[typing.Tuple[str, typing.Callable[[], typing.Any]], ...]
+
+    @classmethod
+    def of(cls, entity_cls: type) -> _EntityPlan:
+        fields = dataclasses.fields(entity_cls)
+        defaults = []
+        for f in fields:
+            if f.default is not dataclasses.MISSING:
+                defaults.append((f.name, lambda val=f.default: val))
+            elif f.default_factory is not dataclasses.MISSING:
+                defaults.append((f.name, f.default_factory))
+        inst = cls(
+            entity_cls,
+            len(fields),
+            tuple(f.name for f in fields if "Tuple" in str(f.type)),
+            tuple(defaults),
+        )
+        return inst
+
+
+def to_record(obj: typing.Any) -> typing.Any:
+    if dataclasses.is_dataclass(obj):
+        res = {TYPE_KEY: type(obj).__name__}
+        for f in dataclasses.fields(obj):
+            res[f.name] = to_record(getattr(obj, f.name))
+        return res
+    if isinstance(obj, (list, tuple)):
+        return [to_record(el) for el in obj]
+    if isinstance(obj, dict):
+        return {k: to_record(v) for k, v in obj.items()}
+    return obj
+
+
+@functools.lru_cache(maxsize=None)
+def _field_names(cls: type) -> typing.Tuple[str, ...]:
+    return tuple(f.name for f in dataclasses.fields(cls))
+
+
+def _tag(obj: typing.Any) -> typing.Dict[str, typing.Any]:
+    """`json.dumps` hook: the C encoder walks plain containers itself and only calls this for entities"""
+    if not dataclasses.is_dataclass(obj):
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    res = {TYPE_KEY: type(obj).__name__}
+    for name in _field_names(type(obj)):
+        res[name] = getattr(obj, name)
+    return res
+
+
+def _build(cls_name: str, values: typing.Dict[str, typing.Any]) -> typing.Any:
+    """Like pickle, fills `__dict__` directly instead of running `__init__`, which is much faster"""
+    plan = _entity_types().get(cls_name)
+    if plan is None:
+        raise ArchiveError(f"Unknown entity type {cls_name!r}")
+    for name in plan.tuple_fields:
+        val = values.get(name)
+        if val.__class__ is list:
+            values[name] = tuple(val)
+    if len(values) < plan.n_fields:
+        for name, default in plan.defaults:
+            if name not in values:
+                values[name] = default()
+    obj = plan.cls.__new__(plan.cls)
+    obj.__dict__ = values
+    return obj
+
+
+def _object_hook(values: typing.Dict[str, typing.Any]) -> typing.Any:
+    cls_name = values.pop(TYPE_KEY, None)
+    if cls_name is None:
+        return values
+    return _build(cls_name, values)
+
+
+def from_record(record: typing.Any) -> typing.Any:
+    if isinstance(record, list):
+        return [from_record(el) for el in record]
+    if not isinstance(record, dict):
+        return record
+    values = {k: from_record(v) for k, v in record.items() if k != TYPE_KEY}
+    if TYPE_KEY not in record:
+        return values
+    return _build(record[TYPE_KEY], values)
+
+
+def migrate(record: typing.Dict[str, typing.Any], version: int) -> typing.Dict[str, typing.Any]:
+    if version > ARCHIVE_VERSION:
+        raise ArchiveError(f"Archive version {version} is newer than supported {ARCHIVE_VERSION}")
+    while version < ARCHIVE_VERSION:
+        record = MIGRATIONS[version](record)
+        version += 1
+    return record
+
+
+def encode_record(obj: typing.Any) -> bytes:
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, default=_tag).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decode_record(data: bytes, version: int = ARCHIVE_VERSION) -> typing.Any:
+    """Records of the current version are decoded straight into entities, older ones are migrated first"""
+    text = zlib.decompress(data).decode("utf-8")
+    if version == ARCHIVE_VERSION:
+        return json.loads(text, object_hook=_object_hook)
+    return from_record(migrate(json.loads(text), version))
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordRef:
+    """Where a record lives: `offset` of its length prefix and `length` of the compressed payload"""
+    offset: int
+    length: int
+    key: typing.Any = None
+
+    @property
+    def size(self) -> int:
+        return LENGTH.size + self.length
+
+
+@dataclasses.dataclass
+class ArchiveIndex:
+    path: str
+    version: int
+    header: RecordRef
+    items: typing.List[RecordRef]
+    end: int
+    # (device, inode) of the file the offsets belong to; a rewrite replaces the file and gets new ones
+    file_id: typing.Optional[typing.Tuple[int, int]] = None
+
+    @property
+    def live_size(self) -> int:
+        return HEADER.size + self.header.size + sum(ref.size for ref in self.items)
+
+
+def _file_id(f: typing.BinaryIO) -> typing.Tuple[int, int]:
+    stat = os.fstat(f.fileno())
+    return stat.st_dev, stat.st_ino
+
+
+def _read_raw(f: typing.BinaryIO, ref: RecordRef) -> bytes:
+    f.seek(ref.offset + LENGTH.size)
+    data = f.read(ref.length)
+    if len(data) < ref.length:
+        raise ArchiveError("Truncated archive")
+    return data
+
+
+def _scan(f: typing.BinaryIO, path: str, version: int) -> ArchiveIndex:
+    """Version 1 archives have no index: walk the length prefixes instead"""
+    refs = []
+    pos = HEADER.size
+    f.seek(pos)
+    while True:
+        prefix = f.read(LENGTH.size)
+        if not prefix:
+            break
+        if len(prefix) < LENGTH.size:
+            raise ArchiveError(f"Truncated archive {path}")
+        (length,) = LENGTH.unpack(prefix)
+        refs.append(RecordRef(pos, length))
+        pos += LENGTH.size + length
+        f.seek(pos)
+    if not refs:
+        raise ArchiveError(f"Archive {path} has no header")
+    return ArchiveIndex(path, version, refs[0], refs[1:], pos, _file_id(f))
+
+
+def _index_at(f: typing.BinaryIO, path: str, offset: int) -> typing.Dict[str, typing.Any]:
+    try:
+        f.seek(offset)
+        (length,) = LENGTH.unpack(f.read(LENGTH.size))
+        return json.loads(zlib.decompress(_read_raw(f, RecordRef(offset, length))).decode("utf-8"))
+    except (struct.error, zlib.error, ValueError) as e:
+        raise ArchiveError(f"Damaged index in archive {path}: {e}") from e
+
+
+def _last_index(f: typing.BinaryIO, path: str, size: int) -> typing.Tuple[typing.Dict[str, typing.Any], int]:
+    """
+    Index and end of the last complete save, found by walking the length prefixes:
+    an index record is the one followed by a trailer pointing back at it
+    """
+    found = None
+    pos = HEADER.size
+    while pos + LENGTH.size <= size:
+        f.seek(pos)
+        (length,) = LENGTH.unpack(f.read(LENGTH.size))
+        record_end = pos + LENGTH.size + length
+        if record_end > size:
+            break
+        f.seek(record_end)
+        tail = f.read(TRAILER.size)
+        if len(tail) == TRAILER.size and TRAILER.unpack(tail) == (pos, INDEX_MAGIC):
+            try:
+                raw = _index_at(f, path, pos)
+            except ArchiveError:
+                break
+            found = raw, record_end + TRAILER.size
+            record_end += TRAILER.size
+        pos = record_end
+    if found is None:
+        raise ArchiveError(f"Archive {path} has no index, it was probably cut short while writing")
+    return found
+
+
+def read_index(path: str) -> ArchiveIndex:
+    with open(path, "rb") as f:
+        head = f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            raise ArchiveError(f"{path} is not a game archive")
+        magic, version = HEADER.unpack(head)
+        if magic != MAGIC:
+            raise ArchiveError(f"{path} is not a game archive")
+        file_id = _file_id(f)
+        if version > ARCHIVE_VERSION:
+            raise ArchiveError(f"Archive version {version} is newer than supported {ARCHIVE_VERSION}")
+        if version < 2:
+            return _scan(f, path, version)
+
+        end = f.seek(0, 2)
+        raw = None
+        if end >= HEADER.size + TRAILER.size:
+            f.seek(end - TRAILER.size)
+            index_offset, index_magic = TRAILER.unpack(f.read(TRAILER.size))
+            if index_magic == INDEX_MAGIC:
+                try:
+                    raw = _index_at(f, path, index_offset)
+                except ArchiveError:
+                    pass
+        if raw is None:
+            raw, end = _last_index(f, path, end)
+            logger.warning("Archive %s was cut short while saving, reading the save before", path)
+    index = ArchiveIndex(
+        path, version,
+        RecordRef(*raw["header"]),
+        [RecordRef(*el) for el in raw["items"]],
+        end,
+        file_id,
+    )
+    return index
+
+
+def read_record(path: str, ref: RecordRef, version: int = ARCHIVE_VERSION) -> typing.Any:
+    with open(path, "rb") as f:
+        return decode_record(_read_raw(f, ref), version)
+
+
+class ArchiveWriter:
+    """
+    Writes records one at a time; the offset index and its trailer are added on `close`.
+    With `append_to`, the records go after the end of that save, which stays readable until `close`.
+    """
+
+    def __init__(self, path: str, append_to: ArchiveIndex = None):
+        self.path = path
+        if append_to is None:
+            self.f = open(path, "wb")
+            self.f.write(HEADER.pack(MAGIC, ARCHIVE_VERSION))
+        else:
+            self.f = open(path, "r+b")
+            self.f.seek(append_to.end)
+        self.header: typing.Optional[RecordRef] = None
+        self.items: typing.List[RecordRef] = []
+
+    def _write(self, data: bytes, key: typing.Any = None) -> RecordRef:
+        ref = RecordRef(self.f.tell(), len(data), key)
+        self.f.write(LENGTH.pack(len(data)))
+        self.f.write(data)
+        return ref
+
+    def write_header(self, data: bytes) -> None:
+        self.header = self._write(data)
+        return None
+
+    def write_item(self, data: bytes, key: typing.Any = None) -> RecordRef:
+        ref = self._write(data, key)
+        self.items.append(ref)
+        return ref
+
+    def keep_item(self, ref: RecordRef) -> None:
+        """Appending only: the item is unchanged and stays where it is"""
+        self.items.append(ref)
+        return None
+
+    def close(self) -> ArchiveIndex:
+        index = {
+            "header": [self.header.offset, self.header.length],
+            "items": [[ref.offset, ref.length, ref.key] for ref in self.items],
+        }
+        index_ref = self._write(zlib.compress(json.dumps(index).encode("utf-8"), COMPRESSION_LEVEL))
+        self.f.write(TRAILER.pack(index_ref.offset, INDEX_MAGIC))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        end = self.f.tell()
+        self.f.truncate()
+        file_id = _file_id(self.f)
+        self.f.close()
+        return ArchiveIndex(self.path, ARCHIVE_VERSION, self.header, self.items, end, file_id)
+
+
+class LazyRecords(MutableSequence):
+    """
+    List of archive items that are decoded on first access.
+    Items are kept as `RecordRef`s until then; `save_archive` copies untouched ones without decoding,
+    and `copy.deepcopy` leaves them in the archive as well.
+    """
+
+    def __init__(
+            self,
+            index: ArchiveIndex,
+            key_attr: str,
+    ):
+        self.index = index
+        self.key_attr = key_attr
+        self._slots: typing.List[typing.Any] = list(index.items)
+        self._origin: typing.Dict[int, RecordRef] = {}
+        self._overrides: typing.Dict[str, typing.Any] = {}
+
+    def open(self) -> typing.BinaryIO:
+        """The archive the items are in, provided it is still the file their offsets point into"""
+        src = open(self.index.path, "rb")
+        if self.index.file_id is not None and _file_id(src) != self.index.file_id:
+            src.close()
+            raise ArchiveError(f"Archive {self.index.path} was rewritten since its items were read")
+        return src
+
+    def _load(self, pos: int, src: typing.BinaryIO = None) -> typing.Any:
+        slot = self._slots[pos]
+        if not isinstance(slot, RecordRef):
+            return slot
+        if src is None:
+            with self.open() as own_src:
+                obj = decode_record(_read_raw(own_src, slot), self.index.version)
+        else:
+            obj = decode_record(_read_raw(src, slot), self.index.version)
+        for attr, val in self._overrides.items():
+            setattr(obj, attr, val)
+        self._origin[id(obj)] = slot
+        self._slots[pos] = obj
+        return obj
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self._load(i) for i in range(len(self._slots))[pos]]
+        return self._load(range(len(self._slots))[pos])
+
+    def __iter__(self):
+        if self.n_loaded == len(self._slots):
+            yield from self._slots
+            return
+        # One file handle for the whole pass instead of one per item
+        with self.open() as src:
+            for pos in range(len(self._slots)):
+                yield self._load(pos, src)
+
+    def __setitem__(self, pos, value):
+        self._slots[pos] = value
+
+    def __delitem__(self, pos):
+        del self._slots[pos]
+
+    def __len__(self):
+        return len(self._slots)
+
+    def insert(self, pos, value):
+        self._slots.insert(pos, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __deepcopy__(self, memo):
+        """Shares the archive: items still in it stay undecoded, only loaded ones are copied"""
+        res = self.__class__.__new__(self.__class__)
+        memo[id(self)] = res
+        res.index = self.index
+        res.key_attr = self.key_attr
+        res._slots = [slot if isinstance(slot, RecordRef) else copy.deepcopy(slot, memo) for slot in self._slots]
+        res._overrides = copy.deepcopy(self._overrides, memo)
+        res._origin = {
+            id(new): self._origin[id(old)]
+            for old, new in zip(self._slots, res._slots)
+            if id(old) in self._origin
+        }
+        return res
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self)} items, {self.n_loaded} loaded, {self.index.path!r})"
+
+    @property
+    def n_loaded(self) -> int:
+        return sum(not isinstance(slot, RecordRef) for slot in self._slots)
+
+    def key(self, pos: int) -> typing.Any:
+        slot = self._slots[pos]
+        return slot.key if isinstance(slot, RecordRef) else getattr(slot, self.key_attr)
+
+    def keys(self) -> typing.List[typing.Any]:
+        return [self.key(i) for i in range(len(self._slots))]
+
+    def size(self, pos: int) -> int:
+        """Compressed size of the item as last saved, items added since are encoded to find out"""
+        slot = self._slots[pos]
+        if isinstance(slot, RecordRef):
+            return slot.length
+        origin = self._origin.get(id(slot))
+        return origin.length if origin is not None else len(encode_record(slot))
+
+    def by_key(self) -> LazyMapping:
+        return LazyMapping(self)
+
+    def set_all(self, attr: str, value: typing.Any) -> None:
+        """Sets `attr` on loaded items now and on the others once they are loaded"""
+        self._overrides[attr] = value
+        for slot in self._slots:
+            if not isinstance(slot, RecordRef):
+                setattr(slot, attr, value)
+        return None
+
+    def rebind(self, index: ArchiveIndex) -> None:
+        """Points untouched items at their place in a newly written archive"""
+        assert len(index.items) == len(self._slots)
+        self.index = index
+        self._origin = {}
+        for pos, ref in enumerate(index.items):
+            if isinstance(self._slots[pos], RecordRef):
+                self._slots[pos] = ref
+            else:
+                self._origin[id(self._slots[pos])] = ref
+        return None
+
+
+class LazyMapping(Mapping):
+    """key -> item view of `LazyRecords`, decoding only the items that are looked up"""
+
+    def __init__(self, records: LazyRecords):
+        self.records = records
+        self.positions = {key: pos for pos, key in enumerate(records.keys())}
+
+    def __getitem__(self, key):
+        return self.records[self.positions[key]]
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+
+def save_archive(
+        path: str,
+        header: typing.Any,
+        items: typing.Sequence[typing.Any],
+        key_attr: str,
+) -> ArchiveIndex:
+    """
+    Writes `header` and `items` to `path`.
+    If `items` were lazily opened from `path` itself, only changed items and the new index are appended.
+    Otherwise the whole archive is written to a temporary file that then replaces `path`.
+    """
+    lazy = items if isinstance(items, LazyRecords) else None
+    if lazy is not None and _can_append(lazy.index, path):
+        index = _append(lazy, header)
+    else:
+        index = _rewrite(path, header, items, key_attr)
+    if lazy is not None:
+        lazy.rebind(index)
+    return index
+
+
+def _can_append(index: ArchiveIndex, path: str) -> bool:
+    if index.version != ARCHIVE_VERSION or not os.path.exists(path):
+        return False
+    if not os.path.samefile(index.path, path) or os.path.getsize(path) != index.end:
+        return False
+    # Too much garbage from earlier appends, compact instead
+    return index.end - index.live_size <= index.live_size
+
+
+def _item_data(
+        lazy: LazyRecords,
+        src: typing.BinaryIO,
+        pos: int,
+) -> typing.Tuple[bytes, typing.Optional[RecordRef]]:
+    """Compressed item at `pos` and the existing record it is identical to, if any"""
+    slot = lazy._slots[pos]
+    if isinstance(slot, RecordRef):
+        if not lazy._overrides and lazy.index.version == ARCHIVE_VERSION:
+            return _read_raw(src, slot), slot
+        slot = lazy._load(pos, src)
+    data = encode_record(slot)
+    origin = lazy._origin.get(id(slot))
+    if origin is not None and _read_raw(src, origin) == data:
+        return data, origin
+    return data, None
+
+
+def _append(lazy: LazyRecords, header: typing.Any) -> ArchiveIndex:
+    with lazy.open() as src:
+        header_data = encode_record(header)
+        header_same = _read_raw(src, lazy.index.header) == header_data
+        items = [_item_data(lazy, src, pos) for pos in range(len(lazy))]
+    if header_same and [same for _, same in items] == lazy.index.items:
+        return lazy.index
+
+    writer = ArchiveWriter(lazy.index.path, append_to=lazy.index)
+    try:
+        if header_same:
+            writer.header = lazy.index.header
+        else:
+            writer.write_header(header_data)
+        for pos, (data, same) in enumerate(items):
+            if same is not None:
+                writer.keep_item(same)
+            else:
+                writer.write_item(data, lazy.key(pos))
+    except Exception:
+        writer.f.truncate(lazy.index.end)
+        writer.f.close()
+        raise
+    return writer.close()
+
+
+def _rewrite(
+        path: str,
+        header: typing.Any,
+        items: typing.Sequence[typing.Any],
+        key_attr: str,
+) -> ArchiveIndex:
+    lazy = items if isinstance(items, LazyRecords) else None
+    tmp_path = f"{path}.tmp"
+    src = lazy.open() if lazy is not None else None
+    writer = ArchiveWriter(tmp_path)
+    try:
+        writer.write_header(encode_record(header))
+        if lazy is None:
+            for item in items:
+                writer.write_item(encode_record(item), getattr(item, key_attr))
+        else:
+            for pos in range(len(lazy)):
+                data, _ = _item_data(lazy, src, pos)
+                writer.write_item(data, lazy.key(pos))
+        index = writer.close()
+    except Exception:
+        writer.f.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        if src is not None:
+            src.close()
+    os.replace(tmp_path, path)
+    index.path = path
+    return index
+
+
+def open_archive(path: str, key_attr: str) -> typing.Tuple[typing.Any, LazyRecords]:
+    """Header and lazily decoded items; only the index is read up front"""
+    index = read_index(path)
+    header = read_record(path, index.header, index.version)
+    return header, LazyRecords(index, key_attr)
+
+
+def is_archive(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_legacy(path: str) -> typing.Any:
+    """Pickles written before the archive format existed"""
+    with open(path, "rb") as f:
+        return pickle.load(f)
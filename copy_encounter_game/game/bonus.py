@@ -10,12 +10,22 @@ import typing
 
 from selenium import webdriver
 
-from copy_encounter_game.helpers import ScriptedPart, DedicatedItem, wait, PrettyPrinter
+from copy_encounter_game.helpers import ScriptedPart, DedicatedItem, wait_field, PrettyPrinter, click_if_present
+from copy_encounter_game.fields import FieldMap, FormState, read_fields, read_page_fields, write_fields
+from copy_encounter_game.tracing import traced
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
+    from copy_encounter_game.http_session import HttpSession
 
 __all__ = [
     "Bonus",
+    "MAX_ANSWERS_PER_BONUS",
 ]
 
+# Answers one bonus form takes: it starts with 10 fields and every "more" link adds 30
+MAX_ANSWERS_PER_BONUS = 100
+
 
 @dataclass(repr=False)
 class Bonus(DedicatedItem, PrettyPrinter):
@@ -51,169 +61,148 @@ class Bonus(DedicatedItem, PrettyPrinter):
                         """)
         return levels
 
+    STR_PARAMS = (
+        "txtBonusName", "txtTask",
+        "txtValidFrom", "txtValidTo",
+        "txtHelp",
+    )
+    INT_PARAMS = (
+        "txtDelayHours", "txtDelayMinutes", "txtDelaySeconds",
+        "txtValidHours", "txtValidMinutes", "txtValidSeconds",
+        "txtHours", "txtMinutes", "txtSeconds",
+    )
+    CHECKBOXES = (
+        "rbAllLevels",
+        "chkAbsoluteLimit", "chkDelay", "chkRelativeLimit",
+    )
+    LEVELS_SELECTOR = '.enCheckBox[name^="level"]'
+    ANSWERS_SELECTOR = 'input[name^="answer_"]'
+    FIELDS = FieldMap(
+        inputs=STR_PARAMS + INT_PARAMS,
+        checkboxes=CHECKBOXES,
+        selects=(DedicatedItem.WHO_SELECTOR,),
+        lists=(LEVELS_SELECTOR, ANSWERS_SELECTOR),
+    )
+    EDIT_LINK = 'a[title="Edit"]'
+
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
             href: str,
     ) -> Bonus:
         with ScriptedPart(driver, href):
-            driver.find_element_by_css_selector('a[title="Edit"]').click()
-            str_params = [
-                "txtBonusName", "txtTask",
-                "txtValidFrom", "txtValidTo",
-                "txtHelp",
-            ]
-            str_vals = [
-                driver.find_element_by_name(name).get_attribute("value")
-                for name in str_params
-            ]
-
-            int_params = [
-                "txtDelayHours", "txtDelayMinutes", "txtDelaySeconds",
-                "txtValidHours", "txtValidMinutes", "txtValidSeconds",
-                "txtHours", "txtMinutes", "txtSeconds",
-            ]
-            int_vals = [
-                int(driver.find_element_by_name(name).get_attribute("value"))
-                for name in int_params
-            ]
-
-            levels = cls.get_levels(driver)
-            levels_available = [
-                level_id
-                for level_id, _, res in levels
-                if res
-            ]
-
-            checkboxes = [
-                "rbAllLevels",
-                "chkAbsoluteLimit", "chkDelay", "chkRelativeLimit",
-            ]
-
-            checkboxes_results = []
-            for chb in checkboxes:
-                checked_element = driver.find_element_by_id(chb)
-                checked = bool(checked_element.get_attribute("checked"))
-                checkboxes_results.append(checked)
-
-            levels_available = levels_available if not checkboxes_results[0] else None
-            available_time = tuple(str_vals[2:4]) if checkboxes_results[1] else None
-            appearance_delay = tuple(int_vals[:3]) if checkboxes_results[2] else None
-            availability_window = tuple(int_vals[3:6]) if checkboxes_results[3] else None
-            bonus_time = tuple(int_vals[6:9])
-
-            hint_answers = driver.execute_script("""
-                var ans = [];
-                $('input[name^="answer_"]').each(
-                    function(i, e){
-                        var val_ = $(e).attr('value');
-                        if (val_) {
-                            ans.push(val_);
-                        }
-                    }
-                );
-                return ans
-            """)
-
-            who = cls._get_for_who(driver)
-
-            # noinspection PyTypeChecker
-            inst = cls(
-                str_vals[0], str_vals[1],
-                hint_answers,
-                levels_available,
-                available_time,
-                appearance_delay,
-                availability_window,
-                bonus_time,
-                str_vals[-1],
-                who,
-            )
+            driver.find_element_by_css_selector(cls.EDIT_LINK).click()
+            wait_field(driver, "txtBonusName", "NAME")
+            inst = cls.from_fields(read_fields(driver, cls.FIELDS))
         return inst
 
+    @classmethod
+    def from_fields(cls, values: typing.Dict[str, typing.Any]) -> Bonus:
+        str_vals = [values[name] for name in cls.STR_PARAMS]
+        int_vals = [int(values[name]) for name in cls.INT_PARAMS]
+        levels_available = [
+            i + 1
+            for i, (_, _, checked) in enumerate(values[cls.LEVELS_SELECTOR])
+            if checked
+        ]
+        checkboxes_results = [values[chb] for chb in cls.CHECKBOXES]
+
+        levels_available = levels_available if not checkboxes_results[0] else None
+        available_time = tuple(str_vals[2:4]) if checkboxes_results[1] else None
+        appearance_delay = tuple(int_vals[:3]) if checkboxes_results[2] else None
+        availability_window = tuple(int_vals[3:6]) if checkboxes_results[3] else None
+        bonus_time = tuple(int_vals[6:9])
+
+        hint_answers = [
+            value
+            for _, value, _ in values[cls.ANSWERS_SELECTOR]
+            if value
+        ]
+        who = cls._who_from_fields(values)
+
+        # noinspection PyTypeChecker
+        inst = cls(
+            str_vals[0], str_vals[1],
+            hint_answers,
+            levels_available,
+            available_time,
+            appearance_delay,
+            availability_window,
+            bonus_time,
+            str_vals[-1],
+            who,
+        )
+        return inst
+
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            level_page: HtmlPage,
+            href: str,
+    ) -> Bonus:
+        page = session.follow(level_page, href)
+        edit_btn = page.find(tag="a", predicate=lambda e: e.attrs.get("title") == "Edit")
+        if edit_btn is not None:
+            page = session.follow(page, edit_btn.attrs.get("href"))
+        return cls.from_page(page)
+
+    @classmethod
+    def from_page(cls, page: HtmlPage) -> Bonus:
+        return cls.from_fields(read_page_fields(page, cls.FIELDS))
+
+    def form_state(self) -> FormState:
+        btn_id = "rbCustomLevels" if self.levels_available else "rbAllLevels"
+        checkboxes = [
+            "chkAbsoluteLimit", "chkDelay", "chkRelativeLimit",
+        ]
+        expecteds = [
+            self.available_time, self.appearence_delay, self.availability_window,
+        ]
+
+        values = {"txtBonusName": self.name}
+        params = [
+            ("txtValidFrom", "txtValidTo"),
+            ("txtDelayHours", "txtDelayMinutes", "txtDelaySeconds"),
+            ("txtValidHours", "txtValidMinutes", "txtValidSeconds"),
+            ("txtHours", "txtMinutes", "txtSeconds"),
+        ]
+        params_values = [
+            self.available_time,
+            self.appearence_delay,
+            self.availability_window,
+            self.bonus_time,
+        ]
+        for name_g, value_g in zip(params, params_values):
+            if value_g:
+                values.update(zip(name_g, value_g))
+
+        n_times_to_click = max(0, math.ceil((len(self.answers) - 10) / 30))
+        state = FormState(
+            clicks=[btn_id],
+            checks={chb_name: bool(chb_value) for chb_name, chb_value in zip(checkboxes, expecteds)},
+            check_indices={self.LEVELS_SELECTOR: list(self.levels_available or [])},
+            repeat_clicks=[("a.Text4", 2, n_times_to_click)],
+            values=values,
+            texts={"txtTask": self.bonus_task, "txtHelp": self.hint_text},
+            selects={self.WHO_SELECTOR: self.dedicated_to_who},
+            list_values={self.ANSWERS_SELECTOR: list(self.answers)},
+            submit=['[name="btnUpdate"]', '[name="btnAdd"]'],
+        )
+        return state
+
+    @traced("entity", per_owner=True)
     def to_html(
             self,
             driver: webdriver.Chrome, hint_url: str,
     ) -> None:
         with ScriptedPart(driver, hint_url):
-            # noinspection PyBroadException
-            try:
-                driver.find_element_by_css_selector('a[title="Edit"]').click()
-            except Exception:
-                pass
-
+            click_if_present(driver, 'a[title="Edit"]')
             btn_id = "rbCustomLevels" if self.levels_available else "rbAllLevels"
-            wait(driver, btn_id)
-
-            if self.levels_available:
-                driver.execute_script(f"""$('#{btn_id}').click()""")
-            else:
-                driver.execute_script(f"""$('#{btn_id}').click()""")
-
-            checkboxes = [
-                "chkAbsoluteLimit", "chkDelay", "chkRelativeLimit",
-            ]
-            expecteds = [
-                self.available_time, self.appearence_delay, self.availability_window,
-            ]
-
-            for chb_name, chb_value in zip(checkboxes, expecteds):
-                checked_element = driver.find_element_by_id(chb_name)
-                checked = bool(checked_element.get_attribute("checked"))
-                if checked != bool(chb_value):
-                    driver.execute_script(f"""$('#{chb_name}').click()""")
-                    driver.execute_script(f"""$('#{chb_name}').trigger('onclick')""")
-
-            driver.execute_script(f"""$('[name="txtBonusName"]').attr("value", "{self.name}")""")
-
-            params = [
-                ("txtValidFrom", "txtValidTo"),
-                ("txtDelayHours", "txtDelayMinutes", "txtDelaySeconds"),
-                ("txtValidHours", "txtValidMinutes", "txtValidSeconds"),
-                ("txtHours", "txtMinutes", "txtSeconds"),
-            ]
-            params_values = [
-                self.available_time,
-                self.appearence_delay,
-                self.availability_window,
-                self.bonus_time,
-            ]
-            for name_g, value_g in zip(params, params_values):
-                if value_g:
-                    for name, value in zip(name_g, value_g):
-                        driver.execute_script(f"""$('[name="{name}"]').attr("value", "{value}")""")
-
-            txt = self.bonus_task.replace("\"", "\\\"").replace("`", "\\`")
-            driver.execute_script(f"""$('textarea[name="txtTask"]').text(`{txt}`)""")
-            txt = self.hint_text.replace("\"", "\\\"").replace("`", "\\`")
-            driver.execute_script(f"""$('textarea[name="txtHelp"]').text(`{txt}`)""")
-
-            levels_available = self.levels_available or []
-            levels_in_en = self.get_levels(driver)
-            for lvl_id, lvl_name, is_checked in levels_in_en:
-                if bool(is_checked) ^ (lvl_id in levels_available):
-                    driver.execute_script(f"""$('.enCheckBox[name="{lvl_name}"]').click()""")
-                    driver.execute_script(f"""$('.enCheckBox[name="{lvl_name}"]').trigger('onclick')""")
-
-            n_times_to_click = math.ceil((len(self.answers) - 10) / 30)
-            for _ in range(n_times_to_click):
-                driver.execute_script("$('a.Text4')[2].click()")
-
-            answer_names = driver.execute_script("""
-                var levels = [];
-                $('input[name^="answer_"]').each(function(i, e){levels.push($(e).attr('name'))});
-                return levels
-            """)
-            for ans, ans_name in zip(self.answers, answer_names):
-                driver.execute_script(f"""$('input[name="{ans_name}"]').val(`{ans}`)""")
-
-            self._set_for_who(driver, self.dedicated_to_who)
-
-            # noinspection PyBroadException
-            try:
-                driver.find_element_by_name('btnUpdate').click()
-            except Exception:
-                driver.find_element_by_name('btnAdd').click()
+            wait_field(driver, btn_id)
+            write_fields(driver, self.form_state())
 
         return None
@@ -1,27 +1,85 @@
 from __future__ import annotations
 
 import time
+import copy
 from dataclasses import dataclass, field
+import logging
 import typing
-import pickle
-import os
 
 from selenium import webdriver
+import selenium.common.exceptions
 
 from copy_encounter_game.game.level import Level
 from copy_encounter_game.helpers import PrettyPrinter
-from copy_encounter_game.constants import MANAGER_URL
+from copy_encounter_game.constants import (
+    MANAGER_URL, BACKEND_SELENIUM, BACKEND_HTTP, BACKEND_BROWSER_FETCH, DEFAULT_CHROME_PROFILE,
+)
 from copy_encounter_game.game.meta_info import LevelName
 from copy_encounter_game.game.game_files import GameFiles
 from copy_encounter_game.game.game_custom_info import GameCustomInfo
+from copy_encounter_game.http_session import HttpSession
+from copy_encounter_game.workers import run_session_pool, domain_concurrency, SessionBudget
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.journal import UploadJournal
+from copy_encounter_game.game.scrape_cache import ScrapeCache
+from copy_encounter_game.game.archive import ArchiveError, LazyRecords, save_archive, open_archive, is_archive, load_legacy
+from copy_encounter_game.tracing import traced, tracer
 
 if typing.TYPE_CHECKING:
     from copy_encounter_game.game import Answer, Autopass, AnswerBlock, Task, Bonus, Hint, SectorsToCover
 
 __all__ = [
     "Game",
+    "UploadReport",
+    "FanOutReport",
 ]
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass(repr=False)
+class UploadReport(PrettyPrinter):
+    domain: str
+    game_id: int
+    succeeded: typing.List[int] = field(default_factory=list)
+    failed: typing.Dict[int, Exception] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def log(self) -> None:
+        logger.info(
+            "Uploaded %d levels to %s game %s", len(self.succeeded), self.domain, self.game_id,
+        )
+        for level_id, err in sorted(self.failed.items()):
+            logger.error("Level %s failed: %r", level_id, err)
+        return None
+
+
+@dataclass(repr=False)
+class FanOutReport(PrettyPrinter):
+    reports: typing.Dict[typing.Tuple[str, int], UploadReport] = field(default_factory=dict)
+    errors: typing.Dict[typing.Tuple[str, int], Exception] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and all(report.ok for report in self.reports.values())
+
+    @property
+    def failed_targets(self) -> typing.List[typing.Tuple[str, int]]:
+        res = sorted(
+            set(self.errors) | {target for target, report in self.reports.items() if not report.ok}
+        )
+        return res
+
+    def log(self) -> None:
+        n_targets = len(self.reports) + len(self.errors)
+        logger.info("%d of %d targets uploaded completely", n_targets - len(self.failed_targets), n_targets)
+        for (domain, game_id), err in sorted(self.errors.items()):
+            logger.error("Target %s game %s failed: %r", domain, game_id, err)
+        return None
+
 
 @dataclass(repr=False)
 class Game(PrettyPrinter):
@@ -37,8 +95,11 @@ class Game(PrettyPrinter):
     @game_id.setter
     def game_id(self, value: int):
         self._game_id = value
-        for level in self.levels:
-            level.game_id = value
+        if isinstance(self.levels, LazyRecords):
+            self.levels.set_all("game_id", value)
+        else:
+            for level in self.levels:
+                level.game_id = value
 
     @property
     def domain(self) -> str:
@@ -47,8 +108,11 @@ class Game(PrettyPrinter):
     @domain.setter
     def domain(self, value: str):
         self._domain = value
-        for level in self.levels:
-            level.domain = value
+        if isinstance(self.levels, LazyRecords):
+            self.levels.set_all("domain", value)
+        else:
+            for level in self.levels:
+                level.domain = value
 
     @property
     def n_levels(self) -> int:
@@ -67,98 +131,326 @@ class Game(PrettyPrinter):
         return n_levels
 
     @classmethod
+    def get_n_levels_http(cls, session: HttpSession) -> int:
+        mgr_url = MANAGER_URL.format(domain=session.domain, gid=session.game_id)
+        page = session.get(mgr_url)
+        n_levels = len(page.find_all(tag="input", predicate=lambda e: "txtLevelName_" in (e.name or "")))
+        return n_levels
+
+    @staticmethod
+    def open_session(
+            backend: str,
+            domain: str,
+            game_id: int,
+            creds: typing.Dict[str, str],
+            chrome_driver_path: str = None,
+            chrome_profile: str = DEFAULT_CHROME_PROFILE,
+    ) -> typing.Union[GameCustomInfo, HttpSession]:
+        if backend in (BACKEND_SELENIUM, BACKEND_BROWSER_FETCH):
+            return GameCustomInfo(domain, game_id, creds, chrome_driver_path, chrome_profile=chrome_profile)
+        if backend == BACKEND_HTTP:
+            return HttpSession(domain, game_id, creds)
+        raise ValueError(f"Unknown scraping backend {backend!r}")
+
+    @staticmethod
+    def scrape_level(
+            session: typing.Union[GameCustomInfo, HttpSession],
+            level_id: int,
+            past_game: bool = False,
+            skip_entities: typing.Set[type] = None,
+            fetch_hints: bool = False,
+    ) -> Level:
+        if isinstance(session, HttpSession):
+            return Level.from_http(
+                session, level_id,
+                past_game=past_game,
+                skip_entities=skip_entities,
+            )
+        return Level.from_html(
+            session.driver, session.domain, session.game_id, level_id,
+            past_game=past_game,
+            skip_entities=skip_entities,
+            fetch_hints=fetch_hints,
+        )
+
+    @staticmethod
+    def fingerprint_level(
+            session: typing.Union[GameCustomInfo, HttpSession],
+            level_id: int,
+    ) -> str:
+        """Fetched over plain HTTP even for the browser backend, with the browser's cookies"""
+        if isinstance(session, HttpSession):
+            return Level.fingerprint_page(session.level_page(level_id))
+        http_session = HttpSession.from_driver(session.driver, session.domain, session.game_id)
+        try:
+            return Level.fingerprint_page(http_session.level_page(level_id))
+        finally:
+            http_session.close()
+
+    @staticmethod
+    def pause_between_levels(domain: str, sleep_time: typing.Optional[float] = None) -> None:
+        """A fixed `sleep_time` restores the old constant delay, otherwise the domain pacer decides"""
+        if sleep_time is not None:
+            with tracer.span("Game.pause_between_levels", "sleep"):
+                time.sleep(sleep_time)
+        else:
+            Pacer.for_domain(domain).acquire()
+        return None
+
+    @classmethod
+    @traced("game")
     def from_html(
             cls,
             game_id: int,
             domain: str, creds: typing.Dict[str, str],
             chrome_driver_path: str,
             levels_subset: typing.Set[int] = None,
-            sleep_time: int = 10,
+            sleep_time: typing.Optional[float] = None,
             download_files: bool = False,
             files_location: str = None,
-            path_template: str = None,
-            read_cache: bool = False,
+            scrape_cache: ScrapeCache = None,
             past_game: bool = False,
             skip_entities: typing.Set[typing.Union[
                 type(Answer), type(Autopass), type(AnswerBlock), type(Task),
                 type(Bonus), type(Hint), type(LevelName), type(SectorsToCover),
             ]] = None,
+            backend: str = BACKEND_SELENIUM,
+            workers: int = 1,
+            chrome_profile: str = DEFAULT_CHROME_PROFILE,
     ) -> Game:
         skip_entities = skip_entities or {}
-        gci = GameCustomInfo(domain, game_id, creds, chrome_driver_path)
-        driver = gci.driver
-        n_levels = cls.get_n_levels(driver, domain, game_id)
+        main_session = None
 
-        if download_files:
-            files = GameFiles.from_html(driver, game_id, domain, files_location)
-        else:
-            files = GameFiles()
-
-        levels = []
-        levels_to_copy = list(range(1, n_levels + 1))
-        if levels_subset is not None:
-            levels_to_copy = [el for el in levels_to_copy if el in levels_subset]
-        for i, level_id in enumerate(levels_to_copy):
-
-            tmp_file = path_template.format(lvl_id=level_id)
-            if read_cache and os.path.exists(tmp_file):
-                level = Level.from_file(tmp_file)
-            else:
-                level = Level.from_html(
-                    driver, domain, game_id, level_id,
-                    past_game=past_game,
-                    skip_entities=skip_entities,
-                )
-                level.to_file(tmp_file)
+        def open_worker_session(idx: int) -> typing.Union[GameCustomInfo, HttpSession]:
+            if idx == 0:
+                return main_session
+            return cls.open_session(backend, domain, game_id, creds, chrome_driver_path, chrome_profile)
 
-                if i < len(levels_to_copy) - 1:
-                    time.sleep(sleep_time)
+        def close_worker_session(idx: int, session: typing.Union[GameCustomInfo, HttpSession]) -> None:
+            if idx != 0:
+                session.close()
+            return None
 
-            levels.append(level)
+        def scrape(session: typing.Union[GameCustomInfo, HttpSession], level_id: int) -> Level:
+            fingerprint = None
+            if scrape_cache is not None:
+                fingerprint = cls.fingerprint_level(session, level_id)
+                level = scrape_cache.get(level_id, fingerprint, skip_entities, past_game)
+                if level is not None:
+                    return level
+            level = cls.scrape_level(
+                session, level_id, past_game=past_game, skip_entities=skip_entities,
+                fetch_hints=backend == BACKEND_BROWSER_FETCH,
+            )
+            if scrape_cache is not None:
+                scrape_cache.put(level, fingerprint, skip_entities, past_game)
+            return level
+
+        # The main session holds a slot of the domain's budget, extra workers take one each while they run
+        budget = SessionBudget.for_domain(domain)
+        with budget.session():
+            main_session = cls.open_session(backend, domain, game_id, creds, chrome_driver_path, chrome_profile)
+            try:
+                if isinstance(main_session, HttpSession):
+                    n_levels = cls.get_n_levels_http(main_session)
+                else:
+                    n_levels = cls.get_n_levels(main_session.driver, domain, game_id)
+
+                if not download_files:
+                    files = GameFiles()
+                elif isinstance(main_session, HttpSession):
+                    files = GameFiles.from_http(main_session, files_location)
+                else:
+                    files = GameFiles.from_html(main_session.driver, game_id, domain, files_location)
+
+                levels_to_copy = list(range(1, n_levels + 1))
+                if levels_subset is not None:
+                    levels_to_copy = [el for el in levels_to_copy if el in levels_subset]
+
+                scraped, errors = run_session_pool(
+                    levels_to_copy,
+                    domain_concurrency(domain, workers),
+                    open_worker_session,
+                    scrape,
+                    close_session=close_worker_session,
+                    pause=lambda: cls.pause_between_levels(domain, sleep_time),
+                    budget=budget,
+                )
+            finally:
+                main_session.close()
+        Pacer.for_domain(domain).log_summary()
+        if errors:
+            level_id = min(errors)
+            raise errors[level_id]
+
+        if scrape_cache is not None:
+            scrape_cache.evict(n_levels)
+        levels = [scraped[level_id] for level_id in levels_to_copy]
         inst = cls(domain, game_id, levels, files)
         return inst
 
+    @traced("game")
     def to_html(
             self,
             creds: typing.Dict[str, str],
             chrome_driver_path: str,
-            sleep_time: int = 10,
+            sleep_time: typing.Optional[float] = None,
             upload_files: bool = False,
             keep_existing_hints: bool = False,
             keep_existing_penalized_hints: bool = False,
             keep_existing_bonuses: bool = False,
             keep_existing_answers: bool = False,
-    ) -> None:
-        gci = GameCustomInfo(
-            self.domain, self.game_id, creds, chrome_driver_path,
-            keep_existing_hints=keep_existing_hints,
-            keep_existing_penalized_hints=keep_existing_penalized_hints,
-            keep_existing_bonuses=keep_existing_bonuses,
-            keep_existing_answers=keep_existing_answers,
+            incremental: bool = False,
+            journal: UploadJournal = None,
+            workers: int = 1,
+            chrome_profile: str = DEFAULT_CHROME_PROFILE,
+    ) -> UploadReport:
+        """
+        With `workers` > 1, levels are written by a pool of sessions, largest level first (see `upload_order`).
+        Failed levels do not stop the others and are listed in the returned report.
+        With one worker, the first failed level raises as it always did.
+        A level that fails on a WebDriver error is retried after a new login only with a `journal`,
+        which lets the retry skip the parts that were already written.
+        """
+        def new_gci() -> GameCustomInfo:
+            gci_ = GameCustomInfo(
+                self.domain, self.game_id, creds, chrome_driver_path,
+                keep_existing_hints=keep_existing_hints,
+                keep_existing_penalized_hints=keep_existing_penalized_hints,
+                keep_existing_bonuses=keep_existing_bonuses,
+                keep_existing_answers=keep_existing_answers,
+                journal=journal,
+                chrome_profile=chrome_profile,
+            )
+            return gci_
+
+        def open_gci(idx: int) -> GameCustomInfo:
+            return main_gci if idx == 0 else new_gci()
+
+        def close_gci(idx: int, gci_: GameCustomInfo) -> None:
+            if idx != 0:
+                gci_.close()
+            return None
+
+        main_gci = None
+        by_id = self.level_to_id
+
+        def upload(gci_: GameCustomInfo, level_id: int) -> None:
+            try:
+                self.upload_level(gci_, by_id[level_id], incremental)
+            except selenium.common.exceptions.TimeoutException:
+                # The part may have been written without being recorded, a retry would write it twice
+                raise
+            except selenium.common.exceptions.WebDriverException as e:
+                if gci_.journal is None:
+                    raise
+                # The session may have expired; the journal lets the retry skip what was already written
+                logger.warning("Level %s failed with %r, logging in again", level_id, e)
+                gci_.login()
+                self.upload_level(gci_, by_id[level_id], incremental)
+            return None
+
+        # The main session holds a slot of the domain's budget, extra workers take one each while they run
+        budget = SessionBudget.for_domain(self.domain)
+        with budget.session():
+            main_gci = new_gci()
+            try:
+                to_upload = [
+                    level_id
+                    for level_id in self.upload_order(workers)
+                    if not main_gci.is_done(level_id, "level")
+                ]
+                uploaded, errors = run_session_pool(
+                    to_upload,
+                    domain_concurrency(self.domain, workers),
+                    open_gci,
+                    upload,
+                    close_session=close_gci,
+                    pause=lambda: self.pause_between_levels(self.domain, sleep_time),
+                    budget=budget,
+                    stop_on_error=workers == 1,
+                )
+                if workers == 1 and errors:
+                    raise next(errors[level_id] for level_id in to_upload if level_id not in uploaded)
+
+                if upload_files and not main_gci.is_done("files"):
+                    self.files.to_html(main_gci.driver, self.game_id, self.domain)
+                    main_gci.record("files")
+            finally:
+                main_gci.close()
+
+        Pacer.for_domain(self.domain).log_summary()
+        report = UploadReport(
+            self.domain, self.game_id,
+            [level_id for level_id in by_id if level_id not in errors],
+            errors,
         )
-        for i, level in enumerate(self.levels):
-            level.to_html(gci)
-            if i < len(self.levels) - 1:
-                time.sleep(sleep_time)
+        report.log()
+        if journal is not None and report.ok:
+            journal.clear()
+
+        return report
 
-        if upload_files:
-            self.files.to_html(gci.driver, self.game_id, self.domain)
+    def upload_order(self, workers: int = 1) -> typing.List[int]:
+        """
+        Level ids in the order `to_html` writes them: as they are with one worker, largest level first otherwise.
+        Levels still in an archive are ranked by their record size, so that ordering them does not decode them.
+        """
+        if isinstance(self.levels, LazyRecords):
+            ids = self.levels.keys()
+            if workers > 1:
+                sizes = [self.levels.size(pos) for pos in range(len(ids))]
+                ids = [ids[pos] for pos in sorted(range(len(ids)), key=lambda pos: sizes[pos], reverse=True)]
+            return ids
+        levels = self.levels
+        if workers > 1:
+            levels = sorted(levels, key=lambda lvl: lvl.n_writes, reverse=True)
+        return [level.level_id for level in levels]
 
+    @staticmethod
+    def upload_level(gci: GameCustomInfo, level: Level, incremental: bool = False) -> None:
+        if incremental:
+            level.to_html_incremental(gci)
+        else:
+            level.to_html(gci)
+        gci.record(level.level_id, "level")
         return None
 
+    def copy(self) -> Game:
+        """Independent copy, safe to retarget and manipulate while the original is reused"""
+        return copy.deepcopy(self)
+
     def to_file(self, path: str) -> None:
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+        header = {
+            "kind": "game",
+            "domain": self._domain,
+            "game_id": self._game_id,
+            "files": self.files,
+        }
+        save_archive(path, header, self.levels, "level_id")
         return None
 
     @classmethod
     def from_file(cls, path: str) -> Game:
-        with open(path, "rb") as f:
-            orig_game: Game = pickle.load(f)
+        """
+        Only the archive index is read here; levels are decoded when they are first accessed,
+        and `to_file` to the same path appends just the levels that changed
+        """
+        if not is_archive(path):
+            orig_game: Game = load_legacy(path)
+            return orig_game
+
+        header, levels = open_archive(path, "level_id")
+        if header.get("kind") != "game":
+            raise ArchiveError(f"{path} holds a {header.get('kind')}, not a game")
+        # noinspection PyArgumentList
+        orig_game = cls(header["domain"], header["game_id"], levels, header["files"])
         return orig_game
 
     @property
-    def level_to_id(self) -> typing.Dict[int, Level]:
+    def level_to_id(self) -> typing.Mapping[int, Level]:
+        if isinstance(self.levels, LazyRecords):
+            return self.levels.by_key()
         res = {level.level_id: level for level in self.levels}
         return res
 
@@ -171,10 +463,13 @@ class Game(PrettyPrinter):
         return res
 
     def __setstate__(self, state: typing.Dict[str, typing.Any]):
-        for lvl in state["levels"]:
+        # Archived levels are decoded with the right classes already, and copies keep them undecoded
+        levels = [] if isinstance(state["levels"], LazyRecords) else state["levels"]
+        for lvl in levels:
             lvl: Level
             n = lvl.name
-            n.__class__ = LevelName
+            if n is not None:
+                n.__class__ = LevelName
             lvl.name = n
         self.__dict__ = state
         return None
@@ -3,17 +3,28 @@ Custom info about the game
 """
 
 from dataclasses import dataclass, field
+import logging
 import typing
 
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 
-from copy_encounter_game.constants import ADMIN_URL
+from copy_encounter_game.constants import (
+    ADMIN_URL, MANAGER_URL, CHROME_PROFILE_LEAN, CHROME_PROFILE_FULL, DEFAULT_CHROME_PROFILE, CHROME_WINDOW_SIZE,
+    CHROME_BLOCKED_URLS,
+)
 from copy_encounter_game.helpers import PrettyPrinter
+from copy_encounter_game.http_session import HttpSession, LoginError
+from copy_encounter_game.journal import UploadJournal
+from copy_encounter_game.session_store import SessionStore
+from copy_encounter_game.tracing import traced, tracer
 
 __all__ = [
     "GameCustomInfo"
 ]
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(repr=False)
 class GameCustomInfo(PrettyPrinter):
@@ -26,8 +37,96 @@ class GameCustomInfo(PrettyPrinter):
     keep_existing_penalized_hints: bool = False
     keep_existing_bonuses: bool = False
     keep_existing_answers: bool = False
+    journal: typing.Optional[UploadJournal] = None
+    chrome_profile: str = DEFAULT_CHROME_PROFILE
+    # Where the cookies of a login are kept for the next session, None to always log in
+    session_store: typing.Optional[SessionStore] = field(default_factory=SessionStore.default)
+
+    @staticmethod
+    def chrome_options(profile: str = DEFAULT_CHROME_PROFILE) -> typing.Optional[webdriver.ChromeOptions]:
+        """None for the full profile, which keeps Chrome's own defaults"""
+        if profile == CHROME_PROFILE_FULL:
+            return None
+        if profile != CHROME_PROFILE_LEAN:
+            raise ValueError(f"Unknown Chrome profile {profile!r}")
+
+        options = webdriver.ChromeOptions()
+        options.headless = True
+        width, height = CHROME_WINDOW_SIZE
+        for arg in (
+            f"--window-size={width},{height}",
+            "--disable-extensions",
+            "--disable-gpu",
+            "--no-first-run",
+            "--mute-audio",
+            "--blink-settings=imagesEnabled=false",
+        ):
+            options.add_argument(arg)
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        # driver.get returns once the DOM is ready; the package waits for what it needs itself
+        options.set_capability("pageLoadStrategy", "eager")
+        return options
+
+    @classmethod
+    def start_driver(
+            cls,
+            chrome_driver_path: str,
+            profile: str = DEFAULT_CHROME_PROFILE,
+    ) -> webdriver.Chrome:
+        options = cls.chrome_options(profile)
+        if options is None:
+            return webdriver.Chrome(executable_path=chrome_driver_path)
+
+        driver = webdriver.Chrome(executable_path=chrome_driver_path, options=options)
+        # Fonts and media have no content setting. The block list applies to the main window only, popups are
+        # new targets, but they are small forms
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(CHROME_BLOCKED_URLS)})
+        except WebDriverException as e:
+            logger.warning("Could not block fonts and media: %r", e)
+        return driver
+
+    def restore_session(self) -> bool:
+        """
+        Puts the stored cookies of this domain and user into the browser, if a probe over HTTP shows
+        they are still logged in. The browser loads the login page, to be on the domain for the cookies,
+        and then the level manager to check that it is logged in with them too.
+        """
+        store = self.session_store
+        cookies = None if store is None else store.load(self.domain, self.creds)
+        if cookies is None:
+            return False
+        probe = HttpSession(self.domain, self.game_id, self.creds, cookies=cookies, session_store=None)
+        try:
+            alive = probe.is_logged_in()
+        finally:
+            probe.close()
+        if not alive:
+            store.drop(self.domain, self.creds)
+            return False
+
+        self.driver.get(ADMIN_URL.format(domain=self.domain))
+        self.driver.delete_all_cookies()
+        for cookie in cookies:
+            self.driver.add_cookie({
+                key: value for key, value in cookie.items()
+                if key in ("name", "value", "path", "secure", "httpOnly", "expiry")
+            })
+        self.driver.get(MANAGER_URL.format(domain=self.domain, gid=self.game_id))
+        if self.driver.find_elements_by_id("txtPassword"):
+            logger.info("Stored session for %s is logged out in the browser, logging in again", self.domain)
+            self.driver.delete_all_cookies()
+            store.drop(self.domain, self.creds)
+            return False
+        return True
 
+    @traced("session")
     def login(self) -> None:
+        """Logs in with the form only when there is no stored session or it has expired"""
+        if self.restore_session():
+            return None
+
         self.driver.get(ADMIN_URL.format(domain=self.domain))
 
         login = self.driver.find_element_by_id("txtLogin")
@@ -37,22 +136,39 @@ class GameCustomInfo(PrettyPrinter):
 
         sbm = self.driver.find_element_by_xpath("/html/body/div[1]/form/div/div[1]/input[3]")
         sbm.submit()
+        # A wrong password or a captcha leaves the browser on the login form
+        if self.driver.find_elements_by_id("txtPassword"):
+            raise LoginError(f"Could not log in to {self.domain} as {self.creds['user']!r}")
+        if self.session_store is not None:
+            self.session_store.save(self.domain, self.creds, self.driver.get_cookies())
         return None
 
+    @traced("session")
     def navigate_to_level(self, level_id: int) -> None:
         from copy_encounter_game.game.level import Level
         url = Level.current_level_url(self.domain, self.game_id, level_id)
         self.driver.get(url)
         return None
 
+    def close(self) -> None:
+        self.driver.quit()
+        return None
+
     def __post_init__(self):
         if self.driver is None:
-            self.driver = webdriver.Chrome(
-                executable_path=self.chrome_driver_path,
-            )
+            self.driver = self.start_driver(self.chrome_driver_path, self.chrome_profile)
+        tracer.instrument_driver(self.driver)
         self.login()
         return None
 
+    def is_done(self, *key: typing.Union[str, int]) -> bool:
+        return self.journal is not None and self.journal.is_done(*key)
+
+    def record(self, *key: typing.Union[str, int]) -> None:
+        if self.journal is not None:
+            self.journal.record(*key)
+        return None
+
     def keep_existing_hint_type(self, type_: int) -> bool:
         to_keep = {
             0: self.keep_existing_hints,
@@ -4,20 +4,34 @@ Game files list
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import logging
 import os
+import re
+import time
 from dataclasses import dataclass, field
 import typing
+from urllib.parse import urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 
-from copy_encounter_game.constants import MANAGER_URL, CHUNK_SIZE_FILES
+from copy_encounter_game.constants import (
+    MANAGER_URL, CHUNK_SIZE_FILES, FILE_CACHE_DIR,
+    TRANSFER_WORKERS, TRANSFER_CONNECTIONS_PER_HOST, TRANSFER_RETRIES, TRANSFER_BACKOFF,
+)
+from copy_encounter_game.file_cache import FileCache, TransferStats
+from copy_encounter_game.http_session import HttpSession
 from copy_encounter_game.helpers import chunks, ScriptedPart, PrettyPrinter
 
 __all__ = [
     "GameFiles",
 ]
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(repr=False)
 class GameFiles(PrettyPrinter):
@@ -65,6 +79,22 @@ class GameFiles(PrettyPrinter):
         file_urls = driver.execute_script(script)
         return file_urls
 
+    @classmethod
+    def find_file_urls_http(
+            cls,
+            session: HttpSession,
+    ) -> typing.List[str]:
+        mgr_url = MANAGER_URL.format(domain=session.domain, gid=session.game_id)
+        page = session.get(mgr_url)
+        view_re = re.compile("lnkViewFile")
+        file_urls = []
+        for holder in page.find_all(class_="border_rad2"):
+            for a in holder.iter(tag="a", predicate=lambda e: bool(view_re.search(e.id or ""))):
+                url = urljoin(page.url, a.attrs.get("href", ""))
+                if url not in file_urls:
+                    file_urls.append(url)
+        return file_urls
+
     @classmethod
     def find_file_names(
             cls,
@@ -91,26 +121,133 @@ class GameFiles(PrettyPrinter):
         file_urls = cls.find_file_urls(driver, game_id, domain)
         inst = cls(file_urls, files_location)
         if files_location:
-            inst.download_files(files_location)
+            session = HttpSession.from_driver(
+                driver, domain, game_id, pool_size=TRANSFER_CONNECTIONS_PER_HOST, pool_block=True,
+            )
+            try:
+                inst.download_files(files_location, session=session.session)
+            finally:
+                session.close()
         return inst
 
-    def download_files(self, location: str) -> None:
-        for url, name in zip(self.file_urls, self.file_names):
-            res = requests.get(url)
-            res.raise_for_status()
-            fpath = os.path.join(location, name)
-            with open(fpath, "wb") as handle:
-                handle.write(res.content)
-        return None
+    @classmethod
+    def from_http(
+            cls,
+            session: HttpSession,
+            files_location: typing.Optional[str] = None,
+    ) -> GameFiles:
+        file_urls = cls.find_file_urls_http(session)
+        inst = cls(file_urls, files_location)
+        if files_location:
+            inst.download_files(files_location, session=session.session)
+        return inst
+
+    def download_files(
+            self,
+            location: str,
+            cache: FileCache = None,
+            session: requests.Session = None,
+            workers: int = TRANSFER_WORKERS,
+    ) -> TransferStats:
+        """
+        Downloads through the file cache with a pool of `workers` threads sharing one keep-alive `session`.
+        Pass the session of a logged-in HttpSession for files that need authentication.
+        """
+        cache = cache or FileCache(os.path.join(location, FILE_CACHE_DIR))
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_maxsize=TRANSFER_CONNECTIONS_PER_HOST, pool_block=True,
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        stats = TransferStats(len(self.file_urls))
+
+        def download(url: str, name: str) -> bool:
+            received = []
+
+            def on_bytes(n: int) -> None:
+                received.append(n)
+                stats.add_bytes(n)
+                return None
+
+            cache.copy_to(url, os.path.join(location, name), session, on_bytes)
+            return bool(received)
+
+        jobs = [
+            (name, functools.partial(download, url, name))
+            for url, name in zip(self.file_urls, self.file_names)
+        ]
+        run_transfers(jobs, stats, workers, "Downloaded")
+        return stats
+
+    def to_http(
+            self,
+            session: HttpSession,
+            cache: FileCache = None,
+            workers: int = TRANSFER_WORKERS,
+    ) -> TransferStats:
+        """
+        Posts the upload form directly, one file per request and `workers` requests in flight.
+        A file is skipped when the target already has a file with the same name and content.
+        """
+        assert self.file_location is not None, "Can't upload files without explicit location"
+        cache = cache or FileCache(os.path.join(self.file_location, FILE_CACHE_DIR))
+        existing = {
+            url.split("/")[-1]: url
+            for url in self.find_file_urls_http(session)
+        }
+        uploader_url = session.url(f"./FileUploader.aspx?gid={session.game_id}")
+        stats = TransferStats(len(self.file_names))
+
+        def same_content(path: str, url: str) -> bool:
+            # Only a remote file of the same size is hashed, and it is downloaded only if the cache
+            # has no copy with the size and ETag of this HEAD
+            res = session.session.head(url, allow_redirects=True, timeout=session.timeout)
+            size = res.headers.get("Content-Length") if res.ok else None
+            if size is None or int(size) != os.path.getsize(path):
+                return False
+            remote = cache.lookup(url, res) or cache.fetch(url, session.session)
+            return os.path.basename(remote) == FileCache.hash_file(path)
+
+        def upload(name: str) -> bool:
+            path = os.path.join(self.file_location, name)
+            if name in existing and same_content(path, existing[name]):
+                return False
+            page = session.get(uploader_url)
+            data = {}
+            upload_btn = page.find(tag="input", predicate=lambda e: e.attrs.get("title") == "Upload")
+            if upload_btn is not None and upload_btn.name:
+                data[upload_btn.name] = upload_btn.attrs.get("value", "")
+            session.submit_files(page, {"inputFile1": path}, data)
+            stats.add_bytes(os.path.getsize(path))
+            return True
+
+        jobs = [
+            (name, functools.partial(upload, name))
+            for name in self.file_names
+        ]
+        run_transfers(jobs, stats, workers, "Uploaded")
+        return stats
 
     def to_html(
             self,
             driver: webdriver.Chrome,
             game_id: int,
             domain: str,
+            direct: bool = True,
     ) -> None:
-
+        """`direct` uploads over HTTP with the browser's cookies, otherwise through the uploader popup"""
         assert self.file_location is not None, "Can't upload files without explicit location"
+        if direct:
+            session = HttpSession.from_driver(
+                driver, domain, game_id, pool_size=TRANSFER_CONNECTIONS_PER_HOST, pool_block=True,
+            )
+            try:
+                self.to_http(session)
+            finally:
+                session.close()
+            return None
 
         existing_fnames = self.find_file_names(driver, game_id, domain)
 
@@ -130,3 +267,40 @@ class GameFiles(PrettyPrinter):
                 upload_btn.click()
 
         return None
+
+
+def run_transfers(
+        jobs: typing.List[typing.Tuple[str, typing.Callable[[], bool]]],
+        stats: TransferStats,
+        workers: int = TRANSFER_WORKERS,
+        what: str = "Transferred",
+) -> None:
+    """
+    Runs (name, job) pairs on a thread pool; a job returns False if there was nothing to transfer.
+    Network errors are retried with exponential backoff, the first final failure is raised at the end.
+    """
+    def run(name: str, job: typing.Callable[[], bool]) -> None:
+        for attempt in range(TRANSFER_RETRIES + 1):
+            try:
+                transferred = job()
+            except requests.RequestException as e:
+                if attempt == TRANSFER_RETRIES:
+                    stats.file_done(name, failed=True)
+                    raise
+                delay = TRANSFER_BACKOFF * 2 ** attempt
+                logger.warning("%s failed (%r), retrying in %.1f s", name, e, delay)
+                with stats.lock:
+                    stats.n_retries += 1
+                time.sleep(delay)
+            else:
+                stats.file_done(name, skipped=not transferred)
+                break
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(run, name, job) for name, job in jobs]
+    stats.finish(what)
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        raise errors[0]
+    return None
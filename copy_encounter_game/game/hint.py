@@ -9,7 +9,13 @@ import typing
 
 from selenium import webdriver
 
-from copy_encounter_game.helpers import ScriptedPart, DedicatedItem, wait, PrettyPrinter
+from copy_encounter_game.helpers import ScriptedPart, DedicatedItem, wait_field, PrettyPrinter, click_if_present
+from copy_encounter_game.fields import FieldMap, FormState, read_fields, read_page_fields, write_fields
+from copy_encounter_game.tracing import traced
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
+    from copy_encounter_game.http_session import HttpSession
 
 __all__ = [
     "Hint",
@@ -23,131 +29,125 @@ class Hint(DedicatedItem, PrettyPrinter):
     hint_text: str = ""
     dedicated_to_who: int = 0
 
+    FIELDS = FieldMap(
+        inputs=(
+            "NewPromptTimeoutDays", "NewPromptTimeoutHours", "NewPromptTimeoutMinutes", "NewPromptTimeoutSeconds",
+        ),
+        texts=(".textarea_blank",),
+        selects=(DedicatedItem.WHO_SELECTOR,),
+    )
+    # Switches the view page of a hint to its form
+    EDIT_LINK = "#lnkEdit"
+
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
             href: str,
     ) -> Hint:
         with ScriptedPart(driver, href):
-            driver.find_element_by_id("lnkEdit").click()
-            params = [
-                "NewPromptTimeoutDays", "NewPromptTimeoutHours", "NewPromptTimeoutMinutes", "NewPromptTimeoutSeconds"
-            ]
-            vals = [
-                int(driver.find_element_by_name(name).get_attribute("value"))
-                for name in params
-            ]
-            txt = driver.execute_script("return $('.textarea_blank').text()")
-            who = cls._get_for_who(driver)
-
-            # noinspection PyTypeChecker
-            inst = cls(tuple(vals), txt, who)
+            driver.find_element_by_css_selector(cls.EDIT_LINK).click()
+            wait_field(driver, "NewPromptTimeoutDays", "NAME")
+            inst = cls.from_fields(read_fields(driver, cls.FIELDS))
         return inst
 
-    def to_html(
-            self,
-            driver: webdriver.Chrome, hint_url: str,
-    ) -> None:
-        with ScriptedPart(driver, hint_url):
-            # noinspection PyBroadException
-            try:
-                driver.find_element_by_id("lnkEdit").click()
-            except Exception:
-                pass
-
-            wait(driver, "NewPrompt", "NAME")
-
-            params = [
-                "NewPromptTimeoutDays", "NewPromptTimeoutHours", "NewPromptTimeoutMinutes", "NewPromptTimeoutSeconds"
-            ]
-            for name, value in zip(params, self.hint_time):
-                driver.execute_script(f"""$('[name="{name}"]').attr("value", "{value}")""")
-
-            txt = self.hint_text.replace("\"", "\\\"").replace("`", "\\`")
-            driver.execute_script(f"""$('textarea[name="NewPrompt"]').text(`{txt}`)""")
-            self._set_for_who(driver, self.dedicated_to_who)
-
-            # noinspection PyBroadException
-            try:
-                driver.find_element_by_id('btnUpdate').click()
-            except Exception:
-                driver.find_element_by_id('btnAdd').click()
-
-        return None
+    @classmethod
+    def from_fields(cls, values: typing.Dict[str, typing.Any]) -> Hint:
+        vals = [int(values[name]) for name in cls.FIELDS.inputs]
+        txt = values[".textarea_blank"]
+        who = cls._who_from_fields(values)
 
+        # noinspection PyTypeChecker
+        inst = cls(tuple(vals), txt, who)
+        return inst
 
-@dataclass(repr=False)
-class PenalizedHint(Hint, PrettyPrinter):
-    hint_description: str = ""
-    additional_confirmation_on: bool = True
-    penalty_time: typing.Tuple[int, int, int] = (0, 0, 0)
+    @staticmethod
+    def open_edit_page(
+            session: HttpSession,
+            level_page: HtmlPage,
+            href: str,
+    ) -> HtmlPage:
+        page = session.follow(level_page, href)
+        edit_btn = page.by_id("lnkEdit")
+        if edit_btn is not None:
+            page = session.follow(page, edit_btn.attrs.get("href"))
+        return page
 
     @classmethod
-    def from_html(
+    @traced("entity", per_owner=True)
+    def from_http(
             cls,
-            driver: webdriver.Chrome,
+            session: HttpSession,
+            level_page: HtmlPage,
             href: str,
-    ) -> PenalizedHint:
-        with ScriptedPart(driver, href):
-            driver.find_element_by_id("lnkEdit").click()
-            params = [
-                "NewPromptTimeoutDays", "NewPromptTimeoutHours", "NewPromptTimeoutMinutes", "NewPromptTimeoutSeconds",
-                "PenaltyPromptHours", "PenaltyPromptMinutes", "PenaltyPromptSeconds",
-            ]
-            vals = [
-                int(driver.find_element_by_name(name).get_attribute("value"))
-                for name in params
-            ]
-            txt = driver.execute_script("""return $('.textarea_blank[name="NewPrompt"]').text()""")
-
-            confirmation_on = bool(driver.find_element_by_id("chkRequestPenaltyConfirm").get_attribute("checked"))
-            header = driver.execute_script("""return $('.textarea_blank[name="txtPenaltyComment"]').text()""")
-            who = cls._get_for_who(driver)
-            # noinspection PyTypeChecker
-            inst = cls(
-                tuple(vals[:4]), txt, who,
-                header, confirmation_on, tuple(vals[4:])
-            )
-        return inst
+    ) -> Hint:
+        page = cls.open_edit_page(session, level_page, href)
+        return cls.from_page(page)
+
+    @classmethod
+    def from_page(cls, page: HtmlPage) -> Hint:
+        return cls.from_fields(read_page_fields(page, cls.FIELDS))
 
+    SUBMIT = ["#btnUpdate", "#btnAdd"]
+
+    def form_state(self) -> FormState:
+        state = FormState(
+            values=dict(zip(self.FIELDS.inputs, self.hint_time)),
+            texts={"NewPrompt": self.hint_text},
+            selects={self.WHO_SELECTOR: self.dedicated_to_who},
+            submit=self.SUBMIT,
+        )
+        return state
+
+    @traced("entity", per_owner=True)
     def to_html(
             self,
             driver: webdriver.Chrome, hint_url: str,
     ) -> None:
         with ScriptedPart(driver, hint_url):
-            # noinspection PyBroadException
-            try:
-                driver.find_element_by_id("lnkEdit").click()
-            except Exception:
-                pass
-
-            wait(driver, "NewPrompt", "NAME")
-
-            params = [
-                "NewPromptTimeoutDays", "NewPromptTimeoutHours", "NewPromptTimeoutMinutes", "NewPromptTimeoutSeconds",
-                "PenaltyPromptHours", "PenaltyPromptMinutes", "PenaltyPromptSeconds",
-            ]
-            for name, value in zip(params, self.hint_time + self.penalty_time):
-                driver.execute_script(f"""$('[name="{name}"]').attr("value", "{value}")""")
+            click_if_present(driver, "#lnkEdit")
+            wait_field(driver, "NewPrompt", "NAME")
+            write_fields(driver, self.form_state())
 
-            txt = self.hint_text.replace("\"", "\\\"").replace("`", "\\`")
-            driver.execute_script(f"""$('textarea[name="NewPrompt"]').text(`{txt}`)""")
+        return None
 
-            desc = self.hint_description.replace("\"", "\\\"").replace("`", "\\`")
-            driver.execute_script(f"""$('textarea[name="txtPenaltyComment"]').text(`{desc}`)""")
 
-            is_checked = bool(driver.find_element_by_id("chkRequestPenaltyConfirm").get_attribute("checked"))
-            if self.additional_confirmation_on ^ is_checked:
-                driver.execute_script("""$('#chkRequestPenaltyConfirm').click()""")
-                driver.execute_script("""$('#chkRequestPenaltyConfirm').trigger('onclick')""")
+@dataclass(repr=False)
+class PenalizedHint(Hint, PrettyPrinter):
+    hint_description: str = ""
+    additional_confirmation_on: bool = True
+    penalty_time: typing.Tuple[int, int, int] = (0, 0, 0)
 
-            self._set_for_who(driver, self.dedicated_to_who)
+    FIELDS = FieldMap(
+        inputs=(
+            "NewPromptTimeoutDays", "NewPromptTimeoutHours", "NewPromptTimeoutMinutes", "NewPromptTimeoutSeconds",
+            "PenaltyPromptHours", "PenaltyPromptMinutes", "PenaltyPromptSeconds",
+        ),
+        checkboxes=("chkRequestPenaltyConfirm",),
+        texts=('.textarea_blank[name="NewPrompt"]', '.textarea_blank[name="txtPenaltyComment"]'),
+        selects=(DedicatedItem.WHO_SELECTOR,),
+    )
 
-            # noinspection PyBroadException
-            try:
-                driver.find_element_by_id('btnUpdate').click()
-            except Exception:
-                driver.find_element_by_id('btnAdd').click()
+    @classmethod
+    def from_fields(cls, values: typing.Dict[str, typing.Any]) -> PenalizedHint:
+        vals = [int(values[name]) for name in cls.FIELDS.inputs]
+        txt, header = [values[selector] for selector in cls.FIELDS.texts]
+        confirmation_on = values["chkRequestPenaltyConfirm"]
+        who = cls._who_from_fields(values)
+        # noinspection PyTypeChecker
+        inst = cls(
+            tuple(vals[:4]), txt, who,
+            header, confirmation_on, tuple(vals[4:])
+        )
+        return inst
 
-        return None
+    def form_state(self) -> FormState:
+        state = FormState(
+            checks={"chkRequestPenaltyConfirm": self.additional_confirmation_on},
+            values=dict(zip(self.FIELDS.inputs, self.hint_time + self.penalty_time)),
+            texts={"NewPrompt": self.hint_text, "txtPenaltyComment": self.hint_description},
+            selects={self.WHO_SELECTOR: self.dedicated_to_who},
+            submit=self.SUBMIT,
+        )
+        return state
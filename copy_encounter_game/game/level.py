@@ -4,11 +4,11 @@ Game meta info
 
 from __future__ import annotations
 
-import time
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+import hashlib
 import typing
 import itertools
-import pickle
+import logging
 
 from selenium import webdriver
 import selenium.common.exceptions
@@ -16,15 +16,27 @@ import selenium.common.exceptions
 from copy_encounter_game.game.meta_info import LevelName, Autopass, AnswerBlock, SectorsToCover
 from copy_encounter_game.game.task import Task
 from copy_encounter_game.game.hint import Hint, PenalizedHint
-from copy_encounter_game.game.answer import Answer
+from copy_encounter_game.game.answer import Answer, AnswerLinks
 from copy_encounter_game.game.bonus import Bonus
-from copy_encounter_game.helpers import wait, PrettyPrinter, wait_url_contains
+from copy_encounter_game.game.level_diff import LevelDiff
+from copy_encounter_game.game.archive import ArchiveError, save_archive, open_archive, is_archive, load_legacy
+from copy_encounter_game.helpers import PrettyPrinter, wait_until, wait_field, wait_ajax_idle, delete_in_popup
+from copy_encounter_game.fields import FieldFetch, fetch_fields
+from copy_encounter_game.html_page import script_url
+from copy_encounter_game.http_session import HttpSession
+from copy_encounter_game.pacing import Pacer
 from copy_encounter_game.game.game_custom_info import GameCustomInfo
+from copy_encounter_game.tracing import traced
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
 
 __all__ = [
     "Level",
 ]
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(repr=False)
 class Level(PrettyPrinter):
@@ -51,6 +63,16 @@ class Level(PrettyPrinter):
             res = list(enumerate(self.answers))
         return res
 
+    @property
+    def n_writes(self) -> int:
+        """Rough number of form submissions `to_html` needs, used to balance upload workers"""
+        singles = (self.name, self.autopass, self.answer_block, self.sectors_to_cover)
+        res = sum(el is not None for el in singles)
+        for entities in (self.tasks, self.hints, self.penalized_hints, self.bonuses):
+            res += len(entities or [])
+        res += sum(len(list(ans.parts())) for ans in self.answers or [])
+        return res
+
     @classmethod
     def current_level_url(cls, domain: str, game_id: int, level_id: int) -> str:
         return cls.LEVEL_URL.format(domain=domain, gid=game_id, lid=level_id)
@@ -68,7 +90,7 @@ class Level(PrettyPrinter):
 
     @classmethod
     def find_hint_urls(cls, driver: webdriver.Chrome, type_: int = 0) -> typing.List[str]:
-        time.sleep(0.3)
+        wait_ajax_idle(driver)
         num = 2 + type_
         hint_hrefs = driver.execute_script(f"""
                         var tbl = $('table.bg_dark')[{num}];
@@ -83,6 +105,47 @@ class Level(PrettyPrinter):
                         """)
         return hint_hrefs
 
+    @classmethod
+    def hint_urls_from_page(cls, page: HtmlPage, type_: int = 0) -> typing.List[str]:
+        num = 2 + type_
+        tables = page.find_all(tag="table", class_="bg_dark")
+        if len(tables) <= num:
+            return []
+        tbl = tables[num]
+
+        def in_inner_row(link) -> bool:
+            seen_row = False
+            node = link.parent
+            while node is not None and node is not tbl:
+                if node.tag == "tr":
+                    seen_row = True
+                elif node.tag == "table" and seen_row:
+                    return True
+                node = node.parent
+            return False
+
+        hint_hrefs = [
+            a.attrs.get("href")
+            for a in tbl.iter(tag="a")
+            if in_inner_row(a)
+        ]
+        return hint_hrefs
+
+    @classmethod
+    def fingerprint_page(cls, page: HtmlPage) -> str:
+        """
+        Cheap summary of a LevelEditor page: hint/penalized hint/bonus counts and the visible text
+        of the level settings and entity tables. Changes that are not visible there are not noticed.
+        """
+        parts = [str(len(cls.hint_urls_from_page(page, type_))) for type_ in range(3)]
+        for id_ in (Autopass.STATUS_ID, AnswerBlock.STATUS_ID, SectorsToCover.STATUS_ID, Task.TASK_ID_ELEMENT):
+            elem = page.by_id(id_)
+            parts.append("" if elem is None else elem.text)
+        for tbl in page.find_all(tag="table", class_="bg_dark"):
+            parts.append(tbl.text)
+        summary = "\n".join(" ".join(part.split()) for part in parts)
+        return hashlib.sha256(summary.encode("utf-8")).hexdigest()
+
     @classmethod
     def load_hints(
         cls,
@@ -90,15 +153,74 @@ class Level(PrettyPrinter):
         type_: int = 0, type_class: typing.Union[
             type(Hint), type(PenalizedHint), type(Bonus)
         ] = Hint,
+        pacer: Pacer = None,
+    ) -> typing.List[Hint]:
+        return cls.load_hints_from(driver, cls.find_hint_urls(driver, type_), type_class, pacer)
+
+    @staticmethod
+    def load_hints_from(
+        driver: webdriver.Chrome,
+        hint_hrefs: typing.List[str],
+        type_class: typing.Union[type(Hint), type(PenalizedHint), type(Bonus)],
+        pacer: Pacer = None,
     ) -> typing.List[Hint]:
-        hint_hrefs = cls.find_hint_urls(driver, type_)
         hints = []
         for href in hint_hrefs:
-            hint = type_class.from_html(driver, href)
+            if pacer is None:
+                hint = type_class.from_html(driver, href)
+            else:
+                pacer.acquire()
+                with pacer.track():
+                    hint = type_class.from_html(driver, href)
             hints.append(hint)
 
         return hints
 
+    @classmethod
+    @traced("entity")
+    def fetch_all_hints(
+        cls,
+        driver: webdriver.Chrome,
+        type_classes: typing.Dict[int, typing.Union[type(Hint), type(PenalizedHint), type(Bonus)]],
+        pacer: Pacer,
+    ) -> typing.Dict[int, typing.List[Hint]]:
+        """
+        `load_hints` of every type in `type_classes` without popups: the level page fetches all edit pages
+        at once and returns their fields in one round trip. Pages it could not read are opened in a popup.
+        """
+        hrefs = {type_: cls.find_hint_urls(driver, type_) for type_ in type_classes}
+        jobs = [
+            (type_, href, FieldFetch(script_url(href), type_classes[type_].FIELDS, type_classes[type_].EDIT_LINK))
+            for type_, type_hrefs in hrefs.items()
+            for href in type_hrefs
+            if script_url(href) is not None
+        ]
+        # A token per page the browser fetches, a hint's page and its edit page. The batch lasts as long as
+        # many pages, so only its errors count for pacing
+        for _, _, job in jobs:
+            for _ in range(2 if job.edit_selector else 1):
+                pacer.acquire()
+        with pacer.track(count_slow=False):
+            results = fetch_fields(driver, [job for _, _, job in jobs])
+        fetched = {(type_, href): fields for (type_, href, _), fields in zip(jobs, results)}
+
+        res = {}
+        for type_, type_hrefs in hrefs.items():
+            type_class = type_classes[type_]
+            res[type_] = []
+            for href in type_hrefs:
+                fields = fetched.get((type_, href))
+                hint = None
+                if fields is not None:
+                    try:
+                        hint = type_class.from_fields(fields)
+                    except (TypeError, ValueError, KeyError) as e:
+                        logger.warning("Fields of %s are not a %s: %r", href, type_class.__name__, e)
+                if hint is None:
+                    hint = cls.load_hints_from(driver, [href], type_class, pacer)[0]
+                res[type_].append(hint)
+        return res
+
     @classmethod
     def load_tasks(cls, driver: webdriver.Chrome) -> typing.List[Task]:
         # noinspection PyBroadException
@@ -115,7 +237,7 @@ class Level(PrettyPrinter):
     def load_answers(cls, driver: webdriver.Chrome, domain: str) -> typing.List[Answer]:
         # noinspection PyBroadException
         driver.find_element_by_id(Answer.SHOW_ANSWERS_ID).click()
-        wait(driver, "hdnSectorNames_0")
+        wait_field(driver, "hdnSectorNames_0")
         # noinspection PyBroadException
         try:
             edit_urls = driver.execute_script("""
@@ -127,10 +249,7 @@ class Level(PrettyPrinter):
             return res
             """)
             sector_names = driver.execute_script("""return $('#hdnSectorNames_0').val()""")
-            if sector_names is None:
-                sector_names = []
-            else:
-                sector_names = eval(f"{{{sector_names}}}").values()
+            sector_names = list(AnswerLinks.parse_sector_names(sector_names).values())
         except Exception as e:
             print(e)
             answers = []
@@ -145,6 +264,30 @@ class Level(PrettyPrinter):
         return answers
 
     @classmethod
+    def load_answers_http(cls, session: HttpSession, level_page: HtmlPage) -> typing.List[Answer]:
+        show_btn = level_page.by_id(Answer.SHOW_ANSWERS_ID)
+        page = level_page
+        if show_btn is not None and page.by_id("hdnSectorNames_0") is None:
+            page = session.follow(level_page, show_btn.attrs.get("href"))
+
+        edit_urls = [
+            a.attrs.get("href")
+            for a in page.find_all(tag="a", predicate=lambda e: e.attrs.get("title") == "Edit")
+        ]
+        sector_names_elem = page.by_id("hdnSectorNames_0")
+        sector_names = list(AnswerLinks.parse_sector_names(
+            None if sector_names_elem is None else sector_names_elem.value
+        ).values())
+        if not sector_names:
+            sector_names = [None]
+        answers = [
+            Answer.from_http(session, url, name, i)
+            for i, (url, name) in enumerate(zip(edit_urls, sector_names))
+        ]
+        return answers
+
+    @classmethod
+    @traced("level")
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -156,13 +299,19 @@ class Level(PrettyPrinter):
                 type(Answer), type(Autopass), type(AnswerBlock), type(Task),
                 type(Bonus), type(Hint), type(LevelName), type(SectorsToCover),
             ]] = None,
+            fetch_hints: bool = False,
     ) -> Level:
         skip_entities = skip_entities or {}
-        driver.get(cls.current_level_url(domain, game_id, level_id))
+        pacer = Pacer.for_domain(domain)
+        pacer.acquire()
+        with pacer.track():
+            driver.get(cls.current_level_url(domain, game_id, level_id))
+            wait_ajax_idle(driver)
 
         name = None
         if cls.needed(LevelName, skip_entities):
-            name = LevelName.from_html(driver, game_id, level_id)
+            with pacer.track():
+                name = LevelName.from_html(driver, game_id, level_id)
 
         ap = None
         if cls.needed(Autopass, skip_entities):
@@ -179,12 +328,77 @@ class Level(PrettyPrinter):
         if cls.needed(SectorsToCover, skip_entities):
             sectors = SectorsToCover.from_html(driver)
 
-        time.sleep(2)
+        pacer.acquire()
+
+        tasks = []
+        if cls.needed(Task, skip_entities):
+            with pacer.track():
+                tasks = cls.load_tasks(driver)
+        pacer.acquire()
+        type_classes = {
+            type_: type_class
+            for type_, type_class in enumerate([Hint, PenalizedHint, Bonus])
+            if cls.needed(type_class, skip_entities)
+        }
+        if fetch_hints:
+            loaded = cls.fetch_all_hints(driver, type_classes, pacer)
+        else:
+            loaded = {
+                type_: cls.load_hints(driver, type_, type_class, pacer=pacer)
+                for type_, type_class in type_classes.items()
+            }
+        hint_types = [loaded.get(type_) for type_ in range(3)]
+        pacer.acquire()
+        answers = cls.load_answers(driver, domain)
+
+        # noinspection PyTypeChecker
+        inst = cls(
+            domain, game_id, level_id,
+            name, ap, block,
+            sectors,
+            tasks, *hint_types,
+            answers,
+        )
+
+        return inst
+
+    @classmethod
+    @traced("level")
+    def from_http(
+            cls,
+            session: HttpSession,
+            level_id: int,
+            past_game: bool = False,
+            skip_entities: typing.Set[typing.Union[
+                type(Answer), type(Autopass), type(AnswerBlock), type(Task),
+                type(Bonus), type(Hint), type(LevelName), type(SectorsToCover),
+            ]] = None,
+    ) -> Level:
+        skip_entities = skip_entities or {}
+        domain, game_id = session.domain, session.game_id
+        page = session.level_page(level_id)
+
+        name = None
+        if cls.needed(LevelName, skip_entities):
+            name = LevelName.from_http(session, game_id, level_id)
+
+        ap = None
+        if cls.needed(Autopass, skip_entities):
+            ap = Autopass.from_http(session, page, past_game=past_game)
+
+        block = None
+        if cls.needed(AnswerBlock, skip_entities):
+            block = AnswerBlock.from_http(session, page)
+
+        sectors = None
+        if cls.needed(SectorsToCover, skip_entities):
+            sectors = SectorsToCover.from_http(session, page)
 
         tasks = []
         if cls.needed(Task, skip_entities):
-            tasks = cls.load_tasks(driver)
-        time.sleep(2)
+            task = Task.from_http(session, page)
+            tasks = [task] if task is not None else []
+
         hint_types = []
         for type_ in range(3):
             type_class = {
@@ -195,10 +409,12 @@ class Level(PrettyPrinter):
 
             hint_type = None
             if cls.needed(type_class, skip_entities):
-                hint_type = cls.load_hints(driver, type_, type_class)
-                time.sleep(2)
+                hint_type = [
+                    type_class.from_http(session, page, href)
+                    for href in cls.hint_urls_from_page(page, type_)
+                ]
             hint_types.append(hint_type)
-        answers = cls.load_answers(driver, domain)
+        answers = cls.load_answers_http(session, page)
 
         # noinspection PyTypeChecker
         inst = cls(
@@ -208,7 +424,6 @@ class Level(PrettyPrinter):
             tasks, *hint_types,
             answers,
         )
-
         return inst
 
     def hint_edit_url(self, type_: int = 0):
@@ -231,6 +446,7 @@ class Level(PrettyPrinter):
 
     def store_hints(self, gci: GameCustomInfo, type_: int = 0) -> None:
         driver = gci.driver
+        pacer = Pacer.for_domain(gci.domain)
         if gci.keep_existing_hint_type(type_):
             hint_urls = []
         else:
@@ -244,101 +460,250 @@ class Level(PrettyPrinter):
         if hints is None:
             return None
 
-        for hint, hint_url in itertools.zip_longest(hints, hint_urls):
+        for i, (hint, hint_url) in enumerate(itertools.zip_longest(hints, hint_urls)):
             if hint_url is None:
                 hint_url = self.hint_edit_url(type_)
             elif hint is None:
                 continue
+            if gci.is_done(self.level_id, "hint", type_, i):
+                continue
 
+            pacer.acquire()
             try:
-                hint.to_html(driver, hint_url)
+                with pacer.track():
+                    hint.to_html(driver, hint_url)
             except selenium.common.exceptions.JavascriptException:
                 gci.login()
                 gci.navigate_to_level(self.level_id)
                 hint.to_html(driver, hint_url)
-
-            time.sleep(2)
+            gci.record(self.level_id, "hint", type_, i)
         return None
 
     @property
     def has_sectors(self) -> bool:
         return self.answers and not(len(self.answers) == 1 and self.answers[0].name is None)
 
-    def store_answers(self, gci: GameCustomInfo) -> None:
-        driver = gci.driver
+    @staticmethod
+    def answer_links(driver: webdriver.Chrome, after_save: bool = False) -> AnswerLinks:
+        """The links of the answers block, once the browser is back from an add form with `after_save`"""
+        def ready(d: webdriver.Chrome) -> typing.Optional[AnswerLinks]:
+            res = AnswerLinks.from_driver(d)
+            return None if after_save and "addanswers" in (res.url or "") else res
+
+        links = wait_until(driver, ready, "the answers to be saved") if after_save else AnswerLinks.from_driver(driver)
+        if links.found:
+            return links
+        # The answers block is collapsed until shown, also again after some saves
         driver.find_element_by_id(Answer.SHOW_ANSWERS_ID).click()
 
-        has_no_sectors = bool(not self.has_sectors and self.answers)
-        initial_and_other_func = {
-            True: (
-                """$("a[title='Add answers']").click()""",
-                """$("a[title='Add answers']").click()""",
-            ),
-            False: (
-                """$("a[title='Add sector']").click()""",
-                """$("a[title='Add answers']")[{j}].click()""",
-            ),
-        }[has_no_sectors]
-        # TODO: fix this when many sectors with more than 10 codes. Currently fails after 1st sector completes
-        for i, answer in self.ordered_answers:
-            funcs = itertools.chain(
-                [(initial_and_other_func[0], True)],
-                itertools.repeat((initial_and_other_func[1], False)),
-            )
-            for part, (func, is_first_time) in zip(answer.parts(), funcs):
-                func_formatted = func.format(j=i+1)
+        def opened(d: webdriver.Chrome) -> typing.Optional[AnswerLinks]:
+            res = AnswerLinks.from_driver(d)
+            return res if res.found else None
+        return wait_until(driver, opened, "the answers block to open")
+
+    def store_answers(
+            self,
+            gci: GameCustomInfo,
+            answers: typing.List[typing.Tuple[int, Answer]] = None,
+    ) -> None:
+        """
+        Every part of up to `MAX_ANSWERS_PER_SECTOR` codes is one page load of its add form and one script.
+        The first part of a sector creates it, the rest go to the add form of the sector that appeared,
+        or, when resuming, of the last one with the sector's name.
+        """
+        driver = gci.driver
+        if answers is None:
+            answers = self.ordered_answers
+        if not answers:
+            return None
+        pacer = Pacer.for_domain(gci.domain)
+        has_sectors = self.has_sectors
+        links = self.answer_links(driver)
+
+        for i, answer in answers:
+            sector_url = links.add_sector if has_sectors else links.add_answers
+            for j, part in enumerate(answer.parts()):
+                if gci.is_done(self.level_id, "answer", i, j):
+                    continue
+                if has_sectors and j > 0 and sector_url == links.add_sector:
+                    sector_url = links.sector_by_name(answer.name)
+                if sector_url is None:
+                    raise ValueError(f"Level {self.level_id}: no form to add the codes of {answer.name!r} to")
+                is_first_time = j == 0
+
+                pacer.acquire()
+                before = links
                 try:
-                    driver.execute_script(func_formatted)
-                    part.to_html(
-                        driver,
-                        has_sectors=not has_no_sectors,
-                        is_first_time=is_first_time,
-                    )
-                    wait_url_contains(driver, "addanswers", contains=False)
+                    with pacer.track():
+                        part.to_html(driver, has_sectors, is_first_time, sector_url)
+                        links = self.answer_links(driver, after_save=True)
                 except selenium.common.exceptions.JavascriptException:
                     gci.login()
-                    gci.navigate_to_level(self.level_id)
-                    driver.find_element_by_id(Answer.SHOW_ANSWERS_ID).click()
-                    driver.execute_script(func_formatted)
-                    part.to_html(
-                        driver,
-                        has_sectors=not has_no_sectors,
-                        is_first_time=is_first_time,
-                    )
+                    part.to_html(driver, has_sectors, is_first_time, sector_url)
+                    links = self.answer_links(driver, after_save=True)
+                gci.record(self.level_id, "answer", i, j)
+
+                if has_sectors and is_first_time:
+                    sector_url = links.new_sector(before) or links.sector_by_name(answer.name)
         return None
 
+    @traced("level")
     def to_html(self, gci: GameCustomInfo) -> None:
         driver = gci.driver
-        gci.navigate_to_level(self.level_id)
-        if self.name is not None:
-            self.name.to_html(driver, self.game_id, self.level_id)
-        if self.autopass is not None:
+        pacer = Pacer.for_domain(gci.domain)
+        pacer.acquire()
+        with pacer.track():
+            gci.navigate_to_level(self.level_id)
+            wait_ajax_idle(driver)
+        if self.name is not None and not gci.is_done(self.level_id, "name"):
+            with pacer.track():
+                self.name.to_html(driver, self.game_id, self.level_id)
+            gci.record(self.level_id, "name")
+        if self.autopass is not None and not gci.is_done(self.level_id, "autopass"):
             self.autopass.to_html(driver)
-        if self.answer_block is not None:
+            gci.record(self.level_id, "autopass")
+        if self.answer_block is not None and not gci.is_done(self.level_id, "answer_block"):
             self.answer_block.to_html(driver)
-        time.sleep(2)
+            gci.record(self.level_id, "answer_block")
+        pacer.acquire()
         if self.tasks is not None:
-            for task in self.tasks:
-                task.to_html(driver)
-                time.sleep(2)
+            for i, task in enumerate(self.tasks):
+                if gci.is_done(self.level_id, "task", i):
+                    continue
+                with pacer.track():
+                    task.to_html(driver)
+                gci.record(self.level_id, "task", i)
+                pacer.acquire()
         for type_ in range(3):
             self.store_hints(gci, type_)
-            time.sleep(2)
 
         if self.answers is not None:
+            pacer.acquire()
             self.store_answers(gci)
-        if self.has_sectors and len(self.answers) != 1 and self.sectors_to_cover is not None:
-            time.sleep(2)
+        if (
+            self.has_sectors and len(self.answers) != 1 and self.sectors_to_cover is not None
+            and not gci.is_done(self.level_id, "sectors_to_cover")
+        ):
+            pacer.acquire()
             self.sectors_to_cover.to_html(driver)
+            gci.record(self.level_id, "sectors_to_cover")
         return None
 
+    def read_target(self, gci: GameCustomInfo) -> Level:
+        """Current state of this level in the target game, read over HTTP with the browser's cookies"""
+        session = HttpSession.from_driver(gci.driver, gci.domain, gci.game_id)
+        entities = {
+            LevelName: self.name,
+            Autopass: self.autopass,
+            AnswerBlock: self.answer_block,
+            SectorsToCover: self.sectors_to_cover,
+            Task: self.tasks,
+            Hint: self.hints,
+            PenalizedHint: self.penalized_hints,
+            Bonus: self.bonuses,
+        }
+        skip_entities = {cls for cls, val in entities.items() if val is None}
+        try:
+            target = Level.from_http(session, self.level_id, skip_entities=skip_entities)
+        finally:
+            session.close()
+        return target
+
+    def diff(self, target: Level) -> LevelDiff:
+        return LevelDiff.between(self, target)
+
+    def update_hints(self, gci: GameCustomInfo, diff: LevelDiff, type_: int = 0) -> None:
+        driver = gci.driver
+        pacer = Pacer.for_domain(gci.domain)
+        hint_diff = diff.hint_diff(type_)
+        if hint_diff.empty:
+            return None
+        hints = {
+            0: self.hints,
+            1: self.penalized_hints,
+            2: self.bonuses,
+        }[type_]
+        hint_urls = self.find_hint_urls(driver, type_)
+
+        for i in hint_diff.changed:
+            pacer.acquire()
+            with pacer.track():
+                hints[i].to_html(driver, hint_urls[i])
+        for i in hint_diff.added:
+            pacer.acquire()
+            with pacer.track():
+                hints[i].to_html(driver, self.hint_edit_url(type_))
+        if gci.keep_existing_hint_type(type_):
+            return None
+        # Deleting from the end keeps the positions of the remaining items intact
+        for i in reversed(hint_diff.removed):
+            pacer.acquire()
+            with pacer.track():
+                delete_in_popup(driver, hint_urls[i])
+        return None
+
+    @traced("level")
+    def to_html_incremental(self, gci: GameCustomInfo, target: Level = None) -> LevelDiff:
+        """
+        Writes only what differs from the level as it currently is in the target game.
+        Answers of existing sectors are not edited in place: new sectors are appended, changed ones are reported.
+        """
+        if target is None:
+            target = self.read_target(gci)
+        diff = self.diff(target)
+        if diff.empty:
+            logger.info("Level %s is up to date", self.level_id)
+            return diff
+
+        driver = gci.driver
+        pacer = Pacer.for_domain(gci.domain)
+        pacer.acquire()
+        with pacer.track():
+            gci.navigate_to_level(self.level_id)
+            wait_ajax_idle(driver)
+        if diff.name:
+            with pacer.track():
+                self.name.to_html(driver, self.game_id, self.level_id)
+        if diff.autopass:
+            self.autopass.to_html(driver)
+        if diff.answer_block:
+            self.answer_block.to_html(driver)
+        if diff.tasks:
+            for task in self.tasks:
+                pacer.acquire()
+                with pacer.track():
+                    task.to_html(driver)
+        for type_ in range(3):
+            self.update_hints(gci, diff, type_)
+
+        if diff.answers.changed:
+            logger.warning(
+                "Level %s: sectors %s differ from the target and have to be fixed by hand",
+                self.level_id, [i + 1 for i in diff.answers.changed],
+            )
+        if diff.answers.added:
+            pacer.acquire()
+            self.store_answers(gci, [
+                (i, replace(self.answers[i], order_id=i))
+                for i in diff.answers.added
+            ])
+        if diff.sectors_to_cover and self.has_sectors and len(self.answers) != 1:
+            pacer.acquire()
+            self.sectors_to_cover.to_html(driver)
+        return diff
+
     def to_file(self, path: str) -> None:
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+        save_archive(path, {"kind": "level"}, [self], "level_id")
         return None
 
     @classmethod
     def from_file(cls, path: str) -> Level:
-        with open(path, "rb") as f:
-            orig_game: Level = pickle.load(f)
+        if not is_archive(path):
+            orig_game: Level = load_legacy(path)
+            return orig_game
+
+        header, items = open_archive(path, "level_id")
+        if header.get("kind") != "level":
+            raise ArchiveError(f"{path} holds a {header.get('kind')}, not a level")
+        orig_game = items[0]
         return orig_game
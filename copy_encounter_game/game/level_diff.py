@@ -0,0 +1,96 @@
+"""
+Entity-by-entity difference between a source level and the live target level
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import typing
+
+from copy_encounter_game.helpers import PrettyPrinter
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.game.level import Level
+
+__all__ = [
+    "ListDiff",
+    "LevelDiff",
+]
+
+
+@dataclass(repr=False)
+class ListDiff(PrettyPrinter):
+    changed: typing.List[int] = field(default_factory=list)
+    added: typing.List[int] = field(default_factory=list)
+    removed: typing.List[int] = field(default_factory=list)
+
+    @classmethod
+    def of(
+            cls,
+            source: typing.Optional[typing.List[typing.Any]],
+            target: typing.Optional[typing.List[typing.Any]],
+            key: typing.Callable[[typing.Any], typing.Any] = None,
+    ) -> ListDiff:
+        """Positional diff; a `None` source means the entity was skipped and is left alone"""
+        if source is None:
+            return cls()
+        target = target or []
+        key = key or (lambda x: x)
+        changed = [
+            i
+            for i, (src, tgt) in enumerate(zip(source, target))
+            if key(src) != key(tgt)
+        ]
+        added = list(range(len(target), len(source)))
+        removed = list(range(len(source), len(target)))
+        inst = cls(changed, added, removed)
+        return inst
+
+    @property
+    def empty(self) -> bool:
+        return not (self.changed or self.added or self.removed)
+
+
+@dataclass(repr=False)
+class LevelDiff(PrettyPrinter):
+    name: bool = False
+    autopass: bool = False
+    answer_block: bool = False
+    sectors_to_cover: bool = False
+    tasks: bool = False
+    hints: ListDiff = field(default_factory=ListDiff)
+    penalized_hints: ListDiff = field(default_factory=ListDiff)
+    bonuses: ListDiff = field(default_factory=ListDiff)
+    answers: ListDiff = field(default_factory=ListDiff)
+
+    @staticmethod
+    def _differs(source: typing.Any, target: typing.Any) -> bool:
+        return source is not None and source != target
+
+    @classmethod
+    def between(cls, source: Level, target: Level) -> LevelDiff:
+        inst = cls(
+            cls._differs(source.name, target.name),
+            cls._differs(source.autopass, target.autopass),
+            cls._differs(source.answer_block, target.answer_block),
+            cls._differs(source.sectors_to_cover, target.sectors_to_cover),
+            cls._differs(source.tasks, target.tasks),
+            ListDiff.of(source.hints, target.hints),
+            ListDiff.of(source.penalized_hints, target.penalized_hints),
+            ListDiff.of(source.bonuses, target.bonuses),
+            ListDiff.of(source.answers, target.answers, key=lambda ans: (ans.name, ans.options)),
+        )
+        return inst
+
+    def hint_diff(self, type_: int = 0) -> ListDiff:
+        return {
+            0: self.hints,
+            1: self.penalized_hints,
+            2: self.bonuses,
+        }[type_]
+
+    @property
+    def empty(self) -> bool:
+        singles = (self.name, self.autopass, self.answer_block, self.sectors_to_cover, self.tasks)
+        lists = (self.hints, self.penalized_hints, self.bonuses, self.answers)
+        return not any(singles) and all(el.empty for el in lists)
@@ -10,7 +10,14 @@ import re
 
 from selenium import webdriver
 
-from copy_encounter_game.helpers import ScriptedPart, wait, PrettyPrinter
+from copy_encounter_game.helpers import ScriptedPart, PrettyPrinter, wait_field
+from copy_encounter_game.html_page import script_url
+from copy_encounter_game.fields import FieldMap, FormState, read_fields, read_page_fields, write_fields
+from copy_encounter_game.tracing import traced
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
+    from copy_encounter_game.http_session import HttpSession
 
 __all__ = [
     "LevelName",
@@ -27,6 +34,7 @@ class LevelName(PrettyPrinter):
     SCRIPT_SECTION = "GameEditor('./NameCommentEdit.aspx?gid={game_id}&level={level_id}', '');"
 
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -43,6 +51,23 @@ class LevelName(PrettyPrinter):
             inst = cls(val)
         return inst
 
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            game_id: int,
+            level_id: int,
+    ) -> LevelName:
+        script = cls.SCRIPT_SECTION.format(
+            game_id=game_id,
+            level_id=level_id,
+        )
+        page = session.get(session.url(script_url(script)))
+        inst = cls(page.value("txtLevelName"))
+        return inst
+
+    @traced("entity", per_owner=True)
     def to_html(
             self,
             driver: webdriver.Chrome,
@@ -54,12 +79,17 @@ class LevelName(PrettyPrinter):
             level_id=level_id,
         )
         with ScriptedPart(driver, script):
-            driver.execute_script(f"""$('[name="txtLevelName"]').attr("value", "{self.name}")""")
-            btn = driver.find_element_by_xpath('//input[@title="Update"]')
-            btn.click()
+            write_fields(driver, self.form_state())
 
         return None
 
+    def form_state(self) -> FormState:
+        state = FormState(
+            values={"txtLevelName": self.name},
+            submit=['input[title="Update"]'],
+        )
+        return state
+
 
 @dataclass(repr=False)
 class Autopass(PrettyPrinter):
@@ -69,12 +99,19 @@ class Autopass(PrettyPrinter):
 
     STATUS_ID = "lnkAdjustAutopass"
     SETTINGS_ID = "AutoPassSettingsHolder"
+    FIELDS = FieldMap(
+        inputs=(
+            "txtApHours", "txtApMinutes", "txtApSeconds",
+            "txtApPenaltyHours", "txtApPenaltyMinutes", "txtApPenaltySeconds",
+        ),
+    )
 
     @property
     def penalty(self) -> bool:
         return any(self.penalty_time)
 
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -85,19 +122,36 @@ class Autopass(PrettyPrinter):
             return cls(enabled)
 
         elem.click()
-        wait(driver, "chkTimeoutPenalty")
-        autopass_form = driver.find_element_by_id(cls.SETTINGS_ID)
-        params = [
-            "txtApHours", "txtApMinutes", "txtApSeconds",
-            "txtApPenaltyHours", "txtApPenaltyMinutes", "txtApPenaltySeconds",
-        ]
-        vals = [
-            int(autopass_form.find_element_by_name(name).get_attribute("value"))
-            for name in params
-        ]
+        wait_field(driver, "chkTimeoutPenalty")
+        return cls.from_fields(enabled, read_fields(driver, cls.FIELDS))
+
+    @classmethod
+    def from_fields(cls, enabled: bool, values: typing.Dict[str, typing.Any]) -> Autopass:
+        vals = [int(values[name]) for name in cls.FIELDS.inputs]
         # noinspection PyTypeChecker
         return cls(enabled, tuple(vals[:3]), tuple(vals[3:]))
 
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            level_page: HtmlPage,
+            past_game: bool = False,
+    ) -> Autopass:
+        elem = level_page.by_id(cls.STATUS_ID)
+        if past_game:
+            return cls.from_status_text(elem.text.strip())
+
+        enabled = elem.text.strip() not in ("нет", "no")
+        if not enabled:
+            return cls(enabled)
+
+        page = level_page
+        if page.by_name(cls.FIELDS.inputs[0]) is None:
+            page = session.follow(level_page, elem.attrs.get("href"))
+        return cls.from_fields(enabled, read_page_fields(page, cls.FIELDS))
+
     @classmethod
     def from_past_html(
         cls,
@@ -105,6 +159,10 @@ class Autopass(PrettyPrinter):
     ) -> Autopass:
 
         elem = driver.find_element_by_id("lnkAdjustAutopass").text
+        return cls.from_status_text(elem)
+
+    @classmethod
+    def from_status_text(cls, elem: str) -> Autopass:
         pts = elem.split(",")
         ap = []
         for pt in pts:
@@ -124,27 +182,22 @@ class Autopass(PrettyPrinter):
         inst = cls(bool(sum(ap[0])), *ap)
         return inst
 
+    @traced("entity", per_owner=True)
     def to_html(self, driver: webdriver.Chrome) -> None:
         elem = driver.find_element_by_id(self.STATUS_ID)
         elem.click()
-        wait(driver, "chkTimeoutPenalty")
-
-        is_checked = bool(driver.find_element_by_id("chkTimeoutPenalty").get_attribute("checked"))
-        if self.penalty ^ is_checked:
-            driver.execute_script("""$('#chkTimeoutPenalty').click()""")
-            driver.execute_script("""$('#chkTimeoutPenalty').trigger('onclick')""")
-
-        params = [
-            "txtApHours", "txtApMinutes", "txtApSeconds",
-            "txtApPenaltyHours", "txtApPenaltyMinutes", "txtApPenaltySeconds",
-        ]
-
-        for name, value in zip(params, self.autopass_time + self.penalty_time):
-            driver.execute_script(f"""$('[name="{name}"]').attr("value", "{value}")""")
-
-        driver.execute_script(f"""$('#AutoPassSettingsHolder').find('input[title="Save"]').click()""")
+        wait_field(driver, "chkTimeoutPenalty")
+        write_fields(driver, self.form_state())
         return None
 
+    def form_state(self) -> FormState:
+        state = FormState(
+            checks={"chkTimeoutPenalty": self.penalty},
+            values=dict(zip(self.FIELDS.inputs, self.autopass_time + self.penalty_time)),
+            submit=[f'#{self.SETTINGS_ID} input[title="Save"]'],
+        )
+        return state
+
 
 @dataclass(repr=False)
 class AnswerBlock(PrettyPrinter):
@@ -155,8 +208,16 @@ class AnswerBlock(PrettyPrinter):
 
     STATUS_ID = "lnkAnswerBlockingStatus"
     SETTINGS_ID = "divAnswerBlockingSettings"
+    FIELDS = FieldMap(
+        inputs=(
+            "txtAttemptsNumber",
+            "txtAttemptsPeriodHours", "txtAttemptsPeriodMinutes", "txtAttemptsPeriodSeconds",
+        ),
+        checkboxes=("rbApplyForUser",),
+    )
 
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -168,40 +229,50 @@ class AnswerBlock(PrettyPrinter):
             return cls(enabled)
 
         elem.click()
-        form = driver.find_element_by_id(cls.SETTINGS_ID)
-        params = [
-            "txtAttemptsNumber",
-            "txtAttemptsPeriodHours", "txtAttemptsPeriodMinutes", "txtAttemptsPeriodSeconds"
-        ]
-        vals = [
-            int(form.find_element_by_name(name).get_attribute("value"))
-            for name in params
-        ]
-        for_user_elem = form.find_element_by_id("rbApplyForUser")
-        for_user = bool(for_user_elem.get_attribute("checked"))
+        wait_field(driver, "txtAttemptsNumber", "NAME")
+        return cls.from_fields(enabled, read_fields(driver, cls.FIELDS))
+
+    @classmethod
+    def from_fields(cls, enabled: bool, values: typing.Dict[str, typing.Any]) -> AnswerBlock:
+        vals = [int(values[name]) for name in cls.FIELDS.inputs]
+        for_user = values["rbApplyForUser"]
         # noinspection PyTypeChecker
         inst = cls(enabled, for_user, vals[0], tuple(vals[1:]))
-
         return inst
 
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            level_page: HtmlPage,
+    ) -> AnswerBlock:
+        elem = level_page.by_id(cls.STATUS_ID)
+        enabled = elem.text.strip() not in ("отключена", "disabled")
+        if not enabled:
+            return cls(enabled)
+
+        page = level_page
+        if page.by_name(cls.FIELDS.inputs[0]) is None:
+            page = session.follow(level_page, elem.attrs.get("href"))
+        return cls.from_fields(enabled, read_page_fields(page, cls.FIELDS))
+
+    @traced("entity", per_owner=True)
     def to_html(self, driver: webdriver.Chrome) -> None:
         elem = driver.find_element_by_id(self.STATUS_ID)
         elem.click()
-        params = [
-            "txtAttemptsNumber",
-            "txtAttemptsPeriodHours", "txtAttemptsPeriodMinutes", "txtAttemptsPeriodSeconds"
-        ]
-        for name, value in zip(params, [self.n_tries, *self.block_time]):
-            driver.execute_script(f"""$('[name="{name}"]').attr("value", "{value}")""")
-
-        if self.individual:
-            driver.execute_script("""$('#rbApplyForUser').click()""")
-        else:
-            driver.execute_script("""$('#rbApplyForTeam').click()""")
-
-        driver.execute_script(f"""$('#divAnswerBlockingSettings').find('input[title="Save"]').click()""")
+        wait_field(driver, "txtAttemptsNumber", "NAME")
+        write_fields(driver, self.form_state())
         return None
 
+    def form_state(self) -> FormState:
+        state = FormState(
+            clicks=["rbApplyForUser" if self.individual else "rbApplyForTeam"],
+            values=dict(zip(self.FIELDS.inputs, [self.n_tries, *self.block_time])),
+            submit=[f'#{self.SETTINGS_ID} input[title="Save"]'],
+        )
+        return state
+
 
 @dataclass(repr=False)
 class SectorsToCover(PrettyPrinter):
@@ -212,6 +283,7 @@ class SectorsToCover(PrettyPrinter):
     N_COMPLETE_ID = "txtRequiredSectorsCount"
 
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -224,6 +296,7 @@ class SectorsToCover(PrettyPrinter):
             return inst
 
         elem.click()
+        wait_field(driver, cls.COMPLETE_CUSTOM_ID)
         is_custom_btn = driver.find_element_by_id(cls.COMPLETE_CUSTOM_ID)
         is_custom = bool(is_custom_btn.get_attribute("checked"))
         if not is_custom:
@@ -233,16 +306,42 @@ class SectorsToCover(PrettyPrinter):
         inst = cls(n)
         return inst
 
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            level_page: HtmlPage,
+    ) -> SectorsToCover:
+        elem = level_page.by_id(cls.STATUS_ID)
+        if elem is None:
+            return cls()
+
+        page = level_page
+        if page.by_id(cls.COMPLETE_CUSTOM_ID) is None:
+            page = session.follow(level_page, elem.attrs.get("href"))
+        if not page.is_checked(cls.COMPLETE_CUSTOM_ID):
+            n = None
+        else:
+            n = int(page.by_id(cls.N_COMPLETE_ID).value)
+        inst = cls(n)
+        return inst
+
+    @traced("entity", per_owner=True)
     def to_html(self, driver: webdriver.Chrome) -> None:
         elem = driver.find_element_by_id(self.STATUS_ID)
         elem.click()
-        if self.n_sectors is not None:
-            driver.execute_script(f"""$('#{self.COMPLETE_CUSTOM_ID}').click()""")
-            driver.execute_script(f"""$('#{self.N_COMPLETE_ID}').attr("value", "{self.n_sectors}")""")
-
-        driver.execute_script(f"""$('#divSectorsSettins').find('input[title="Save"]').click()""")
+        wait_field(driver, self.COMPLETE_CUSTOM_ID)
+        write_fields(driver, self.form_state())
         return None
 
+    def form_state(self) -> FormState:
+        state = FormState(submit=['#divSectorsSettins input[title="Save"]'])
+        if self.n_sectors is not None:
+            state.clicks.append(self.COMPLETE_CUSTOM_ID)
+            state.values[self.N_COMPLETE_ID] = self.n_sectors
+        return state
+
 
 # Exists here for backwards compatibility
 GameName = LevelName
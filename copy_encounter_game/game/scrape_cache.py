@@ -0,0 +1,140 @@
+"""
+Per-source-game cache of scraped levels, validated by a fingerprint of the LevelEditor page
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, asdict
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+from copy_encounter_game.constants import SCRAPE_CACHE_MAX_AGE
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.game.level import Level
+
+__all__ = [
+    "ScrapeCacheEntry",
+    "ScrapeCache",
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScrapeCacheEntry:
+    level_id: int
+    fingerprint: str
+    skip_entities: typing.List[str]
+    past_game: bool
+    file_name: str
+    stored_at: float
+
+
+@dataclass
+class ScrapeCache:
+    """
+    `root` holds one archive per level and `manifest.json` with the fingerprint and the scrape
+    options each of them was made with. A level is reused only if all of those still match.
+    """
+    root: str
+    domain: str
+    game_id: int
+    entries: typing.Dict[int, ScrapeCacheEntry] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        os.makedirs(self.root, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            if raw.get("domain") == self.domain and raw.get("game_id") == self.game_id:
+                self.entries = {
+                    int(level_id): ScrapeCacheEntry(**entry)
+                    for level_id, entry in raw["levels"].items()
+                }
+        return None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    @staticmethod
+    def skip_names(skip_entities: typing.Iterable[type]) -> typing.List[str]:
+        return sorted(cls.__name__ for cls in skip_entities or ())
+
+    def save_manifest(self) -> None:
+        with self.lock:
+            raw = {
+                "domain": self.domain,
+                "game_id": self.game_id,
+                "levels": {str(level_id): asdict(entry) for level_id, entry in self.entries.items()},
+            }
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(raw, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+        return None
+
+    def get(
+            self,
+            level_id: int,
+            fingerprint: str,
+            skip_entities: typing.Iterable[type] = None,
+            past_game: bool = False,
+    ) -> typing.Optional[Level]:
+        from copy_encounter_game.game.level import Level
+
+        entry = self.entries.get(level_id)
+        if (
+            entry is None
+            or entry.fingerprint != fingerprint
+            or entry.skip_entities != self.skip_names(skip_entities)
+            or entry.past_game != past_game
+        ):
+            return None
+        path = os.path.join(self.root, entry.file_name)
+        if not os.path.exists(path):
+            return None
+        logger.info("Level %s is unchanged since %s, using the cached copy", level_id, time.ctime(entry.stored_at))
+        return Level.from_file(path)
+
+    def put(
+            self,
+            level: Level,
+            fingerprint: str,
+            skip_entities: typing.Iterable[type] = None,
+            past_game: bool = False,
+    ) -> None:
+        file_name = f"lvl{level.level_id}.cega"
+        level.to_file(os.path.join(self.root, file_name))
+        entry = ScrapeCacheEntry(
+            level.level_id, fingerprint, self.skip_names(skip_entities), past_game, file_name, time.time(),
+        )
+        with self.lock:
+            self.entries[level.level_id] = entry
+        self.save_manifest()
+        return None
+
+    def evict(self, n_levels: int = None, max_age: float = SCRAPE_CACHE_MAX_AGE) -> None:
+        """Drops levels that no longer exist in the source game and entries older than `max_age` seconds"""
+        now = time.time()
+        with self.lock:
+            stale = [
+                level_id
+                for level_id, entry in self.entries.items()
+                if (n_levels is not None and level_id > n_levels) or now - entry.stored_at > max_age
+            ]
+            for level_id in stale:
+                entry = self.entries.pop(level_id)
+                path = os.path.join(self.root, entry.file_name)
+                if os.path.exists(path):
+                    os.remove(path)
+        if stale:
+            logger.info("Evicted cached levels %s", stale)
+            self.save_manifest()
+        return None
@@ -5,10 +5,17 @@ Game Task
 from __future__ import annotations
 
 from dataclasses import dataclass
+import typing
 
 from selenium import webdriver
 
-from copy_encounter_game.helpers import ScriptedPart, DedicatedItem, PrettyPrinter
+from copy_encounter_game.helpers import ScriptedPart, DedicatedItem, PrettyPrinter, wait_field, click_if_present
+from copy_encounter_game.fields import FieldMap, FormState, read_fields, read_page_fields, write_fields
+from copy_encounter_game.tracing import traced
+
+if typing.TYPE_CHECKING:
+    from copy_encounter_game.html_page import HtmlPage
+    from copy_encounter_game.http_session import HttpSession
 
 __all__ = [
     "Task",
@@ -23,8 +30,14 @@ class Task(DedicatedItem, PrettyPrinter):
 
     TASK_ID_ELEMENT = "ctl02_ctl00_TasksRepeater_ctl00_lnkTaskEditor"
     TASK_ID_ADD = "ctl02_ctl00_lnkTaskAdd"
+    FIELDS = FieldMap(
+        checkboxes=("chkReplaceNlToBr",),
+        texts=('[name="inputTask"]',),
+        selects=(DedicatedItem.WHO_SELECTOR,),
+    )
 
     @classmethod
+    @traced("entity", per_owner=True)
     def from_html(
             cls,
             driver: webdriver.Chrome,
@@ -34,13 +47,39 @@ class Task(DedicatedItem, PrettyPrinter):
         with ScriptedPart(driver, task_script):
             edit_btn = driver.find_element_by_id("lnkEdit")
             edit_btn.click()
-            task_txt = driver.find_element_by_name("inputTask").text
-            replace_chckbox = bool(driver.find_element_by_name("chkReplaceNlToBr").get_attribute("checked"))
-            who = cls._get_for_who(driver)
+            wait_field(driver, "inputTask", "NAME")
+            inst = cls.from_fields(read_fields(driver, cls.FIELDS))
+        return inst
 
-            inst = cls(not replace_chckbox, task_txt, who)
+    @classmethod
+    def from_fields(cls, values: typing.Dict[str, typing.Any]) -> Task:
+        task_txt = values['[name="inputTask"]']
+        replace_chckbox = values["chkReplaceNlToBr"]
+        who = cls._who_from_fields(values)
+        inst = cls(not replace_chckbox, task_txt, who)
         return inst
 
+    @classmethod
+    @traced("entity", per_owner=True)
+    def from_http(
+            cls,
+            session: HttpSession,
+            level_page: HtmlPage,
+    ) -> typing.Optional[Task]:
+        task_id_elem = level_page.by_id(cls.TASK_ID_ELEMENT)
+        if task_id_elem is None:
+            return None
+        page = session.follow(level_page, task_id_elem.attrs.get("href"))
+        edit_btn = page.by_id("lnkEdit")
+        if edit_btn is not None:
+            page = session.follow(page, edit_btn.attrs.get("href"))
+        return cls.from_page(page)
+
+    @classmethod
+    def from_page(cls, page: HtmlPage) -> Task:
+        return cls.from_fields(read_page_fields(page, cls.FIELDS))
+
+    @traced("entity", per_owner=True)
     def to_html(self, driver: webdriver.Chrome) -> None:
         # noinspection PyBroadException
         try:
@@ -50,30 +89,17 @@ class Task(DedicatedItem, PrettyPrinter):
 
         script = btn.get_attribute("href")
         with ScriptedPart(driver, script):
-            # noinspection PyBroadException
-            try:
-                edit_btn = driver.find_element_by_id("lnkEdit")
-            except Exception:
-                pass
-            else:
-                edit_btn.click()
-
-            task_txt = driver.find_element_by_name("inputTask")
-            task_txt.clear()
-            body = self.body.replace("`", "\`").replace("$", "\$")      # noqa
-            driver.execute_script(f"""$('[name="inputTask"]').val(`{body}`)""")
-
-            is_replace_checked = bool(driver.find_element_by_name("chkReplaceNlToBr").get_attribute("checked"))
-            if is_replace_checked == self.html_raw:
-                driver.execute_script(f"""$('input[name="chkReplaceNlToBr"]').click()""")
-
-            self._set_for_who(driver, self.dedicated_to_who)
-            # noinspection PyBroadException
-            try:
-                btn = driver.find_element_by_id("btnUpdate")
-            except Exception:
-                btn = driver.find_element_by_id("btnAdd")
-
-            btn.click()
+            click_if_present(driver, "#lnkEdit")
+            wait_field(driver, "inputTask", "NAME")
+            write_fields(driver, self.form_state())
 
         return None
+
+    def form_state(self) -> FormState:
+        state = FormState(
+            checks={"chkReplaceNlToBr": not self.html_raw},
+            texts={"inputTask": self.body},
+            selects={self.WHO_SELECTOR: self.dedicated_to_who},
+            submit=["#btnUpdate", "#btnAdd"],
+        )
+        return state
@@ -1,21 +1,45 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, fields
+import typing
 
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, NoAlertPresentException
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.common.by import By
 
+from copy_encounter_game.constants import READY_TIMEOUT
+from copy_encounter_game.tracing import traced
+
 __all__ = [
     "ScriptedPart",
     "chunks",
     "DedicatedItem",
     "wait", "wait_url_contains",
+    "NotReadyError",
+    "wait_until", "wait_ajax_idle", "wait_window", "wait_field",
+    "click_if_present", "delete_in_popup",
     "PrettyPrinter",
 ]
 
+READY_SCRIPT = """
+    if (document.readyState !== 'complete') {
+        return false;
+    }
+    if (window.jQuery && window.jQuery.active > 0) {
+        return false;
+    }
+    if (window.Sys && Sys.WebForms && Sys.WebForms.PageRequestManager) {
+        var prm = Sys.WebForms.PageRequestManager.getInstance();
+        if (prm && prm.get_isInAsyncPostBack()) {
+            return false;
+        }
+    }
+    return true;
+"""
+
 
 @dataclass
 class ScriptedPart:
@@ -26,13 +50,17 @@ class ScriptedPart:
     wait_for_type: str = "ID"
     timeout: int = 2
 
+    @traced("popup")
     def __enter__(self):
         self.driver.execute_script(self.script)
-        self.driver.switch_to.window(self.driver.window_handles[1])
+        handles = wait_window(self.driver, 2)
+        self.driver.switch_to.window(handles[1])
+        wait_ajax_idle(self.driver)
         if self.wait_for_value:
             self.wait()
         return self
 
+    @traced("popup")
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.explicitely_close_window:
             self.driver.close()
@@ -40,7 +68,8 @@ class ScriptedPart:
         return None
 
     def wait(self) -> None:
-        return wait(self.driver, self.wait_for_value, self.wait_for_type, self.timeout)
+        wait_field(self.driver, self.wait_for_value, self.wait_for_type, self.timeout)
+        return None
 
 
 def chunks(lst, n):
@@ -50,6 +79,7 @@ def chunks(lst, n):
 
 
 class DedicatedItem:
+    WHO_SELECTOR = "select.input"
 
     @staticmethod
     def _get_for_who(driver: webdriver.Chrome) -> int:
@@ -82,7 +112,54 @@ class DedicatedItem:
         )
         return None
 
+    @classmethod
+    def _who_from_fields(cls, values: typing.Dict[str, typing.Any]) -> typing.Optional[int]:
+        who = values.get(cls.WHO_SELECTOR)
+        if who is None or who == "":
+            return None
+        return int(who)
+
 
+def click_if_present(driver: webdriver.Chrome, selector: str) -> bool:
+    clicked = driver.execute_script(
+        """
+        var e = document.querySelector(arguments[0]);
+        if (e) {
+            e.click();
+        }
+        return !!e;
+        """,
+        selector,
+    )
+    return clicked
+
+
+def delete_in_popup(
+    driver: webdriver.Chrome,
+    script: str,
+    selector: str = 'a[title="Delete"]',
+    timeout: float = READY_TIMEOUT,
+) -> bool:
+    """Opens an editor popup, clicks its delete link and confirms; returns False if there was nothing to delete"""
+    driver.execute_script(script)
+    handles = wait_window(driver, 2, timeout)
+    driver.switch_to.window(handles[1])
+    wait_ajax_idle(driver, timeout)
+    deleted = click_if_present(driver, selector)
+    if deleted:
+        try:
+            WebDriverWait(driver, timeout).until(ec.alert_is_present())
+            driver.switch_to.alert.accept()
+        except (TimeoutException, NoAlertPresentException):
+            pass
+        wait_until(driver, lambda d: len(d.window_handles) < 2 or d.execute_script(READY_SCRIPT), "deletion", timeout)
+    if len(driver.window_handles) > 1:
+        driver.close()
+    driver.switch_to.window(driver.window_handles[0])
+    return deleted
+
+
+@traced("wait")
 def wait(
     driver: webdriver.Chrome,
     value: str,
@@ -101,6 +178,7 @@ def wait(
     return None
 
 
+@traced("wait")
 def wait_url_contains(
     driver: webdriver.Chrome,
     value: str,
@@ -117,6 +195,59 @@ def wait_url_contains(
     return None
 
 
+class NotReadyError(TimeoutException):
+    pass
+
+
+@traced("wait")
+def wait_until(
+    driver: webdriver.Chrome,
+    condition: typing.Callable[[webdriver.Chrome], typing.Any],
+    description: str,
+    timeout: float = READY_TIMEOUT,
+) -> typing.Any:
+    """Returns the first truthy value of `condition`, raises NotReadyError if there was none in time"""
+    try:
+        return WebDriverWait(driver, timeout).until(condition)
+    except TimeoutException as e:
+        raise NotReadyError(f"Gave up waiting for {description} after {timeout} s at {driver.current_url}") from e
+
+
+def wait_ajax_idle(driver: webdriver.Chrome, timeout: float = READY_TIMEOUT) -> None:
+    """Document loaded, no jQuery requests in flight and no ASP.NET async postback running"""
+    wait_until(driver, lambda d: d.execute_script(READY_SCRIPT), "page to become idle", timeout)
+    return None
+
+
+def wait_window(
+    driver: webdriver.Chrome,
+    n_windows: int = 2,
+    timeout: float = READY_TIMEOUT,
+) -> typing.List[str]:
+    handles = wait_until(
+        driver,
+        lambda d: d.window_handles if len(d.window_handles) >= n_windows else False,
+        f"{n_windows} browser windows",
+        timeout,
+    )
+    return handles
+
+
+def wait_field(
+    driver: webdriver.Chrome,
+    value: str,
+    type_: str = "ID",
+    timeout: float = READY_TIMEOUT,
+) -> WebElement:
+    element = wait_until(
+        driver,
+        ec.presence_of_element_located((getattr(By, type_), value)),
+        f"element {type_}={value!r}",
+        timeout,
+    )
+    return element
+
+
 @dataclass
 class PrettyPrinter:
     def __str__(self):
@@ -0,0 +1,254 @@
+"""
+Minimal DOM built from raw Encounter admin pages
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+import typing
+import re
+
+__all__ = [
+    "HtmlElement",
+    "HtmlPage",
+    "script_url",
+    "postback_args",
+    "compile_selector",
+]
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+SCRIPT_URL_RE = re.compile(r"""\(\s*['"](\.{0,2}/?[^'"]+\.aspx[^'"]*)['"]""")
+SELECTOR_PART_RE = re.compile(
+    r"""(?P<tag>^[a-zA-Z][a-zA-Z0-9]*)"""
+    r"""|\.(?P<cls>[-\w]+)"""
+    r"""|#(?P<id>[-\w]+)"""
+    r"""|\[(?P<attr>[-\w]+)(?:(?P<op>[\^$*]?=)["']?(?P<val>[^"'\]]*)["']?)?\]"""
+)
+POSTBACK_RE = re.compile(r"""__doPostBack\(\s*['"]([^'"]*)['"]\s*,\s*['"]([^'"]*)['"]\s*\)""")
+
+
+@dataclass
+class HtmlElement:
+    tag: str
+    attrs: typing.Dict[str, str] = field(default_factory=dict)
+    children: typing.List[HtmlElement] = field(default_factory=list)
+    parent: typing.Optional[HtmlElement] = field(default=None, repr=False)
+    texts: typing.List[str] = field(default_factory=list, repr=False)
+
+    @property
+    def id(self) -> typing.Optional[str]:
+        return self.attrs.get("id")
+
+    @property
+    def name(self) -> typing.Optional[str]:
+        return self.attrs.get("name")
+
+    @property
+    def classes(self) -> typing.List[str]:
+        return self.attrs.get("class", "").split()
+
+    @property
+    def checked(self) -> bool:
+        return "checked" in self.attrs
+
+    @property
+    def selected(self) -> bool:
+        return "selected" in self.attrs
+
+    @property
+    def text(self) -> str:
+        parts = list(self.texts)
+        for child in self.children:
+            parts.append(child.text)
+        return "".join(parts)
+
+    @property
+    def value(self) -> typing.Optional[str]:
+        if self.tag == "textarea":
+            return self.text
+        if self.tag == "select":
+            opts = list(self.iter(tag="option"))
+            chosen = [opt for opt in opts if opt.selected] or opts[:1]
+            if not chosen:
+                return None
+            return chosen[0].attrs.get("value", chosen[0].text)
+        return self.attrs.get("value")
+
+    def iter(
+            self,
+            tag: str = None,
+            id_: str = None,
+            name: str = None,
+            class_: str = None,
+            predicate: typing.Callable[[HtmlElement], bool] = None,
+    ) -> typing.Generator[HtmlElement, None, None]:
+        for child in self.children:
+            if (
+                (tag is None or child.tag == tag)
+                and (id_ is None or child.id == id_)
+                and (name is None or child.name == name)
+                and (class_ is None or class_ in child.classes)
+                and (predicate is None or predicate(child))
+            ):
+                yield child
+            yield from child.iter(tag, id_, name, class_, predicate)
+
+    def find_all(self, *args, **kwargs) -> typing.List[HtmlElement]:
+        return list(self.iter(*args, **kwargs))
+
+    def find(self, *args, **kwargs) -> typing.Optional[HtmlElement]:
+        return next(self.iter(*args, **kwargs), None)
+
+    def select(self, selector: str) -> typing.List[HtmlElement]:
+        return self.find_all(predicate=compile_selector(selector))
+
+
+class _TreeBuilder(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = HtmlElement("#document")
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        attrs_dict = {k: (v if v is not None else "") for k, v in attrs}
+        elem = HtmlElement(tag, attrs_dict, parent=self.stack[-1])
+        self.stack[-1].children.append(elem)
+        if tag not in VOID_TAGS:
+            self.stack.append(elem)
+
+    def handle_startendtag(self, tag, attrs):
+        attrs_dict = {k: (v if v is not None else "") for k, v in attrs}
+        elem = HtmlElement(tag, attrs_dict, parent=self.stack[-1])
+        self.stack[-1].children.append(elem)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        cur = self.stack[-1]
+        if cur.children:
+            # Keep text order stable relative to children by attaching a text node
+            text_node = HtmlElement("#text", parent=cur, texts=[data])
+            cur.children.append(text_node)
+        else:
+            cur.texts.append(data)
+
+
+@dataclass
+class HtmlPage:
+    url: str
+    root: HtmlElement
+
+    @classmethod
+    def parse(cls, url: str, html: str) -> HtmlPage:
+        builder = _TreeBuilder()
+        builder.feed(html)
+        builder.close()
+        inst = cls(url, builder.root)
+        return inst
+
+    def by_id(self, id_: str) -> typing.Optional[HtmlElement]:
+        return self.root.find(id_=id_)
+
+    def by_name(self, name: str) -> typing.Optional[HtmlElement]:
+        return self.root.find(name=name)
+
+    def find(self, *args, **kwargs) -> typing.Optional[HtmlElement]:
+        return self.root.find(*args, **kwargs)
+
+    def find_all(self, *args, **kwargs) -> typing.List[HtmlElement]:
+        return self.root.find_all(*args, **kwargs)
+
+    def select(self, selector: str) -> typing.List[HtmlElement]:
+        return self.root.select(selector)
+
+    def value(self, name: str) -> typing.Optional[str]:
+        elem = self.by_name(name)
+        return None if elem is None else elem.value
+
+    def is_checked(self, id_or_name: str) -> bool:
+        elem = self.by_id(id_or_name) or self.by_name(id_or_name)
+        return elem is not None and elem.checked
+
+    def form_fields(self) -> typing.Dict[str, str]:
+        """Values that a browser would submit for the first form of the page"""
+        res = {}
+        for elem in self.root.iter(predicate=lambda e: e.tag in ("input", "textarea", "select")):
+            name = elem.name
+            if not name:
+                continue
+            type_ = elem.attrs.get("type", "text").lower()
+            if type_ in ("submit", "button", "image", "file"):
+                continue
+            if type_ in ("checkbox", "radio") and not elem.checked:
+                continue
+            res[name] = elem.value if elem.value is not None else "on"
+        return res
+
+    def form_action(self) -> str:
+        form = self.find(tag="form")
+        if form is None or not form.attrs.get("action"):
+            return self.url
+        return form.attrs["action"]
+
+
+def script_url(href: str) -> typing.Optional[str]:
+    """Extracts './Page.aspx?...' from a `javascript:GameEditor(...)`-like href"""
+    if not href:
+        return None
+    match = SCRIPT_URL_RE.search(href)
+    if match:
+        return match.group(1)
+    if href.lower().startswith("javascript:"):
+        return None
+    return href
+
+
+def postback_args(href: str) -> typing.Optional[typing.Tuple[str, str]]:
+    if not href:
+        return None
+    match = POSTBACK_RE.search(href)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def compile_selector(selector: str) -> typing.Callable[[HtmlElement], bool]:
+    """Supports compound selectors only: tag, .class, #id, [attr], [attr="v"], [attr^="v"], [attr$="v"], [attr*="v"]"""
+    checks = []
+    pos = 0
+    selector = selector.strip()
+    while pos < len(selector):
+        match = SELECTOR_PART_RE.match(selector, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Unsupported selector {selector!r}")
+        pos = match.end()
+        if match.group("tag"):
+            checks.append(lambda e, tag=match.group("tag").lower(): e.tag == tag)
+        elif match.group("cls"):
+            checks.append(lambda e, cls=match.group("cls"): cls in e.classes)
+        elif match.group("id"):
+            checks.append(lambda e, id_=match.group("id"): e.id == id_)
+        else:
+            attr, op, val = match.group("attr"), match.group("op"), match.group("val")
+            ops = {
+                None: lambda a, v: True,
+                "=": lambda a, v: a == v,
+                "^=": lambda a, v: a.startswith(v),
+                "$=": lambda a, v: a.endswith(v),
+                "*=": lambda a, v: v in a,
+            }
+            checks.append(
+                lambda e, attr=attr, cmp=ops[op], val=val: attr in e.attrs and cmp(e.attrs[attr], val)
+            )
+
+    def predicate(elem: HtmlElement) -> bool:
+        return not elem.tag.startswith("#") and all(check(elem) for check in checks)
+    return predicate
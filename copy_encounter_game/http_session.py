@@ -0,0 +1,206 @@
+"""
+Selenium-free authenticated session to Encounter admin pages
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import typing
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium import webdriver
+
+from copy_encounter_game.constants import ADMIN_URL, MANAGER_URL, HTTP_POOL_SIZE, HTTP_TIMEOUT
+from copy_encounter_game.helpers import PrettyPrinter
+from copy_encounter_game.html_page import HtmlPage, script_url, postback_args
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.tracing import traced
+from copy_encounter_game.multipart import MultipartStream
+from copy_encounter_game.session_store import SessionStore
+
+__all__ = [
+    "HttpSession",
+    "LoginError",
+]
+
+
+class LoginError(Exception):
+    pass
+
+
+@dataclass(repr=False)
+class HttpSession(PrettyPrinter):
+    domain: str
+    game_id: int
+    creds: typing.Dict[str, str]
+    pool_size: int = HTTP_POOL_SIZE
+    timeout: float = HTTP_TIMEOUT
+    session: requests.Session = field(default=None)
+    cookies: typing.Optional[typing.List[typing.Dict[str, typing.Any]]] = None
+    # With pool_block, at most pool_size connections per host are open, extra requests wait for one
+    pool_block: bool = False
+    # Where the cookies of a login are kept for the next session, None to always log in
+    session_store: typing.Optional[SessionStore] = field(default_factory=SessionStore.default)
+
+    def __post_init__(self):
+        if self.session is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_size, pool_maxsize=self.pool_size, pool_block=self.pool_block,
+            )
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        if self.cookies is not None:
+            self.set_cookies(self.cookies)
+        else:
+            self.login()
+        return None
+
+    def set_cookies(self, cookies: typing.List[typing.Dict[str, typing.Any]]) -> None:
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"], cookie["value"],
+                domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+            )
+        return None
+
+    def get_cookies(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """In the format of `webdriver.Chrome.get_cookies`"""
+        cookies = [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "secure": bool(c.secure)}
+            for c in self.session.cookies
+        ]
+        return cookies
+
+    @classmethod
+    def from_driver(
+            cls,
+            driver: webdriver.Chrome,
+            domain: str,
+            game_id: int,
+            **kwargs,
+    ) -> HttpSession:
+        """Reuses the authentication of an already logged-in browser, no extra login"""
+        inst = cls(domain, game_id, {}, cookies=driver.get_cookies(), **kwargs)
+        return inst
+
+    def url(self, path: str, base: str = None) -> str:
+        base = base or f"http://{self.domain}/Administration/Games/"
+        return urljoin(base, path)
+
+    @traced("http")
+    def request(self, method: str, url: str, count_slow: bool = True, **kwargs) -> requests.Response:
+        """Paced; `count_slow` as in `Pacer.track`"""
+        pacer = Pacer.for_domain(self.domain)
+        pacer.acquire()
+        with pacer.track(count_slow):
+            res = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            res.raise_for_status()
+        return res
+
+    def get(self, url: str) -> HtmlPage:
+        res = self.request("GET", url)
+        page = HtmlPage.parse(res.url, res.text)
+        return page
+
+    def post(self, url: str, data: typing.Dict[str, str]) -> HtmlPage:
+        res = self.request("POST", url, data=data)
+        page = HtmlPage.parse(res.url, res.text)
+        return page
+
+    def submit(self, page: HtmlPage, data: typing.Dict[str, str] = None) -> HtmlPage:
+        fields = page.form_fields()
+        fields.update(data or {})
+        url = urljoin(page.url, page.form_action())
+        return self.post(url, fields)
+
+    def submit_files(
+            self,
+            page: HtmlPage,
+            files: typing.Dict[str, str],
+            data: typing.Dict[str, str] = None,
+    ) -> HtmlPage:
+        """
+        Like `submit`, with `files` (input name -> local path) streamed from disk as multipart.
+        A big file takes long to send however healthy the server is, so only errors count for pacing.
+        """
+        fields = page.form_fields()
+        fields.update(data or {})
+        body = MultipartStream(fields, files)
+        try:
+            res = self.request(
+                "POST", urljoin(page.url, page.form_action()),
+                count_slow=False, data=body, headers={"Content-Type": body.content_type},
+            )
+        finally:
+            body.close()
+        return HtmlPage.parse(res.url, res.text)
+
+    def postback(self, page: HtmlPage, target: str, argument: str = "") -> HtmlPage:
+        return self.submit(page, {"__EVENTTARGET": target, "__EVENTARGUMENT": argument})
+
+    def follow(self, page: HtmlPage, href: str) -> HtmlPage:
+        """Does what a click on a link with the given href would do"""
+        pb = postback_args(href)
+        if pb is not None:
+            return self.postback(page, *pb)
+        url = script_url(href)
+        if url is None:
+            raise ValueError(f"Can't follow link {href!r}")
+        return self.get(urljoin(page.url, url))
+
+    def is_logged_in(self) -> bool:
+        """One request to the level manager, which sends a logged-out client to the login form"""
+        try:
+            page = self.get(MANAGER_URL.format(domain=self.domain, gid=self.game_id))
+        except requests.RequestException:
+            return False
+        return page.by_id("txtPassword") is None
+
+    def restore_session(self) -> bool:
+        """Takes the stored cookies of this domain and user if they are still logged in"""
+        store = self.session_store
+        cookies = None if store is None else store.load(self.domain, self.creds)
+        if cookies is None:
+            return False
+        self.set_cookies(cookies)
+        if self.is_logged_in():
+            return True
+        self.session.cookies.clear()
+        store.drop(self.domain, self.creds)
+        return False
+
+    def login(self) -> None:
+        if self.restore_session():
+            return None
+
+        page = self.get(ADMIN_URL.format(domain=self.domain))
+        login = page.by_id("txtLogin")
+        pwd = page.by_id("txtPassword")
+        if login is None or pwd is None:
+            raise LoginError(f"No login form at {page.url}")
+
+        data = {
+            login.name: self.creds["user"],
+            pwd.name: self.creds["password"],
+        }
+        submit = page.find(tag="input", predicate=lambda e: e.attrs.get("type") == "submit")
+        if submit is not None and submit.name:
+            data[submit.name] = submit.attrs.get("value", "")
+        res = self.submit(page, data)
+        if res.by_id("txtPassword") is not None:
+            raise LoginError(f"Could not log in to {self.domain} as {self.creds['user']!r}")
+        if self.session_store is not None:
+            self.session_store.save(self.domain, self.creds, self.get_cookies())
+        return None
+
+    def close(self) -> None:
+        self.session.close()
+        return None
+
+    def level_page(self, level_id: int) -> HtmlPage:
+        from copy_encounter_game.game.level import Level
+        url = Level.current_level_url(self.domain, self.game_id, level_id)
+        return self.get(url)
@@ -0,0 +1,89 @@
+"""
+On-disk journal of acknowledged writes, so that an interrupted upload can resume
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import os
+import threading
+import typing
+
+__all__ = [
+    "UploadJournal",
+]
+
+Key = typing.Tuple[typing.Union[str, int], ...]
+
+
+@dataclass
+class UploadJournal:
+    """
+    Append-only JSON lines file. Every line is one finished write to `domain`/`game_id`,
+    e.g. (level_id, "hint", type_, position) or (level_id, "answer", sector, part).
+    Lines of other targets sharing the file are kept and ignored.
+    """
+    path: str
+    domain: str
+    game_id: int
+    done: typing.Set[Key] = field(default_factory=set)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        if os.path.exists(self.path):
+            self.load()
+        return None
+
+    def load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            content = f.read()
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line may be cut short by a crash in the middle of a write
+                continue
+            if entry.get("domain") == self.domain and entry.get("game_id") == self.game_id:
+                self.done.add(tuple(entry["key"]))
+        if content and not content.endswith("\n"):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n")
+        return None
+
+    def is_done(self, *key: typing.Union[str, int]) -> bool:
+        with self.lock:
+            return tuple(key) in self.done
+
+    def record(self, *key: typing.Union[str, int]) -> None:
+        line = json.dumps({"domain": self.domain, "game_id": self.game_id, "key": list(key)})
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(tuple(key))
+        return None
+
+    def clear(self) -> None:
+        """Forgets this target; called once the whole upload succeeded"""
+        with self.lock:
+            self.done.clear()
+            if not os.path.exists(self.path):
+                return None
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            kept = []
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("domain") != self.domain or entry.get("game_id") != self.game_id:
+                    kept.append(line)
+            if kept:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.writelines(kept)
+            else:
+                os.remove(self.path)
+        return None
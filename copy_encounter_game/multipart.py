@@ -0,0 +1,93 @@
+"""
+multipart/form-data body that streams files from disk instead of loading them into memory
+"""
+
+from __future__ import annotations
+
+import os
+import typing
+import uuid
+
+from copy_encounter_game.constants import DOWNLOAD_CHUNK_SIZE
+
+__all__ = [
+    "MultipartStream",
+]
+
+
+class MultipartStream:
+    """
+    File-like body for `requests`: it has a length, so it is sent with a Content-Length
+    and read in chunks as the socket accepts them.
+    """
+
+    def __init__(
+            self,
+            fields: typing.Dict[str, str],
+            files: typing.Dict[str, str],
+            boundary: str = None,
+    ):
+        self.boundary = boundary or uuid.uuid4().hex
+        # Every part is either literal bytes or the path of a file to stream
+        self.parts: typing.List[typing.Union[bytes, str]] = []
+        for name, value in fields.items():
+            self.parts.append(self._part_header(name) + str(value).encode("utf-8") + b"\r\n")
+        for name, path in files.items():
+            self.parts.append(self._part_header(name, os.path.basename(path)))
+            self.parts.append(path)
+            self.parts.append(b"\r\n")
+        self.parts.append(f"--{self.boundary}--\r\n".encode("ascii"))
+        self.length = sum(
+            len(part) if isinstance(part, bytes) else os.path.getsize(part)
+            for part in self.parts
+        )
+        self._pos = 0
+        self._current: typing.Optional[typing.BinaryIO] = None
+
+    def _part_header(self, name: str, filename: str = None) -> bytes:
+        disposition = f'form-data; name="{self._quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{self._quote(filename)}"'
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if filename is not None:
+            header += "Content-Type: application/octet-stream\r\n"
+        return (header + "\r\n").encode("utf-8")
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\r", "").replace("\n", "")
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length
+        size = min(size, DOWNLOAD_CHUNK_SIZE) if size > 0 else DOWNLOAD_CHUNK_SIZE
+        while self._pos < len(self.parts):
+            part = self.parts[self._pos]
+            if isinstance(part, bytes):
+                self._pos += 1
+                if part:
+                    # Literal parts are small and are returned whole
+                    return part
+                continue
+            if self._current is None:
+                self._current = open(part, "rb")
+            chunk = self._current.read(size)
+            if chunk:
+                return chunk
+            self._current.close()
+            self._current = None
+            self._pos += 1
+        return b""
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        return None
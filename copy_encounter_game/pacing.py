@@ -0,0 +1,132 @@
+"""
+Server-aware pacing of requests to an Encounter domain
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+import typing
+
+import requests
+from selenium.common.exceptions import TimeoutException
+
+from copy_encounter_game.constants import (
+    PACING_RATE, PACING_BURST, PACING_SLOW_RESPONSE, PACING_MIN_BACKOFF, PACING_MAX_BACKOFF,
+)
+from copy_encounter_game.helpers import NotReadyError
+from copy_encounter_game.tracing import tracer
+
+__all__ = [
+    "Pacer",
+    "is_strain",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def is_strain(error: BaseException) -> bool:
+    """Transport failures, timeouts and server errors; a missing element or a script error is not the server's"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    if isinstance(error, NotReadyError):
+        # The element or state waited for never showed up, usually a selector that does not match
+        return False
+    return isinstance(error, (requests.RequestException, TimeoutException))
+
+
+@dataclass
+class Pacer:
+    """
+    Token bucket shared by everything talking to one domain.
+    While the server answers fast and without errors, only the bucket rate applies.
+    Errors that `is_strain` and slow responses double an extra backoff delay, healthy responses halve it.
+    """
+    domain: str
+    rate: float = PACING_RATE
+    burst: float = PACING_BURST
+    slow_response: float = PACING_SLOW_RESPONSE
+    min_backoff: float = PACING_MIN_BACKOFF
+    max_backoff: float = PACING_MAX_BACKOFF
+    backoff: float = 0.
+    throttled: float = 0.
+    n_slow: int = 0
+    n_errors: int = 0
+    tokens: float = field(default=None)
+    last_refill: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    _registry: typing.ClassVar[typing.Dict[str, Pacer]] = {}
+    _registry_lock: typing.ClassVar[threading.Lock] = threading.Lock()
+
+    def __post_init__(self):
+        if self.tokens is None:
+            self.tokens = self.burst
+        return None
+
+    @classmethod
+    def for_domain(cls, domain: str) -> Pacer:
+        with cls._registry_lock:
+            if domain not in cls._registry:
+                cls._registry[domain] = cls(domain)
+            return cls._registry[domain]
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            delay = self.backoff
+            if self.tokens < 1:
+                delay += (1 - self.tokens) / self.rate
+            self.tokens -= 1
+
+        if delay > 0:
+            logger.debug("Throttling %s for %.2f s", self.domain, delay)
+            with tracer.span("Pacer.throttle", "sleep"):
+                time.sleep(delay)
+            with self.lock:
+                self.throttled += delay
+        return None
+
+    def report(self, elapsed: float, error: bool = False) -> None:
+        with self.lock:
+            if error or elapsed > self.slow_response:
+                if error:
+                    self.n_errors += 1
+                else:
+                    self.n_slow += 1
+                self.backoff = min(self.max_backoff, max(self.min_backoff, self.backoff * 2))
+                logger.info(
+                    "%s looks strained (%s, %.2f s), backing off to %.2f s",
+                    self.domain, "error" if error else "slow response", elapsed, self.backoff,
+                )
+            else:
+                self.backoff /= 2
+                if self.backoff < self.min_backoff:
+                    self.backoff = 0.
+        return None
+
+    @contextmanager
+    def track(self, count_slow: bool = True) -> typing.Generator[None, None, None]:
+        """Reports the block as a response; without `count_slow`, as one whose duration says nothing (a transfer)"""
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_strain(e):
+                self.report(time.monotonic() - start, error=True)
+            raise
+        if count_slow:
+            self.report(time.monotonic() - start)
+        return None
+
+    def log_summary(self) -> None:
+        logger.info(
+            "Spent %.1f s throttling requests to %s (%d slow responses, %d errors)",
+            self.throttled, self.domain, self.n_slow, self.n_errors,
+        )
+        return None
@@ -5,13 +5,119 @@ Generates penalty bonuses from a list of answers
 import typing
 import random
 import hashlib
+import logging
 
-from copy_encounter_game.game.bonus import Bonus
+from copy_encounter_game.game.bonus import Bonus, MAX_ANSWERS_PER_BONUS
 
 __all__ = [
     "penalty_bonuses",
+    "iter_penalty_bonuses",
+    "right_answer_code",
 ]
 
+logger = logging.getLogger(__name__)
+
+AnswerEntry = typing.Union[typing.List[str], str]
+
+# Entries `iter_penalty_bonuses` holds at once to shuffle them
+SHUFFLE_BUFFER = 10000
+
+
+def right_answer_code(
+        right_answers: typing.Set[str],
+        all_answers: typing.Iterable[AnswerEntry],
+        seed: int,
+) -> str:
+    """md5 of `f"{sorted(right_answers)}{all_answers}{seed}"` for a list of answers, fed one answer at a time"""
+    md5 = hashlib.md5(f"{sorted(right_answers)}[".encode())
+    for i, ans in enumerate(all_answers):
+        md5.update(f"{', ' if i else ''}{ans!r}".encode())
+    md5.update(f"]{seed}".encode())
+    return md5.hexdigest()[:10]
+
+
+def _texts(code: str, penalty: typing.Optional[str]) -> typing.Tuple[str, str]:
+    """(hint text of right answers, hint text of wrong ones)"""
+    wrong_ans_txt = "Неверно"
+    if penalty:
+        wrong_ans_txt = f"{wrong_ans_txt}. Будет начислен штраф {penalty}"
+    right_ans_txt = f"Верно! Введите в поле ввода {code!r} (без кавычек)"
+    return right_ans_txt, wrong_ans_txt
+
+
+def _iter_bonuses(
+        entries: typing.Iterable[AnswerEntry],
+        right_answers: typing.Set[str],
+        levels: typing.List[int],
+        texts: typing.Tuple[str, str],
+        pack: bool,
+        max_answers_per_bonus: int,
+) -> typing.Generator[Bonus, None, None]:
+    right_ans_txt, wrong_ans_txt = texts
+    n_entries = n_bonuses = 0
+    # hint text -> answers of the packed bonus that still has room
+    open_packs: typing.Dict[str, typing.List[str]] = {}
+
+    def make(answers: typing.List[str], txt: str) -> Bonus:
+        nonlocal n_bonuses
+        n_bonuses += 1
+        return Bonus(
+            f"Штрафной бонус {n_bonuses}",
+            answers=answers,
+            levels_available=levels,
+            bonus_time=(0, 0, 1),
+            hint_text=txt
+        )
+
+    for ans in entries:
+        n_entries += 1
+        if not isinstance(ans, list):
+            ans = [ans]
+
+        if all(el in right_answers for el in ans):
+            txt = right_ans_txt
+        else:
+            txt = wrong_ans_txt
+        if not pack or txt == right_ans_txt:
+            yield make(ans, txt)
+            continue
+        for el in ans:
+            packed = open_packs.setdefault(txt, [])
+            if el not in packed:
+                packed.append(el)
+            if len(packed) >= max_answers_per_bonus:
+                yield make(open_packs.pop(txt), txt)
+    for txt, packed in open_packs.items():
+        if packed:
+            yield make(packed, txt)
+
+    if pack:
+        # Every bonus is one popup round trip of its own when uploaded
+        logger.info(
+            "Packing leaves %s penalty bonuses to upload instead of %s (%.0f%% fewer)",
+            n_bonuses, n_entries, 100. * (1 - n_bonuses / max(1, n_entries)),
+        )
+    return None
+
+
+def _shuffled(
+        entries: typing.Iterable[AnswerEntry],
+        rng: random.Random,
+        buffer_size: int,
+) -> typing.Generator[AnswerEntry, None, None]:
+    """Random order within a window of `buffer_size` entries; a full shuffle when there are no more of them"""
+    buffer = []
+    for entry in entries:
+        if len(buffer) < buffer_size:
+            buffer.append(entry)
+            continue
+        i = rng.randrange(buffer_size)
+        yield buffer[i]
+        buffer[i] = entry
+    rng.shuffle(buffer)
+    yield from buffer
+    return None
+
 
 def penalty_bonuses(
         right_answers: typing.Set[str],
@@ -26,38 +132,65 @@ def penalty_bonuses(
         penalty: str = None,
         seed: int = 41,
         shuffle_answers: bool = False,
+        pack: bool = False,
+        max_answers_per_bonus: int = MAX_ANSWERS_PER_BONUS,
 ) -> typing.Tuple[
         typing.List[Bonus],
         str
 ]:
+    """
+    One bonus per entry of `all_answers`, with the hint text telling whether all of its answers are right.
+    With `pack`, the wrong answers are merged into bonuses of up to `max_answers_per_bonus` answers instead,
+    each placed where it filled up; bonuses of right answers stay one per entry.
+    """
     if not isinstance(levels, list):
         levels = [levels]
-    to_hash = f"{sorted(right_answers)}{all_answers}{seed}"
-    new_right_ans = hashlib.md5(to_hash.encode()).hexdigest()[:10]
-    wrong_ans_txt = "Неверно"
-    if penalty:
-        wrong_ans_txt = f"{wrong_ans_txt}. Будет начислен штраф {penalty}"
-    right_ans_txt = f"Верно! Введите в поле ввода {new_right_ans!r} (без кавычек)"
+    new_right_ans = right_answer_code(right_answers, all_answers, seed)
 
     if shuffle_answers:
         random.seed(seed)
         random.shuffle(all_answers)
 
-    all_bonuses = []
-    for i, ans in enumerate(all_answers):
-        if not isinstance(ans, list):
-            ans = [ans]
-
-        if all(el in right_answers for el in ans):
-            txt = right_ans_txt
-        else:
-            txt = wrong_ans_txt
-        b = Bonus(
-            f"Штрафной бонус {i + 1}",
-            answers=ans,
-            levels_available=levels,
-            bonus_time=(0, 0, 1),
-            hint_text=txt
-        )
-        all_bonuses.append(b)
+    all_bonuses = list(_iter_bonuses(
+        all_answers, right_answers, levels, _texts(new_right_ans, penalty), pack, max_answers_per_bonus,
+    ))
     return all_bonuses, new_right_ans
+
+
+def iter_penalty_bonuses(
+        right_answers: typing.Set[str],
+        all_answers: typing.Iterable[AnswerEntry],
+        levels: typing.Union[
+            typing.List[int],
+            int
+        ],
+        penalty: str = None,
+        seed: int = 41,
+        shuffle_answers: bool = False,
+        pack: bool = False,
+        max_answers_per_bonus: int = MAX_ANSWERS_PER_BONUS,
+        shuffle_buffer: int = SHUFFLE_BUFFER,
+) -> typing.Tuple[
+        typing.Iterator[Bonus],
+        str
+]:
+    """
+    `penalty_bonuses` in bounded memory: the bonuses are made as they are taken from the iterator.
+    The code in the right answers' hint covers the whole pool, so `all_answers` is read twice,
+    once for the code right away and once for the bonuses: pass a sequence or an object whose
+    `__iter__` starts over (e.g. opens the dictionary file again), not a one-shot iterator.
+    Shuffling uses its own `random.Random(seed)` and holds `shuffle_buffer` entries at a time.
+    """
+    if iter(all_answers) is all_answers:
+        raise TypeError("all_answers is read twice, pass a sequence or a re-iterable object, not an iterator")
+    if not isinstance(levels, list):
+        levels = [levels]
+    new_right_ans = right_answer_code(right_answers, all_answers, seed)
+
+    entries = all_answers
+    if shuffle_answers:
+        entries = _shuffled(all_answers, random.Random(seed), shuffle_buffer)
+    bonuses = _iter_bonuses(
+        entries, right_answers, levels, _texts(new_right_ans, penalty), pack, max_answers_per_bonus,
+    )
+    return bonuses, new_right_ans
@@ -0,0 +1,119 @@
+"""
+Encrypted on-disk cache of login cookies, so that runs and workers reuse one session per domain and user
+"""
+
+from __future__ import annotations
+
+import base64
+from dataclasses import dataclass, field
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import typing
+
+from copy_encounter_game.constants import SESSION_STORE_DIR, SESSION_MAX_AGE, SESSION_KDF_ITERATIONS
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:
+    Fernet = None
+
+__all__ = [
+    "SessionStore",
+]
+
+logger = logging.getLogger(__name__)
+
+Cookies = typing.List[typing.Dict[str, typing.Any]]
+
+
+@functools.lru_cache(maxsize=32)
+def _fernet(password: str, salt: bytes) -> Fernet:
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=SESSION_KDF_ITERATIONS)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(password.encode("utf-8"))))
+
+
+@dataclass
+class SessionStore:
+    """
+    One file per (domain, user) in `root`, encrypted with a key derived from the user's password,
+    so the cookies are only readable with the same credentials. Entries older than `SESSION_MAX_AGE`
+    are ignored. Without the optional `cryptography` package nothing is stored and every run logs in.
+    """
+    root: str = SESSION_STORE_DIR
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    _default: typing.ClassVar[typing.Optional[SessionStore]] = None
+    _default_set: typing.ClassVar[bool] = False
+
+    @classmethod
+    def default(cls) -> typing.Optional[SessionStore]:
+        """The store of sessions that are not given one: in `SESSION_STORE_DIR` unless `set_default` was called"""
+        if not cls._default_set:
+            cls.set_default(cls())
+        return cls._default
+
+    @classmethod
+    def set_default(cls, store: typing.Optional[SessionStore]) -> None:
+        """None makes every session that is not given a store log in with the form"""
+        if store is not None and not store.enabled:
+            logger.info("Install cryptography to reuse login sessions between runs")
+        cls._default = store
+        cls._default_set = True
+        return None
+
+    @property
+    def enabled(self) -> bool:
+        return Fernet is not None
+
+    def path(self, domain: str, user: str) -> str:
+        digest = hashlib.sha256(f"{domain}\n{user}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.root, f"{digest}.session")
+
+    def load(self, domain: str, creds: typing.Dict[str, str]) -> typing.Optional[Cookies]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path(domain, creds["user"]), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            fernet = _fernet(creds["password"], base64.b64decode(entry["salt"]))
+            payload = json.loads(fernet.decrypt(entry["token"].encode("ascii"), ttl=SESSION_MAX_AGE))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError, KeyError) as e:
+            # Expired, written with another password, or damaged
+            logger.debug("Stored session for %s is not usable: %r", domain, e)
+            return None
+        if payload.get("domain") != domain or payload.get("user") != creds["user"]:
+            return None
+        return payload["cookies"]
+
+    def save(self, domain: str, creds: typing.Dict[str, str], cookies: Cookies) -> None:
+        if not self.enabled:
+            return None
+        salt = os.urandom(16)
+        payload = json.dumps({"domain": domain, "user": creds["user"], "cookies": cookies})
+        token = _fernet(creds["password"], salt).encrypt(payload.encode("utf-8"))
+        entry = {"salt": base64.b64encode(salt).decode("ascii"), "token": token.decode("ascii")}
+        path = self.path(domain, creds["user"])
+        with self.lock:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        return None
+
+    def drop(self, domain: str, creds: typing.Dict[str, str]) -> None:
+        with self.lock:
+            try:
+                os.remove(self.path(domain, creds["user"]))
+            except FileNotFoundError:
+                pass
+        return None
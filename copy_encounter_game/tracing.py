@@ -0,0 +1,219 @@
+"""
+Nested timing spans for scrape and upload operations, exported as Chrome trace events
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+__all__ = [
+    "SpanRecord",
+    "SpanStats",
+    "Tracer",
+    "tracer",
+    "traced",
+    "tracing",
+]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    category: str
+    start: float
+    duration: float
+    # Duration minus the time spent in nested spans
+    self_duration: float
+    thread_id: int
+    args: typing.Dict[str, typing.Any] = field(default_factory=dict)
+
+
+@dataclass
+class SpanStats:
+    name: str
+    category: str
+    count: int
+    total: float
+    self_total: float
+    mean: float
+    p95: float
+    max: float
+
+
+@dataclass
+class Tracer:
+    """
+    Collects spans while `enabled`. When disabled a traced call costs one attribute check.
+    Every thread keeps its own stack of open spans, so nesting is tracked per worker session.
+    """
+    enabled: bool = False
+    spans: typing.List[SpanRecord] = field(default_factory=list)
+    origin: float = field(default_factory=time.perf_counter)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    local: threading.local = field(default_factory=threading.local, repr=False)
+
+    def enable(self) -> None:
+        self.enabled = True
+        return None
+
+    def disable(self) -> None:
+        self.enabled = False
+        return None
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+        return None
+
+    def _stack(self) -> typing.List[list]:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def open_spans(self) -> typing.List[typing.Tuple[str, str]]:
+        """(category, name) of the spans the current thread is inside, outermost first"""
+        return [(category, name) for name, category, _ in self._stack()]
+
+    @contextmanager
+    def span(self, name: str, category: str = "op", **args) -> typing.Generator[None, None, None]:
+        if not self.enabled:
+            yield
+            return None
+        stack = self._stack()
+        # [name, category, time spent in spans nested into this one]
+        stack.append([name, category, 0.])
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            nested = stack.pop()[2]
+            if stack:
+                stack[-1][2] += duration
+            record = SpanRecord(
+                name, category, start - self.origin, duration, duration - nested, threading.get_ident(), args,
+            )
+            with self.lock:
+                self.spans.append(record)
+        return None
+
+    def instrument_driver(self, driver) -> None:
+        """Wraps every WebDriver command (get, findElement, executeScript, ...) of `driver` in a span"""
+        execute = driver.execute
+
+        @functools.wraps(execute)
+        def traced_execute(driver_command, params=None):
+            if not self.enabled:
+                return execute(driver_command, params)
+            with self.span(driver_command, "webdriver"):
+                return execute(driver_command, params)
+
+        driver.execute = traced_execute
+        return None
+
+    def summary(self) -> typing.List[SpanStats]:
+        """Latency per span name, slowest total first"""
+        by_name: typing.Dict[typing.Tuple[str, str], typing.List[SpanRecord]] = {}
+        with self.lock:
+            for record in self.spans:
+                by_name.setdefault((record.category, record.name), []).append(record)
+        stats = []
+        for (category, name), records in by_name.items():
+            durations = sorted(record.duration for record in records)
+            total = sum(durations)
+            stats.append(SpanStats(
+                name, category, len(durations), total,
+                sum(record.self_duration for record in records),
+                total / len(durations),
+                durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                durations[-1],
+            ))
+        stats.sort(key=lambda stat: stat.total, reverse=True)
+        return stats
+
+    def log_summary(self) -> None:
+        for stat in self.summary():
+            logger.info(
+                "%-10s %-40s n=%-5d total=%8.3f s self=%8.3f s mean=%7.3f s p95=%7.3f s max=%7.3f s",
+                stat.category, stat.name, stat.count, stat.total, stat.self_total, stat.mean, stat.p95, stat.max,
+            )
+        return None
+
+    def to_chrome_trace(self, path: str) -> None:
+        """Trace Event Format, opens in chrome://tracing and Perfetto"""
+        pid = os.getpid()
+        with self.lock:
+            events = [
+                {
+                    "name": record.name,
+                    "cat": record.category,
+                    "ph": "X",
+                    "ts": record.start * 1e6,
+                    "dur": record.duration * 1e6,
+                    "pid": pid,
+                    "tid": record.thread_id,
+                    "args": {key: str(value) for key, value in record.args.items()},
+                }
+                for record in self.spans
+            ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return None
+
+
+tracer = Tracer()
+
+
+def traced(category: str, per_owner: bool = False):
+    """
+    Wraps a function in a span named after it.
+    With `per_owner` the span is named after the class of the first argument instead,
+    e.g. `PenalizedHint.to_html`, so the summary groups the calls by entity type.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            if per_owner and args:
+                owner = args[0] if isinstance(args[0], type) else type(args[0])
+                name = f"{owner.__name__}.{func.__name__}"
+            else:
+                name = func.__qualname__
+            with tracer.span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def tracing(trace_path: str = None) -> typing.Generator[Tracer, None, None]:
+    """
+    Traces everything run inside the block, then logs the latency summary
+    and writes the Chrome trace to `trace_path` if given
+    """
+    tracer.reset()
+    tracer.enable()
+    try:
+        yield tracer
+    finally:
+        tracer.disable()
+        tracer.log_summary()
+        if trace_path is not None:
+            tracer.to_chrome_trace(trace_path)
+    return None
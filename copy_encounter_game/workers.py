@@ -0,0 +1,185 @@
+"""
+Pool of logged-in sessions working through a shared queue
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import logging
+import queue
+import threading
+import typing
+
+from copy_encounter_game.constants import MAX_WORKERS_PER_DOMAIN, DEFAULT_MAX_WORKERS_PER_DOMAIN, SESSION_SLOT_POLL
+
+__all__ = [
+    "domain_concurrency",
+    "SessionBudget",
+    "run_session_pool",
+    "NotProcessedError",
+]
+
+logger = logging.getLogger(__name__)
+
+Item = typing.TypeVar("Item")
+Session = typing.TypeVar("Session")
+Result = typing.TypeVar("Result")
+
+
+class NotProcessedError(Exception):
+    pass
+
+
+def domain_concurrency(domain: str, requested: int) -> int:
+    cap = MAX_WORKERS_PER_DOMAIN.get(domain, DEFAULT_MAX_WORKERS_PER_DOMAIN)
+    return max(1, min(requested, cap))
+
+
+@dataclass
+class SessionBudget:
+    """
+    Logged-in sessions one domain may have at once, shared by every pool and upload target of the process.
+    The cap is read from `MAX_WORKERS_PER_DOMAIN` when the domain is first used.
+    """
+    domain: str
+    cap: int
+    live: int = 0
+    peak: int = 0
+    slots: threading.Semaphore = field(default=None, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    _registry: typing.ClassVar[typing.Dict[str, SessionBudget]] = {}
+    _registry_lock: typing.ClassVar[threading.Lock] = threading.Lock()
+
+    def __post_init__(self):
+        if self.slots is None:
+            self.slots = threading.BoundedSemaphore(self.cap)
+        return None
+
+    @classmethod
+    def for_domain(cls, domain: str) -> SessionBudget:
+        with cls._registry_lock:
+            if domain not in cls._registry:
+                cap = MAX_WORKERS_PER_DOMAIN.get(domain, DEFAULT_MAX_WORKERS_PER_DOMAIN)
+                cls._registry[domain] = cls(domain, max(1, cap))
+            return cls._registry[domain]
+
+    def acquire(self, keep_waiting: typing.Callable[[], bool] = None) -> bool:
+        """Takes a slot, waiting for one as long as `keep_waiting()` is true; False if it gave up"""
+        if keep_waiting is None:
+            self.slots.acquire()
+        else:
+            while not self.slots.acquire(timeout=SESSION_SLOT_POLL):
+                if not keep_waiting():
+                    return False
+        with self.lock:
+            self.live += 1
+            self.peak = max(self.peak, self.live)
+        return True
+
+    def release(self) -> None:
+        with self.lock:
+            self.live -= 1
+        self.slots.release()
+        return None
+
+    @contextmanager
+    def session(self) -> typing.Iterator[None]:
+        """Holds a slot for the lifetime of a session opened in the block"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def run_session_pool(
+        items: typing.Iterable[Item],
+        n_workers: int,
+        open_session: typing.Callable[[int], Session],
+        work: typing.Callable[[Session, Item], Result],
+        close_session: typing.Callable[[int, Session], None] = None,
+        pause: typing.Callable[[], None] = None,
+        budget: SessionBudget = None,
+        stop_on_error: bool = False,
+) -> typing.Tuple[typing.Dict[Item, Result], typing.Dict[Item, Exception]]:
+    """
+    Each of `n_workers` threads opens its own session once via `open_session(worker_idx)`
+    and then takes items from the queue until it is empty.
+    With a `budget`, worker 0 runs on the caller's session, which already holds a slot; every other worker
+    takes a slot before it opens a session and gives up waiting for one once the queue is empty.
+    With `stop_on_error`, no worker takes a new item after the first error.
+    A worker that can't open its session puts its item back for the others.
+    Returns results and errors keyed by item; items no worker got to end up in errors,
+    with the last session error if there was one.
+    """
+    items = list(items)
+    todo = queue.Queue()
+    for item in items:
+        todo.put(item)
+
+    results = {}
+    errors = {}
+    session_errors = []
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def worker(idx: int) -> None:
+        session = None
+        has_slot = budget is not None and idx > 0
+        if has_slot and not budget.acquire(lambda: not todo.empty()):
+            return None
+        try:
+            while not stopped.is_set():
+                try:
+                    item = todo.get_nowait()
+                except queue.Empty:
+                    break
+                if session is None:
+                    try:
+                        session = open_session(idx)
+                    except Exception as e:
+                        logger.warning("Worker %d could not open a session: %r", idx, e)
+                        todo.put(item)
+                        with lock:
+                            session_errors.append(e)
+                        break
+                try:
+                    res = work(session, item)
+                except Exception as e:
+                    with lock:
+                        errors[item] = e
+                    if stop_on_error:
+                        stopped.set()
+                else:
+                    with lock:
+                        results[item] = res
+                if pause is not None and not todo.empty():
+                    pause()
+        finally:
+            try:
+                if session is not None and close_session is not None:
+                    close_session(idx, session)
+            finally:
+                if has_slot:
+                    budget.release()
+        return None
+
+    n_workers = max(1, min(n_workers, len(items)))
+    threads = [
+        threading.Thread(target=worker, args=(i,), name=f"copy-encounter-worker-{i}", daemon=True)
+        for i in range(n_workers)
+    ]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    for item in items:
+        if item not in results and item not in errors:
+            if session_errors:
+                errors[item] = session_errors[-1]
+            else:
+                errors[item] = NotProcessedError(f"No worker left to process {item!r}")
+    return results, errors
@@ -0,0 +1,117 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from copy_encounter_game.game import Game
+from copy_encounter_game.game.archive import ArchiveError, read_index
+
+from benchmarks.fixtures import make_game
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Renames the third level and appends it, but the process is killed halfway through writing the new record
+KILL_MID_APPEND = """
+import os, signal, sys
+from copy_encounter_game.game import Game
+from copy_encounter_game.game.archive import ArchiveWriter
+
+def write_and_die(self, data, key=None):
+    self.f.write(data[:len(data) // 2])
+    self.f.flush()
+    os.kill(os.getpid(), signal.SIGKILL)
+
+ArchiveWriter.write_item = write_and_die
+game = Game.from_file(sys.argv[1])
+game.levels[2].name.name = "Renamed"
+game.to_file(sys.argv[1])
+"""
+
+
+def level_names(game: Game):
+    return [level.name.name for level in game.levels]
+
+
+@pytest.fixture
+def saved(tmp_path):
+    path = str(tmp_path / "game.bin")
+    make_game(6).to_file(path)
+    return path
+
+
+def test_append_writes_only_changed_levels(saved):
+    before = os.path.getsize(saved)
+    game = Game.from_file(saved)
+    game.levels[2].name.name = "Renamed"
+    game.to_file(saved)
+
+    assert os.path.getsize(saved) < 2 * before
+    assert level_names(Game.from_file(saved))[2] == "Renamed"
+
+
+def test_append_cut_anywhere_reads_the_save_before(saved, tmp_path):
+    expected = level_names(Game.from_file(saved))
+    old_end = os.path.getsize(saved)
+    game = Game.from_file(saved)
+    game.levels[2].name.name = "Renamed"
+    game.to_file(saved)
+    with open(saved, "rb") as f:
+        data = f.read()
+    assert len(data) > old_end
+
+    cut_path = str(tmp_path / "cut.bin")
+    for cut in range(old_end, len(data)):
+        with open(cut_path, "wb") as f:
+            f.write(data[:cut])
+        assert read_index(cut_path).end == old_end
+        assert level_names(Game.from_file(cut_path)) == expected
+
+
+def test_writer_killed_mid_append(saved):
+    expected = level_names(Game.from_file(saved))
+    old_end = os.path.getsize(saved)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-c", KILL_MID_APPEND, saved], env=env)
+    assert proc.returncode != 0
+    assert os.path.getsize(saved) > old_end
+
+    game = Game.from_file(saved)
+    assert level_names(game) == expected
+
+    # The next save compacts the archive and drops what the killed writer left behind
+    game.levels[2].name.name = "Renamed"
+    game.to_file(saved)
+    assert read_index(saved).end == os.path.getsize(saved)
+    assert level_names(Game.from_file(saved))[2] == "Renamed"
+
+
+def test_archive_without_any_complete_save(saved, tmp_path):
+    cut_path = str(tmp_path / "cut.bin")
+    with open(saved, "rb") as src, open(cut_path, "wb") as f:
+        f.write(src.read()[:-1])
+    with pytest.raises(ArchiveError):
+        read_index(cut_path)
+
+
+def test_copy_leaves_levels_in_the_archive(saved):
+    game = Game.from_file(saved)
+    game.levels[1].name.name = "Changed"
+    copied = game.copy()
+    copied.domain = "other.en.cx"
+
+    assert copied.levels.n_loaded == 1
+    assert copied.upload_order(workers=4)[0] in copied.levels.keys()
+    assert copied.levels.n_loaded == 1
+    copied.levels[1].name.name = "Copied"
+    assert game.levels[1].name.name == "Changed"
+    assert all(level.domain == "other.en.cx" for level in copied.levels)
+    assert game.levels[0].domain != "other.en.cx"
+
+
+def test_copy_refuses_to_read_a_rewritten_archive(saved):
+    game = Game.from_file(saved)
+    copied = game.copy()
+    make_game(6).to_file(saved)
+    with pytest.raises(ArchiveError, match="rewritten"):
+        copied.levels[0]
@@ -0,0 +1,97 @@
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+import pytest
+
+from copy_encounter_game.file_cache import FileCache
+
+CONTENT = bytes(range(256)) * 64
+ETAG = '"v1"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves CONTENT with Range support, answering 416 for a range past its end"""
+    sent = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+
+    def do_GET(self):
+        start = 0
+        range_ = self.headers.get("Range")
+        if range_ and self.headers.get("If-Range") == ETAG:
+            start = int(range_[len("bytes="):].rstrip("-"))
+            if start >= len(CONTENT):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(CONTENT)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        body = CONTENT[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+        self.sent.append(len(body))
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    RangeHandler.sent.clear()
+    yield f"http://127.0.0.1:{server.server_address[1]}/files/video.mp4"
+    server.shutdown()
+    server.server_close()
+
+
+def leave_partial(cache: FileCache, url: str, data: bytes) -> None:
+    part_path = cache.partial_path(url)
+    with open(part_path, "wb") as f:
+        f.write(data)
+    with open(f"{part_path}.json", "w", encoding="utf-8") as f:
+        json.dump({"url": url, "etag": ETAG}, f)
+
+
+def test_complete_partial_file_is_taken_as_is(url, tmp_path):
+    cache = FileCache(str(tmp_path))
+    leave_partial(cache, url, CONTENT)
+
+    blob = cache.fetch(url)
+
+    with open(blob, "rb") as f:
+        assert f.read() == CONTENT
+    assert cache.entries[url].digest == hashlib.sha256(CONTENT).hexdigest()
+    assert RangeHandler.sent == []
+    assert cache.fetch(url) == blob
+
+
+def test_partial_file_longer_than_the_remote_one_is_downloaded_again(url, tmp_path):
+    cache = FileCache(str(tmp_path))
+    leave_partial(cache, url, CONTENT + b"stale")
+
+    blob = cache.fetch(url)
+
+    with open(blob, "rb") as f:
+        assert f.read() == CONTENT
+    assert RangeHandler.sent == [len(CONTENT)]
+
+
+def test_partial_file_is_resumed(url, tmp_path):
+    cache = FileCache(str(tmp_path))
+    leave_partial(cache, url, CONTENT[:1000])
+
+    with open(cache.fetch(url), "rb") as f:
+        assert f.read() == CONTENT
+    assert RangeHandler.sent == [len(CONTENT) - 1000]
@@ -0,0 +1,65 @@
+import pytest
+import requests
+from selenium.common.exceptions import NoSuchElementException, JavascriptException, TimeoutException
+
+from copy_encounter_game.game import Level
+from copy_encounter_game.helpers import NotReadyError
+from copy_encounter_game.pacing import Pacer
+
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.fixtures import make_game
+from benchmarks.site import EditableSite
+
+
+def http_error(status: int) -> requests.HTTPError:
+    res = requests.Response()
+    res.status_code = status
+    return requests.HTTPError(f"HTTP {status}", response=res)
+
+
+@pytest.mark.parametrize("error", [
+    http_error(503), requests.ConnectionError("reset"), requests.Timeout("read"), TimeoutException("page load"),
+])
+def test_server_failures_back_off(error):
+    pacer = Pacer("strain.test.en.cx")
+    with pytest.raises(type(error)):
+        with pacer.track():
+            raise error
+    assert pacer.n_errors == 1 and pacer.backoff == pacer.min_backoff
+
+
+@pytest.mark.parametrize("error", [
+    http_error(404), NoSuchElementException("#lnkEdit"), JavascriptException("x is undefined"), NotReadyError("form"),
+    KeyError("field"),
+])
+def test_client_side_errors_do_not_back_off(error):
+    pacer = Pacer("strain.test.en.cx")
+    with pytest.raises(type(error)):
+        with pacer.track():
+            raise error
+    assert pacer.n_errors == 0 and pacer.backoff == 0.
+
+
+def test_transfers_are_not_slow_responses():
+    pacer = Pacer("transfer.test.en.cx", slow_response=0.)
+    with pacer.track(count_slow=False):
+        pass
+    assert pacer.n_slow == 0 and pacer.backoff == 0.
+    with pacer.track():
+        pass
+    assert pacer.n_slow == 1
+
+
+def test_browser_fetch_takes_a_token_per_page(monkeypatch):
+    game = make_game(1, "fetch.test.en.cx")
+    level = game.levels[0]
+    driver = FakeDriver(EditableSite(game))
+    pacer = Pacer.for_domain(game.domain)
+    acquired = []
+    monkeypatch.setattr(pacer, "acquire", lambda: acquired.append(1))
+
+    scraped = Level.from_html(driver, game.domain, game.game_id, level.level_id, fetch_hints=True)
+
+    n_pages = 2 * (len(level.hints) + len(level.penalized_hints) + len(level.bonuses))
+    assert scraped.bonuses == level.bonuses
+    assert len(acquired) >= n_pages > 2
@@ -0,0 +1,176 @@
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from copy_encounter_game.api import load_game_to_targets
+from copy_encounter_game.constants import DEFAULT_MAX_WORKERS_PER_DOMAIN
+from copy_encounter_game.game import Game
+from copy_encounter_game.game.game_custom_info import GameCustomInfo
+from copy_encounter_game.pacing import Pacer
+from copy_encounter_game.session_store import SessionStore
+from copy_encounter_game.workers import NotProcessedError, SessionBudget, run_session_pool
+
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.fixtures import CREDS, make_game
+from benchmarks.server import empty_game
+from benchmarks.site import EditableSite
+
+
+class LiveSessions:
+    def __init__(self):
+        self.live = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def opened(self) -> None:
+        with self.lock:
+            self.live += 1
+            self.peak = max(self.peak, self.live)
+
+    def closed(self) -> None:
+        with self.lock:
+            self.live -= 1
+
+
+@pytest.fixture
+def domain(request):
+    """A domain of its own per test, so that its session budget starts empty"""
+    name = f"{request.node.name}.test.en.cx".replace("[", "-").replace("]", "")
+    pacer = Pacer.for_domain(name)
+    pacer.rate = pacer.burst = pacer.tokens = 1e9
+    return name
+
+
+def test_pools_share_the_domain_budget(domain):
+    budget = SessionBudget(domain, 3)
+    sessions = LiveSessions()
+
+    def open_session(idx: int) -> int:
+        if idx:
+            sessions.opened()
+        return idx
+
+    def close_session(idx: int, _: int) -> None:
+        if idx:
+            sessions.closed()
+
+    def target(results: list) -> None:
+        with budget.session():
+            sessions.opened()
+            done, errors = run_session_pool(
+                range(12), 3, open_session, lambda _, item: time.sleep(0.01),
+                close_session=close_session, budget=budget,
+            )
+            sessions.closed()
+        results.append((done, errors))
+
+    results = []
+    threads = [threading.Thread(target=target, args=(results,)) for _ in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    assert [(len(done), errors) for done, errors in results] == [(12, {})] * 4
+    assert sessions.peak <= 3
+    assert budget.peak <= 3 and budget.live == 0
+
+
+def test_extra_workers_give_up_when_the_queue_is_empty(domain):
+    budget = SessionBudget(domain, 1)
+    with budget.session():
+        done, errors = run_session_pool(range(5), 4, lambda idx: idx, lambda idx, item: idx, budget=budget)
+    # Worker 0 runs on the caller's slot and does everything, the others never get one
+    assert done == {item: 0 for item in range(5)} and not errors
+    assert budget.live == 0
+
+
+def test_targets_on_one_domain_stay_within_the_session_cap(domain, tmp_path, monkeypatch):
+    monkeypatch.setattr(SessionStore, "_default", None)
+    monkeypatch.setattr(SessionStore, "_default_set", True)
+    sessions = LiveSessions()
+    post_init = GameCustomInfo.__post_init__
+    close = GameCustomInfo.close
+
+    def start_fake(self):
+        # Every session writes into a site of its own: the test is about how many are live, not what they write
+        site = EditableSite(empty_game(self.game_id, 6, self.domain))
+        self.driver = FakeDriver(site, command_latency=0.0005, page_load_latency=0.002, real_time=True)
+        sessions.opened()
+        return post_init(self)
+
+    def close_fake(self):
+        sessions.closed()
+        return close(self)
+
+    monkeypatch.setattr(GameCustomInfo, "__post_init__", start_fake)
+    monkeypatch.setattr(GameCustomInfo, "close", close_fake)
+    path = str(tmp_path / "game.bin")
+    make_game(6, domain).to_file(path)
+
+    targets = [(domain, game_id) for game_id in range(1, 5)]
+    report = load_game_to_targets(
+        targets, CREDS, path, None, workers=DEFAULT_MAX_WORKERS_PER_DOMAIN, max_parallel_targets=len(targets),
+    )
+
+    assert report.ok, report.errors
+    assert 1 < sessions.peak <= DEFAULT_MAX_WORKERS_PER_DOMAIN
+    assert sessions.live == 0
+
+
+def test_stop_on_error_takes_no_new_items(domain):
+    def work(_, item: int) -> int:
+        if item == 1:
+            raise ValueError(item)
+        return item
+
+    done, errors = run_session_pool(range(4), 1, lambda idx: idx, work, stop_on_error=True)
+    assert done == {0: 0}
+    assert isinstance(errors[1], ValueError)
+    assert all(isinstance(errors[item], NotProcessedError) for item in (2, 3))
+
+
+def test_single_worker_upload_raises_the_failed_level(domain, monkeypatch):
+    monkeypatch.setattr(SessionStore, "_default", None)
+    monkeypatch.setattr(SessionStore, "_default_set", True)
+    written = []
+
+    def upload_level(gci, level, incremental=False):
+        if level.level_id == 2:
+            raise WebDriverException("level 2")
+        written.append(level.level_id)
+
+    monkeypatch.setattr(Game, "upload_level", staticmethod(upload_level))
+    site = EditableSite(empty_game(1, 4, domain))
+    monkeypatch.setattr(GameCustomInfo, "start_driver", lambda *args: FakeDriver(site))
+    game = make_game(4, domain, 1)
+
+    with pytest.raises(WebDriverException, match="level 2"):
+        game.to_html(CREDS, None)
+    # Without a journal there is no second attempt, and no level is written after the failed one
+    assert 2 not in written and len(written) < 3
+
+
+def test_failed_extra_session_leaves_its_item_to_the_others(domain):
+    def open_session(idx: int) -> int:
+        if idx:
+            raise ConnectionError(f"worker {idx}")
+        return idx
+
+    def work(_, item: int) -> int:
+        time.sleep(0.01)
+        return item
+
+    done, errors = run_session_pool(range(6), 3, open_session, work)
+    assert done == {item: item for item in range(6)} and not errors
+
+
+def test_items_get_the_session_error_when_no_worker_is_left(domain):
+    def open_session(idx: int) -> int:
+        raise ConnectionError(f"worker {idx}")
+
+    done, errors = run_session_pool(range(3), 2, open_session, lambda _, item: item)
+    assert not done
+    assert sorted(errors) == [0, 1, 2] and all(isinstance(e, ConnectionError) for e in errors.values())